@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import csv
+import functools
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, Literal, Optional, Sequence
+
+import numpy as np
+
+
+class ReplayFeed:
+    """Historical prices as a dense (tick x symbol) matrix.
+
+    Gaps are forward-filled from the symbol's previous tick; prices before a symbol's first
+    observation stay NaN, which the replay client reports as "no price".
+    """
+
+    def __init__(self, timestamps: list[datetime], symbols: list[str], prices: np.ndarray) -> None:
+        self.timestamps = timestamps
+        self.symbols = symbols
+        self.prices = prices
+        self._epochs = np.array([timestamp.timestamp() for timestamp in timestamps])
+        self._columns = {symbol: column for column, symbol in enumerate(symbols)}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[datetime, str, float]]) -> ReplayFeed:
+        rows = list(rows)
+        if not rows:
+            raise ValueError("Replay feed is empty")
+        timestamps = sorted({row[0] for row in rows})
+        symbols = list(dict.fromkeys(row[1] for row in rows))
+        tick_index = {timestamp: index for index, timestamp in enumerate(timestamps)}
+        column_index = {symbol: index for index, symbol in enumerate(symbols)}
+
+        prices = np.full((len(timestamps), len(symbols)), np.nan)
+        prices[
+            [tick_index[row[0]] for row in rows],
+            [column_index[row[1]] for row in rows],
+        ] = [row[2] for row in rows]
+
+        # forward fill: for every cell, the latest tick at or before it that has a value
+        observed = np.where(np.isnan(prices), 0, np.arange(len(timestamps))[:, None])
+        np.maximum.accumulate(observed, axis=0, out=observed)
+        prices = prices[observed, np.arange(len(symbols))]
+        return cls(timestamps, symbols, prices)
+
+    @classmethod
+    def load(cls, path: str) -> ReplayFeed:
+        """Read a long-format feed with ``timestamp``, ``symbol`` and ``price`` columns.
+
+        ``.parquet`` files need the optional ``pyarrow`` package; anything else is read as CSV.
+        Timestamps are ISO 8601 strings or Unix seconds (UTC).
+        """
+        if Path(path).suffix == ".parquet":
+            try:
+                import pyarrow.parquet as pq
+            except ImportError as exc:
+                raise RuntimeError("Reading Parquet feeds requires the 'pyarrow' package") from exc
+            table = pq.read_table(path, columns=["timestamp", "symbol", "price"]).to_pydict()
+            records = zip(table["timestamp"], table["symbol"], table["price"])
+        else:
+            with open(path, newline="") as handle:
+                reader = csv.reader(handle)
+                header = next(reader, [])
+                missing = [name for name in ("timestamp", "symbol", "price") if name not in header]
+                if missing:
+                    raise ValueError(f"Replay feed {path} has no {', '.join(missing)} column")
+                timestamp, symbol, price = (header.index(name) for name in ("timestamp", "symbol", "price"))
+                records = [(row[timestamp], row[symbol], row[price]) for row in reader]
+        # each timestamp repeats once per symbol: parse every distinct value once
+        parse_timestamp = functools.lru_cache(maxsize=None)(_parse_timestamp)
+        return cls.from_rows((parse_timestamp(timestamp), str(symbol), float(price)) for timestamp, symbol, price in records)
+
+    def index_at(self, when: datetime) -> int:
+        """Index of the last tick at or before ``when`` (the first tick if ``when`` is earlier)."""
+        return max(int(np.searchsorted(self._epochs, when.timestamp(), side="right")) - 1, 0)
+
+    def price(self, symbol: str, when: datetime) -> Optional[float]:
+        column = self._columns.get(symbol)
+        if column is None:
+            return None
+        value = self.prices[self.index_at(when), column]
+        return None if np.isnan(value) else float(value)
+
+    def ticks(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> list[datetime]:
+        return [
+            timestamp
+            for timestamp in self.timestamps
+            if (start is None or timestamp >= start) and (end is None or timestamp <= end)
+        ]
+
+
+def _parse_timestamp(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.utcfromtimestamp(float(value))
+    except ValueError:
+        return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+
+
+class ReplaySymphonyClient:
+    """Stands in for ``SymphonyClient`` during backtests.
+
+    Prices come from a ``ReplayFeed`` at the time reported by ``clock``. Swaps fill immediately
+    at those prices minus ``fee_bps``, and they update the simulated ``balances``, which the
+    orchestrator reads back through ``get_balances``. A swap's ``weight`` is a fraction of the
+    ``token_in`` balance that ``get_balances`` last reported, the one the plan was sized from,
+    so legs sharing a seller fill the same in any order. Swaps that reuse an idempotency key
+    are answered from the first fill, matching the live endpoint.
+    """
+
+    base_url = "replay://"
+    supports_batch_prices = True
+    supports_swap_status = False
+
+    def __init__(
+        self,
+        feed: ReplayFeed,
+        clock: Callable[[], datetime],
+        *,
+        balances: Optional[dict[str, float]] = None,
+        fee_bps: float = 0.0,
+        chain_id: int = 143,
+    ) -> None:
+        self.feed = feed
+        self.clock = clock
+        self.balances: dict[str, float] = dict(balances or {})
+        self.fee_bps = fee_bps
+        self.chain_id = chain_id
+        self.default_agent_id = "replay"
+        self.swaps = 0
+        self.fees_paid = 0.0
+        self._fills: dict[str, dict[str, Any]] = {}
+        # balances as of the last get_balances call, which legs are sized against
+        self._planned: dict[str, float] = {}
+
+    async def list_supported_assets(self, protocol: Literal["spot", "swap"] = "spot") -> Any:
+        return [{"symbol": symbol, "chainId": self.chain_id} for symbol in self.feed.symbols]
+
+    async def fetch_supported_assets(
+        self,
+        protocol: Literal["spot", "swap"] = "spot",
+        *,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> tuple[Optional[Any], Optional[str], Optional[str]]:
+        if etag == "replay":
+            return None, etag, last_modified
+        return await self.list_supported_assets(protocol), "replay", None
+
+    async def get_token_price(self, token: str, chain_id: int = 143) -> Any:
+        price = self.feed.price(token, self.clock())
+        if price is None:
+            raise LookupError(f"No replay price for {token}")
+        return {"price": price}
+
+    async def get_token_prices(self, tokens: Sequence[str], chain_id: int = 143) -> dict[str, Any]:
+        now = self.clock()
+        prices = {token: self.feed.price(token, now) for token in tokens}
+        return {token: {"price": price} for token, price in prices.items() if price is not None}
+
+    async def get_balances(self, symbols: list[str]) -> dict[str, float]:
+        balances = {symbol: self.balances.get(symbol, 0.0) for symbol in symbols}
+        self._planned = dict(balances)
+        return balances
+
+    async def batch_swap(
+        self,
+        token_in: str,
+        token_out: str,
+        weight: float,
+        *,
+        agent_id: Optional[str] = None,
+        desired_protocol: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> Any:
+        if idempotency_key and idempotency_key in self._fills:
+            return self._fills[idempotency_key]
+        now = self.clock()
+        price_in = self.feed.price(token_in, now)
+        price_out = self.feed.price(token_out, now)
+        if not price_in or not price_out:
+            raise LookupError(f"Cannot fill {token_in}->{token_out}: missing replay price")
+
+        held = self.balances.get(token_in, 0.0)
+        amount_in = min(self._planned.get(token_in, held) * min(max(weight, 0.0), 1.0), held)
+        value = amount_in * price_in
+        fee = value * self.fee_bps / 10_000
+        amount_out = (value - fee) / price_out
+        self.balances[token_in] = self.balances.get(token_in, 0.0) - amount_in
+        self.balances[token_out] = self.balances.get(token_out, 0.0) + amount_out
+        self.swaps += 1
+        self.fees_paid += fee
+
+        fill = {
+            "txHash": f"replay-{self.swaps}",
+            "status": "filled",
+            "amountIn": amount_in,
+            "amountOut": amount_out,
+            "fee": fee,
+        }
+        if idempotency_key:
+            self._fills[idempotency_key] = fill
+        return fill
+
+    async def aclose(self) -> None:
+        return None
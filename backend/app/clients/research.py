@@ -1,25 +1,265 @@
 from __future__ import annotations
 
-from typing import Any, Iterable
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional, Protocol
+from urllib.parse import urlsplit
 
+import httpx
 
-class ResearchClient:
-    """Stubbed research client for token discovery and news search."""
+from .. import metrics
 
-    def __init__(self, serpapi_api_key: str) -> None:
-        self.serpapi_api_key = serpapi_api_key
+logger = logging.getLogger(__name__)
 
-    async def web_search(self, query: str, num_results: int = 5) -> list[dict[str, Any]]:
-        """Return placeholder search results until an external search API is wired up."""
+
+class SearchProvider(Protocol):
+    name: str
+
+    async def search(self, query: str, num_results: int) -> list[dict[str, Any]]:
+        """Return up to ``num_results`` results as ``{"title", "url", "snippet"}`` dicts."""
+        ...
+
+
+class SerpApiProvider:
+    """Google results through SerpAPI's JSON endpoint."""
+
+    name = "serpapi"
+
+    def __init__(self, api_key: str, *, base_url: str = "https://serpapi.com", timeout: float = 10.0) -> None:
+        self.api_key = api_key
+        self._client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+
+    async def search(self, query: str, num_results: int) -> list[dict[str, Any]]:
+        response = await self._client.get(
+            "/search.json", params={"engine": "google", "q": query, "num": num_results, "api_key": self.api_key}
+        )
+        response.raise_for_status()
+        payload = response.json()
+        items = (payload.get("news_results") or []) + (payload.get("organic_results") or [])
+        return [
+            {"title": item.get("title"), "url": item.get("link"), "snippet": item.get("snippet") or ""}
+            for item in items[:num_results]
+        ]
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class FakeSearchProvider:
+    """Deterministic offline provider used when no SerpAPI key is configured, and in tests."""
+
+    name = "fake"
+
+    def __init__(self, *, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.calls = 0
+
+    async def search(self, query: str, num_results: int) -> list[dict[str, Any]]:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-")
         return [
             {
                 "title": f"{query} result {i+1}",
-                "url": "https://example.com",
-                "snippet": "Stubbed search result — connect to SerpAPI or another provider.",
+                "url": f"https://example.com/{slug}/{i+1}",
+                "snippet": f"Offline search result {i+1} for {query}.",
             }
             for i in range(num_results)
         ]
 
+
+class ResearchCache:
+    """SQLite-backed query cache shared across restarts; entries expire after ``ttl_seconds``.
+
+    Calls are blocking; ``ResearchClient`` runs them in a worker thread.
+    """
+
+    def __init__(self, path: str, *, ttl_seconds: float = 3600.0, clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS research_cache "
+            "(key TEXT PRIMARY KEY, results TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_research_cache_expires_at ON research_cache (expires_at)")
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[list[dict[str, Any]]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT results FROM research_cache WHERE key = ? AND expires_at > ?", (key, self._clock())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, results: list[dict[str, Any]]) -> None:
+        now = self._clock()
+        with self._lock:
+            self._connection.execute("DELETE FROM research_cache WHERE expires_at <= ?", (now,))
+            self._connection.execute(
+                "INSERT OR REPLACE INTO research_cache (key, results, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(results), now + self.ttl_seconds),
+            )
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class ResearchClient:
+    """Web research for token discovery and news search.
+
+    Results are cached per (provider, query, result count) in ``cache``, and identical queries
+    that are already in flight share one provider call. ``search_many`` fans queries out with at
+    most ``concurrency`` provider calls at a time, each capped at ``timeout`` seconds, and drops
+    duplicate results, so research adds bounded latency and cost to a run. Without a provider,
+    SerpAPI is used when ``serpapi_api_key`` is set and the offline fake provider otherwise.
+    """
+
+    def __init__(
+        self,
+        serpapi_api_key: str = "",
+        *,
+        provider: Optional[SearchProvider] = None,
+        cache: Optional[ResearchCache] = None,
+        concurrency: int = 4,
+        timeout: float = 10.0,
+    ) -> None:
+        self.serpapi_api_key = serpapi_api_key
+        self.provider = provider or (SerpApiProvider(serpapi_api_key, timeout=timeout) if serpapi_api_key else FakeSearchProvider())
+        self.cache = cache
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.provider_calls = 0
+        self.errors = 0
+
+    async def web_search(self, query: str, num_results: int = 5) -> list[dict[str, Any]]:
+        query = " ".join(query.split())
+        key = self._cache_key(query, num_results)
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                self.cache_hits += 1
+                metrics.RESEARCH_QUERIES_TOTAL.inc(outcome="hit")
+                return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._search(key, query, num_results))
+            # every awaiter may have timed out; retrieve the error here so it is not reported unhandled
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+            metrics.RESEARCH_QUERIES_TOTAL.inc(outcome="coalesced")
+        # one caller timing out must not cancel the call for everyone sharing it
+        results = await asyncio.shield(task)
+        return [dict(result) for result in results]
+
+    async def search_many(self, queries: Iterable[str], num_results: int = 5) -> list[dict[str, Any]]:
+        """Run ``queries`` concurrently and return their de-duplicated results in query order.
+
+        Queries that fail or time out are logged and skipped. Each result gains a ``query`` key.
+        """
+        queries = list(dict.fromkeys(" ".join(query.split()) for query in queries))
+
+        async def one(query: str) -> list[dict[str, Any]]:
+            try:
+                results = await asyncio.wait_for(self.web_search(query, num_results), self.timeout)
+            except Exception as exc:
+                logger.warning("Research query %r failed: %r", query, exc)
+                return []
+            return [{**result, "query": query} for result in results]
+
+        batches = await asyncio.gather(*(one(query) for query in queries))
+        return dedupe_results(result for batch in batches for result in batch)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "provider": self.provider.name,
+            "cache_enabled": self.cache is not None,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "provider_calls": self.provider_calls,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+        }
+
+    async def aclose(self) -> None:
+        close = getattr(self.provider, "aclose", None)
+        if close is not None:
+            await close()
+        if self.cache is not None:
+            self.cache.close()
+
     @staticmethod
     def summarize_links(links: Iterable[dict[str, Any]]) -> list[str]:
         return [f"{item.get('title')}: {item.get('url')}" for item in links]
+
+    async def _search(self, key: str, query: str, num_results: int) -> list[dict[str, Any]]:
+        try:
+            async with self._semaphore:
+                self.provider_calls += 1
+                results = await self.provider.search(query, num_results)
+        except Exception:
+            self.errors += 1
+            metrics.RESEARCH_QUERIES_TOTAL.inc(outcome="error")
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        metrics.RESEARCH_QUERIES_TOTAL.inc(outcome="miss")
+        if self.cache is not None:
+            try:
+                await asyncio.to_thread(self.cache.put, key, results)
+            except sqlite3.Error as exc:
+                logger.warning("Could not cache research results for %r: %s", query, exc)
+        return results
+
+    def _cache_key(self, query: str, num_results: int) -> str:
+        raw = f"{self.provider.name}\0{num_results}\0{query.lower()}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def dedupe_results(results: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Drop results whose URL or snippet text was already seen, keeping the first occurrence.
+
+    URLs are compared without scheme, ``www.``, query string, fragment or trailing slash;
+    snippets by their lower-cased words.
+    """
+    seen_urls: set[str] = set()
+    seen_snippets: set[str] = set()
+    unique = []
+    for result in results:
+        url_key = _url_key(result.get("url") or "")
+        snippet_key = " ".join(re.findall(r"\w+", (result.get("snippet") or "").lower()))
+        if (url_key and url_key in seen_urls) or (snippet_key and snippet_key in seen_snippets):
+            continue
+        if url_key:
+            seen_urls.add(url_key)
+        if snippet_key:
+            seen_snippets.add(snippet_key)
+        unique.append(result)
+    return unique
+
+
+def _url_key(url: str) -> str:
+    parts = urlsplit(url.strip().lower())
+    host = parts.netloc.removeprefix("www.")
+    return f"{host}{parts.path.rstrip('/')}" if host else ""
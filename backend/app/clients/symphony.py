@@ -1,35 +1,143 @@
 from __future__ import annotations
 
-from typing import Any, Literal, Optional
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Literal, Optional, Sequence
 
 import httpx
 
+from .. import metrics
+from .rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+
 
 class SymphonyClient:
-    """Async client wrapper for Symphony's spot trading APIs."""
+    """Async client wrapper for Symphony's spot trading APIs.
+
+    Connections are pooled and kept alive (``max_connections``/``max_keepalive``), every request
+    has connect and read timeouts, and HTTP/2 can be enabled when the optional ``h2`` package is
+    installed. Outgoing requests pass through a token-bucket limiter when ``rate_limit_per_second``
+    is set. Only idempotent requests are retried, with exponential backoff and full jitter, on
+    transport errors and 429/502/503/504: GETs, plus swaps sent with an ``Idempotency-Key``.
+    """
 
     def __init__(
-        self, api_key: str, base_url: str = "https://api.symphony.finance", default_agent_id: Optional[str] = None
+        self,
+        api_key: str,
+        base_url: str = "https://api.symphony.finance",
+        default_agent_id: Optional[str] = None,
+        *,
+        batch_price_path: Optional[str] = None,
+        swap_status_path: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+        http2: bool = False,
+        max_retries: int = 3,
+        backoff_base: float = 0.25,
+        backoff_max: float = 5.0,
+        rate_limit_per_second: float = 0.0,
+        rate_limit_burst: int = 20,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
     ) -> None:
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
         self.default_agent_id = default_agent_id
-        self._client = httpx.AsyncClient(base_url=self.base_url, headers=self._headers)
+        self.batch_price_path = batch_price_path or None
+        self.swap_status_path = swap_status_path or None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._rate_limiter = (
+            TokenBucket(rate_limit_per_second, rate_limit_burst) if rate_limit_per_second > 0 else None
+        )
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self._headers,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            http2=http2,
+            transport=transport,
+        )
+        self.retries = 0
 
     @property
     def _headers(self) -> dict[str, str]:
         return {"x-api-key": self.api_key}
 
     async def list_supported_assets(self, protocol: Literal["spot", "swap"] = "spot") -> Any:
-        response = await self._client.get("/agent/supported-assets", params={"protocol": protocol})
+        response = await self._request("GET", "/agent/supported-assets", params={"protocol": protocol})
         response.raise_for_status()
         return response.json()
 
+    async def fetch_supported_assets(
+        self,
+        protocol: Literal["spot", "swap"] = "spot",
+        *,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> tuple[Optional[Any], Optional[str], Optional[str]]:
+        """Conditional variant of ``list_supported_assets``.
+
+        Returns ``(payload, etag, last_modified)``; ``payload`` is None when the server answers
+        304 Not Modified.
+        """
+        headers: dict[str, str] = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response = await self._request(
+            "GET", "/agent/supported-assets", params={"protocol": protocol}, headers=headers
+        )
+        if response.status_code == 304:
+            return None, etag, last_modified
+        response.raise_for_status()
+        return response.json(), response.headers.get("etag"), response.headers.get("last-modified")
+
     async def get_token_price(self, token: str, chain_id: int = 143) -> Any:
-        response = await self._client.get("/agent/token-price", params={"input": token, "chainId": chain_id})
+        response = await self._request("GET", "/agent/token-price", params={"input": token, "chainId": chain_id})
         response.raise_for_status()
         return response.json()
 
+    @property
+    def supports_batch_prices(self) -> bool:
+        return self.batch_price_path is not None
+
+    async def get_token_prices(self, tokens: Sequence[str], chain_id: int = 143) -> dict[str, Any]:
+        """Fetch several token prices in one round-trip and return them keyed by token.
+
+        Only available when a batch price endpoint is configured. Tokens missing from the
+        response are simply absent from the returned mapping.
+        """
+        if not self.batch_price_path:
+            raise RuntimeError("No batch price endpoint configured")
+        response = await self._request(
+            "GET", self.batch_price_path, params={"inputs": ",".join(tokens), "chainId": chain_id}
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if isinstance(payload, dict) and isinstance(payload.get("prices"), list):
+            payload = payload["prices"]
+        if isinstance(payload, list):
+            return {
+                str(item.get("input") or item.get("symbol")): item
+                for item in payload
+                if isinstance(item, dict) and (item.get("input") or item.get("symbol"))
+            }
+        return dict(payload) if isinstance(payload, dict) else {}
+
     async def batch_swap(
         self,
         token_in: str,
@@ -38,7 +146,9 @@ class SymphonyClient:
         *,
         agent_id: Optional[str] = None,
         desired_protocol: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
     ) -> Any:
+        """Submit a swap; with ``idempotency_key`` Symphony deduplicates resubmissions of the same leg."""
         payload: dict[str, Any] = {
             "agentId": agent_id or self.default_agent_id,
             "tokenIn": token_in,
@@ -48,9 +158,67 @@ class SymphonyClient:
         if desired_protocol:
             payload["intentOptions"] = {"desiredProtocol": desired_protocol}
 
-        response = await self._client.post("/agent/batch-swap", json=payload)
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        response = await self._request("POST", "/agent/batch-swap", json=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    @property
+    def supports_swap_status(self) -> bool:
+        return self.swap_status_path is not None
+
+    async def get_swap_status(self, tx_reference: str) -> Any:
+        """Look up the settlement status of a submitted swap by its transaction reference."""
+        if not self.swap_status_path:
+            raise RuntimeError("No swap status endpoint configured")
+        response = await self._request("GET", self.swap_status_path, params={"txHash": tx_reference})
         response.raise_for_status()
         return response.json()
 
     async def aclose(self) -> None:
         await self._client.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a request through the rate limiter, retrying idempotent requests on transient failures."""
+        idempotent = method == "GET" or "Idempotency-Key" in (kwargs.get("headers") or {})
+        retries = self.max_retries if idempotent else 0
+        attempt = 0
+        while True:
+            if self._rate_limiter is not None:
+                await self._rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = await self._client.request(method, url, **kwargs)
+            except httpx.TransportError as exc:
+                metrics.SYMPHONY_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, method=method, endpoint=url, status="error"
+                )
+                if attempt >= retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning("Symphony %s %s failed (%s); retrying in %.2fs", method, url, exc, delay)
+            else:
+                metrics.SYMPHONY_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, method=method, endpoint=url, status=response.status_code
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= retries:
+                    return response
+                delay = max(self._backoff(attempt), self._retry_after(response))
+                await response.aclose()
+                logger.warning(
+                    "Symphony %s %s returned %d; retrying in %.2fs", method, url, response.status_code, delay
+                )
+            attempt += 1
+            self.retries += 1
+            metrics.SYMPHONY_RETRIES_TOTAL.inc(method=method, endpoint=url)
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: spreads retries from concurrent callers instead of synchronising them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _retry_after(self, response: httpx.Response) -> float:
+        try:
+            return min(float(response.headers.get("retry-after", 0)), self.backoff_max)
+        except ValueError:
+            return 0.0
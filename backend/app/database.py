@@ -1,32 +1,56 @@
 from __future__ import annotations
 
-from contextlib import contextmanager
-from typing import Generator
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncGenerator, Callable, Generator, Optional, TypeVar
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from .config import settings
-from .models.db import Base
 
+T = TypeVar("T")
 
-def get_engine():
-    return create_engine(settings.database_url, pool_pre_ping=True)
 
+def get_engine(database_url: Optional[str] = None):
+    return create_engine(database_url or settings.database_url, pool_pre_ping=True)
 
-def init_db() -> Session:
-    """Create tables and return a session factory."""
-    engine = get_engine()
-    Base.metadata.create_all(bind=engine)
+
+def make_session_factory(engine) -> sessionmaker:
     return sessionmaker(bind=engine, expire_on_commit=False)
 
 
-SessionLocal = init_db()
+_session_factory: Optional[sessionmaker] = None
+
+
+def get_session_factory() -> sessionmaker:
+    """Session factory for ``DATABASE_URL``, created on first use.
+
+    Creating it never connects; the schema is brought up to date separately by
+    ``app.migrations.migrate`` (at startup or from the CLI).
+    """
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = make_session_factory(get_engine())
+    return _session_factory
+
+
+def get_bound_engine():
+    """The engine behind the current session factory."""
+    return get_session_factory().kw["bind"]
+
+
+def set_session_factory(factory: sessionmaker) -> None:
+    """Point every session helper in this process at another database (e.g. a backtest DB)."""
+    global _session_factory
+    _session_factory = factory
 
 
 @contextmanager
 def session_scope() -> Generator[Session, None, None]:
-    session = SessionLocal()
+    session = get_session_factory()()
     try:
         yield session
         session.commit()
@@ -37,6 +61,44 @@ def session_scope() -> Generator[Session, None, None]:
         session.close()
 
 
+# Blocking SQLAlchemy calls from async code go through this executor so they never stall
+# the event loop. Sync route handlers already run in FastAPI's own threadpool.
+_db_executor = ThreadPoolExecutor(max_workers=settings.db_executor_workers, thread_name_prefix="db")
+
+
+async def run_db(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking database callable on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_in_session(fn: Callable[[Session], T]) -> T:
+    """Run ``fn`` inside its own ``session_scope`` on the DB executor."""
+
+    def work() -> T:
+        with session_scope() as session:
+            return fn(session)
+
+    return await run_db(work)
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncGenerator[Session, None]:
+    """Async counterpart of ``session_scope``; commit, rollback and close run on the DB executor.
+
+    The session itself must only be used through ``run_db`` while inside the block.
+    """
+    session = get_session_factory()()
+    try:
+        yield session
+        await run_db(session.commit)
+    except BaseException:
+        await run_db(session.rollback)
+        raise
+    finally:
+        await run_db(session.close)
+
+
 # FastAPI dependency
 
 def get_db() -> Generator[Session, None, None]:
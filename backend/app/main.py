@@ -1,86 +1,406 @@
-from fastapi import Depends, FastAPI
-from sqlalchemy.orm import Session
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Literal, Optional
 
-from .clients.research import ResearchClient
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session, noload, selectinload, undefer
+
+from .clients.research import ResearchCache, ResearchClient
 from .clients.symphony import SymphonyClient
+from . import metrics
 from .config import settings
-from .database import get_db
-from .models.db import AgentConfig, AgentLog, AgentRun, PortfolioSnapshot, Trade
+from .database import get_bound_engine, get_db, run_db, run_in_session
+from .migrations import current_version, migrate, schema_version
+from .models.db import AgentConfig, AgentLog, AgentRun, PortfolioSnapshot, RunLease, Trade
 from .schemas import (
     AgentConfigSchema,
     AgentLogSchema,
     AgentRunSchema,
     AgentStateSchema,
+    BufferedAgentLogSchema,
+    PnlSeriesSchema,
     PortfolioSnapshotSchema,
     RunAgentResponse,
     TradeSchema,
 )
+from .services import retention, rollups
+from .services.agents import default_agent_id
+from .services.event_bus import EventBus, TooManySubscribers
+from .services.jobs import RunQueue, RunQueueFull
+from .services.leases import LeaseManager
+from .services.log_sink import LogSink
 from .services.orchestrator import AgentOrchestrator
+from .services.pagination import keyset_page, set_page_headers
+from .services.reconciler import StubStatusSource, SymphonyStatusSource, TradeReconciler, TradeStatusSource
+from .services.scheduler import AgentScheduler
+from .services.state_cache import StateCache
 
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Monad Agent Backend", version="0.2.0")
 
+# Handlers that only touch the database are plain ``def`` so FastAPI runs them (and the
+# synchronous ``get_db`` session) in its threadpool instead of on the event loop. Async
+# handlers reach the database through ``run_in_session``.
+
 
 @app.on_event("startup")
 async def startup_event() -> None:
+    started = time.perf_counter()
+    app.state.ready = False
+    if settings.instance_role not in ("all", "api"):
+        raise ValueError(f"Unknown INSTANCE_ROLE {settings.instance_role!r}; expected 'all' or 'api'")
+    # "api" instances serve requests and queue runs; runs and background jobs need an "all" instance
+    executes = settings.instance_role == "all"
+    engine = get_bound_engine()
+    if settings.db_migrate_on_startup:
+        await run_db(migrate, engine)
+        app.state.schema_current = True
+    else:
+        app.state.schema_current = await run_db(current_version, engine) == schema_version()
+        if not app.state.schema_current:
+            logger.warning("Database schema is out of date; run `python -m app.migrations`")
     app.state.symphony_client = SymphonyClient(
-        settings.symphony_api_key, settings.symphony_base_url, settings.symphony_spot_agent_id
+        settings.symphony_api_key,
+        settings.symphony_base_url,
+        settings.symphony_spot_agent_id,
+        batch_price_path=settings.symphony_batch_price_path,
+        swap_status_path=settings.symphony_swap_status_path,
+        max_connections=settings.symphony_max_connections,
+        max_keepalive=settings.symphony_max_keepalive,
+        keepalive_expiry=settings.symphony_keepalive_expiry_seconds,
+        connect_timeout=settings.symphony_connect_timeout_seconds,
+        read_timeout=settings.symphony_read_timeout_seconds,
+        http2=settings.symphony_http2,
+        max_retries=settings.symphony_max_retries,
+        backoff_base=settings.symphony_backoff_base_seconds,
+        backoff_max=settings.symphony_backoff_max_seconds,
+        rate_limit_per_second=settings.symphony_rate_limit_per_second,
+        rate_limit_burst=settings.symphony_rate_limit_burst,
+    )
+    app.state.research_client = ResearchClient(
+        settings.serpapi_api_key,
+        cache=ResearchCache(settings.research_cache_path, ttl_seconds=settings.research_cache_ttl_seconds)
+        if settings.research_cache_path
+        else None,
+        concurrency=settings.research_concurrency,
+        timeout=settings.research_timeout_seconds,
+    )
+    app.state.events = EventBus(
+        queue_size=settings.event_queue_size,
+        max_subscribers=settings.event_max_subscribers,
+        replay_size=settings.event_replay_size,
+    )
+    app.state.log_sink = LogSink(
+        batch_size=settings.log_batch_size,
+        flush_interval=settings.log_flush_interval_seconds,
+        max_pending=settings.log_max_pending,
+        backpressure_timeout=settings.log_backpressure_seconds,
+        recent_size=settings.log_recent_size,
+        events=app.state.events,
+    )
+    app.state.log_sink.start()
+    app.state.orchestrator = AgentOrchestrator(
+        app.state.symphony_client,
+        app.state.research_client,
+        log_sink=app.state.log_sink,
+        events=app.state.events,
+    )
+    app.state.leases = LeaseManager(settings.instance_id or None, ttl_seconds=settings.lease_ttl_seconds)
+    if executes:
+        app.state.orchestrator.asset_universe.start()
+        await app.state.leases.release_stale()
+    app.state.run_queue = RunQueue(
+        app.state.orchestrator,
+        max_size=settings.run_queue_max_size,
+        concurrency=settings.run_concurrency,
+        leases=app.state.leases,
+        execute=executes,
+        poll_seconds=settings.run_poll_seconds,
+        pending_timeout_seconds=settings.run_pending_timeout_seconds,
+    )
+    await app.state.run_queue.start()
+    metrics.LOG_SINK_PENDING.set_function(lambda: app.state.log_sink.stats()["pending"])
+    metrics.PRICE_CACHE_ENTRIES.set_function(lambda: app.state.orchestrator.price_cache.stats()["entries"])
+    metrics.EVENT_SUBSCRIBERS.set_function(lambda: app.state.events.subscribers)
+    metrics.RUN_QUEUE_DEPTH.set_function(lambda: app.state.run_queue.depth)
+    await run_in_session(_backfill_rollups)
+    app.state.state_cache = StateCache()
+    await run_in_session(app.state.state_cache.load)
+    app.state.events.add_listener(app.state.state_cache.apply)
+    app.state.state_cache.start(settings.state_refresh_seconds)
+    app.state.scheduler = AgentScheduler(
+        app.state.run_queue,
+        poll_seconds=settings.scheduler_poll_seconds,
+        jitter_seconds=settings.scheduler_jitter_seconds,
+        min_interval_seconds=settings.scheduler_min_interval_seconds,
+        state_cache=app.state.state_cache,
+        leases=app.state.leases,
+    )
+    if settings.scheduler_enabled and executes:
+        app.state.scheduler.start()
+    app.state.reconciler = TradeReconciler(
+        _trade_status_source(app.state.symphony_client),
+        interval=settings.reconcile_interval_seconds,
+        batch_size=settings.reconcile_batch_size,
+        backoff_base=settings.reconcile_backoff_base_seconds,
+        backoff_max=settings.reconcile_backoff_max_seconds,
+        max_attempts=settings.reconcile_max_attempts,
+        leases=app.state.leases,
+        events=app.state.events,
     )
-    app.state.research_client = ResearchClient(settings.serpapi_api_key)
-    app.state.orchestrator = AgentOrchestrator(app.state.symphony_client, app.state.research_client)
+    if settings.reconciler_enabled and executes:
+        if settings.trade_status_source == "symphony" and not app.state.symphony_client.supports_swap_status:
+            logger.warning("Trade reconciler disabled: SYMPHONY_SWAP_STATUS_PATH is not set")
+        else:
+            app.state.reconciler.start()
+    app.state.retention = retention.from_settings(app.state.leases)
+    if settings.retention_enabled and executes:
+        app.state.retention.start()
+    app.state.ready = True
+    logger.info("Startup completed in %.2fs", time.perf_counter() - started)
+
+
+def _trade_status_source(symphony_client: SymphonyClient) -> TradeStatusSource:
+    if settings.trade_status_source == "stub":
+        return StubStatusSource()
+    return SymphonyStatusSource(symphony_client)
+
+
+def _backfill_rollups(db: Session) -> None:
+    # one-off: history recorded before rollups existed
+    if rollups.needs_backfill(db):
+        rollups.rebuild(db)
 
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
+    # fail readiness first so the load balancer stops routing here while we drain
+    app.state.ready = False
+    await app.state.scheduler.stop()
+    await app.state.reconciler.stop()
+    await app.state.retention.stop()
+    await app.state.run_queue.stop()
+    await app.state.state_cache.stop()
+    await app.state.log_sink.stop()
+    await app.state.orchestrator.asset_universe.stop()
     await app.state.symphony_client.aclose()
+    await app.state.research_client.aclose()
 
 
 @app.get("/api/health")
+@app.get("/api/health/live")
 async def health() -> dict[str, str]:
+    """Liveness: the process is up and serving; never touches the database."""
     return {"status": "ok"}
 
 
-@app.get("/api/agent/state", response_model=AgentStateSchema)
-async def agent_state(db: Session = Depends(get_db)) -> AgentStateSchema:
-    config = db.query(AgentConfig).order_by(AgentConfig.id.desc()).first()
-    last_run = db.query(AgentRun).order_by(AgentRun.started_at.desc()).first()
-    status = last_run.status if last_run else "idle"
-    message = last_run.summary if last_run else "Agent skeleton initialized. Configure Symphony and database to proceed."
-    return AgentStateSchema(
-        status=status,
-        message=message,
-        agent_id=settings.symphony_spot_agent_id,
-        last_run_id=last_run.id if last_run else None,
-        last_run_status=last_run.status if last_run else None,
-        config=config,
-    )
+@app.get("/api/health/ready")
+async def readiness(response: Response) -> dict[str, Any]:
+    """Readiness: startup finished, the schema is current and the database answers in time."""
+    checks = {
+        "startup": bool(getattr(app.state, "ready", False)),
+        "schema": bool(getattr(app.state, "schema_current", False)),
+        "database": False,
+    }
+    try:
+        await asyncio.wait_for(run_in_session(lambda db: db.execute(text("SELECT 1"))), settings.ready_db_timeout_seconds)
+        checks["database"] = True
+    except Exception as exc:  # noqa: BLE001 - any failure means not ready
+        logger.warning("Readiness database check failed: %s", exc)
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "not_ready", "checks": checks}
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
-@app.post("/api/agent/run", response_model=RunAgentResponse)
-async def run_agent(trigger: str = "manual", db: Session = Depends(get_db)) -> RunAgentResponse:
+@app.get("/api/agent/research")
+async def research_stats() -> dict[str, Any]:
+    research_client: ResearchClient = app.state.research_client
+    return research_client.stats()
+
+
+@app.get("/api/agent/price-cache")
+async def price_cache_stats() -> dict[str, Any]:
     orchestrator: AgentOrchestrator = app.state.orchestrator
-    run = await orchestrator.run_once(db, trigger=trigger)
-    accepted = run.status in {"running", "success", "pending", "submitted"}
-    summary = run.summary or "Run created"
-    return RunAgentResponse(accepted=accepted, run_id=run.id, status=run.status, summary=summary)
+    return {**orchestrator.price_cache.stats(), "batch_prices_shared": orchestrator.batch_prices_shared}
+
+
+@app.get("/api/agent/scheduler")
+async def scheduler_stats() -> dict[str, Any]:
+    scheduler: AgentScheduler = app.state.scheduler
+    run_queue: RunQueue = app.state.run_queue
+    return {**scheduler.stats(), "queue": run_queue.stats()}
+
+
+@app.get("/api/agent/leases")
+async def lease_stats() -> dict[str, Any]:
+    """This instance's role and leases, and who holds every lease right now."""
+    leases: LeaseManager = app.state.leases
+    now = datetime.utcnow()
+
+    def load(db: Session) -> list[dict[str, Any]]:
+        return [
+            {
+                "name": lease.name,
+                "owner": lease.owner,
+                "run_id": lease.run_id,
+                "heartbeat_at": lease.heartbeat_at,
+                "expires_at": lease.expires_at,
+                "held": lease.expires_at >= now,
+            }
+            for lease in db.scalars(select(RunLease).order_by(RunLease.name))
+        ]
+
+    return {"role": settings.instance_role, **leases.stats(), "leases": await run_in_session(load)}
+
+
+@app.get("/api/agent/stream")
+async def stream_events(
+    request: Request,
+    types: Optional[str] = Query(None, description="Comma-separated event types: run, phase, log, trade, snapshot"),
+    last_event_id: Optional[str] = Header(None),
+) -> StreamingResponse:
+    """Server-Sent Events feed of run progress, served from memory without touching the database."""
+    events: EventBus = app.state.events
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume_from = None
+    try:
+        subscription = events.subscribe(
+            last_event_id=resume_from, types=[name.strip() for name in types.split(",") if name.strip()] if types else None
+        )
+    except TooManySubscribers as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+
+    async def body():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                event = await subscription.next(settings.event_heartbeat_seconds)
+                if event is not None:
+                    yield event.encode()
+                elif subscription.closed:
+                    # evicted for falling behind; the client reconnects with Last-Event-ID
+                    yield b"event: evicted\ndata: {}\n\n"
+                    return
+                elif await request.is_disconnected():
+                    return
+                else:
+                    yield b": keep-alive\n\n"
+        finally:
+            events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/agent/events")
+async def event_bus_stats() -> dict[str, Any]:
+    events: EventBus = app.state.events
+    return events.stats()
+
+
+@app.get("/api/agent/retention")
+async def retention_stats() -> dict[str, Any]:
+    worker: retention.RetentionWorker = app.state.retention
+    return worker.stats()
+
+
+@app.get("/api/agent/log-sink")
+async def log_sink_stats() -> dict[str, Any]:
+    log_sink: LogSink = app.state.log_sink
+    return log_sink.stats()
+
+
+@app.get("/api/agent/reconciler")
+async def reconciler_stats() -> dict[str, Any]:
+    reconciler: TradeReconciler = app.state.reconciler
+    return reconciler.stats()
+
+
+@app.get("/api/agents", response_model=list[AgentStateSchema])
+async def list_agents() -> list[AgentStateSchema]:
+    """State of every agent that has a config; add one by posting a config with a new ``agent_id``."""
+    state_cache: StateCache = app.state.state_cache
+    return [state_cache.state(agent_id) for agent_id in state_cache.agent_ids]
+
+
+@app.get("/api/agent/state", response_model=AgentStateSchema)
+async def agent_state(request: Request, response: Response, agent_id: Optional[str] = None) -> Any:
+    state_cache = _agent_cache(agent_id)
+    etag = state_cache.state_etag(agent_id)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return state_cache.state(agent_id)
+
+
+@app.post("/api/agent/run", response_model=RunAgentResponse, status_code=202)
+async def run_agent(trigger: str = "manual", agent_id: Optional[str] = None) -> RunAgentResponse:
+    _agent_cache(agent_id)
+    run_queue: RunQueue = app.state.run_queue
+    try:
+        run_id, joined = await run_queue.submit(trigger, agent_id=agent_id)
+    except RunQueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    if not joined:
+        return RunAgentResponse(accepted=True, run_id=run_id, status="pending", summary="Run queued")
+    run = await run_in_session(lambda db: db.get(AgentRun, run_id))
+    status = run.status if run else "pending"
+    return RunAgentResponse(accepted=True, run_id=run_id, status=status, summary="Joined in-flight run")
+
+
+@app.get("/api/agent/runs/{run_id}", response_model=AgentRunSchema)
+async def get_run(run_id: int, wait: float = 0.0) -> AgentRun:
+    """Return a run; with ``wait`` > 0, long-poll until it completes or the wait elapses."""
+    if wait > 0:
+        run_queue: RunQueue = app.state.run_queue
+        await run_queue.wait(run_id, timeout=min(wait, settings.run_wait_max_seconds))
+    run = await run_in_session(lambda db: db.get(AgentRun, run_id))
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
 
 
 @app.get("/api/agent/config", response_model=AgentConfigSchema)
-async def get_config(db: Session = Depends(get_db)) -> AgentConfigSchema:
-    config = db.query(AgentConfig).order_by(AgentConfig.id.desc()).first()
-    if not config:
-        config = AgentConfig()
-        db.add(config)
-        db.commit()
-        db.refresh(config)
-    return config
+async def get_config(request: Request, response: Response, agent_id: Optional[str] = None) -> Any:
+    state_cache = _agent_cache(agent_id)
+    etag = state_cache.config_etag(agent_id)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return state_cache.config(agent_id)
 
 
 @app.post("/api/agent/config", response_model=AgentConfigSchema)
-async def update_config(payload: AgentConfigSchema, db: Session = Depends(get_db)) -> AgentConfigSchema:
+async def update_config(payload: AgentConfigSchema, response: Response) -> AgentConfigSchema:
+    """Update an agent's config; a new ``agent_id`` creates that agent."""
+    agent_id = payload.agent_id or default_agent_id()
+    config = await run_in_session(lambda db: _save_config(db, agent_id, payload))
+    # write-through: the state cache picks this up from the bus before the response is sent
+    events: EventBus = app.state.events
+    events.publish("config", config.model_dump())
+    response.headers["ETag"] = app.state.state_cache.config_etag(agent_id)
+    return config
+
+
+def _save_config(db: Session, agent_id: str, payload: AgentConfigSchema) -> AgentConfigSchema:
     config = db.get(AgentConfig, payload.id)
-    if not config:
-        config = AgentConfig()
+    if not config or config.agent_id != agent_id:
+        config = AgentConfig(agent_id=agent_id)
         db.add(config)
 
     config.max_weight = payload.max_weight
@@ -91,24 +411,172 @@ async def update_config(payload: AgentConfigSchema, db: Session = Depends(get_db
     config.run_frequency_seconds = payload.run_frequency_seconds
     db.commit()
     db.refresh(config)
-    return config
+    return AgentConfigSchema.model_validate(config, from_attributes=True)
+
+
+def _agent_cache(agent_id: Optional[str]) -> StateCache:
+    """The state cache, after checking that ``agent_id`` (when given) names a configured agent."""
+    state_cache: StateCache = app.state.state_cache
+    if agent_id is not None and state_cache.config(agent_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown agent {agent_id!r}")
+    return state_cache
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
 
 
 @app.get("/api/agent/runs", response_model=list[AgentRunSchema])
-async def list_runs(limit: int = 20, db: Session = Depends(get_db)) -> list[AgentRun]:
-    return db.query(AgentRun).order_by(AgentRun.started_at.desc()).limit(limit).all()
+def list_runs(
+    response: Response,
+    limit: int = Query(20, ge=1, le=500),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    status: Optional[str] = None,
+    trigger: Optional[str] = None,
+    min_duration: Optional[float] = Query(None, ge=0, description="Only runs that took at least this many seconds"),
+    agent_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+) -> list[AgentRun]:
+    query = db.query(AgentRun)
+    if agent_id:
+        query = query.filter(AgentRun.agent_id == agent_id)
+    if status:
+        query = query.filter(AgentRun.status == status)
+    if trigger:
+        query = query.filter(AgentRun.trigger == trigger)
+    if min_duration is not None:
+        query = query.filter(AgentRun.duration_seconds >= min_duration)
+    rows = keyset_page(query, AgentRun.started_at, AgentRun.id, limit=limit, before=before, after=after)
+    set_page_headers(response, rows, "started_at", limit=limit)
+    return rows
 
 
 @app.get("/api/agent/trades", response_model=list[TradeSchema])
-async def list_trades(limit: int = 50, db: Session = Depends(get_db)) -> list[Trade]:
-    return db.query(Trade).order_by(Trade.created_at.desc()).limit(limit).all()
+def list_trades(
+    response: Response,
+    limit: int = Query(50, ge=1, le=1000),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    run_id: Optional[int] = None,
+    status: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+) -> list[Trade]:
+    query = db.query(Trade)
+    if agent_id:
+        query = query.join(AgentRun, Trade.run_id == AgentRun.id).filter(AgentRun.agent_id == agent_id)
+    if run_id is not None:
+        query = query.filter(Trade.run_id == run_id)
+    if status:
+        query = query.filter(Trade.status == status)
+    rows = keyset_page(query, Trade.created_at, Trade.id, limit=limit, before=before, after=after)
+    set_page_headers(response, rows, "created_at", limit=limit)
+    return rows
 
 
 @app.get("/api/agent/logs", response_model=list[AgentLogSchema])
-async def list_logs(limit: int = 100, db: Session = Depends(get_db)) -> list[AgentLog]:
-    return db.query(AgentLog).order_by(AgentLog.created_at.desc()).limit(limit).all()
+async def list_logs(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    run_id: Optional[int] = None,
+    level: Optional[str] = None,
+    category: Optional[str] = None,
+    source: Literal["db", "buffer"] = "db",
+) -> Any:
+    """Newest logs first, from ``agent_logs``.
+
+    A first page flushes the log sink before reading, so entries emitted just before the request
+    are included and every entry has an ``id``. ``source=buffer`` opts into the sink's in-memory
+    ring instead: no database access, but entries not yet written have ``"id": null``
+    (``BufferedAgentLogSchema``) and cursors are ignored.
+    """
+    log_sink: LogSink = app.state.log_sink
+    if source == "buffer":
+        recent = [
+            BufferedAgentLogSchema.model_validate(entry)
+            for entry in log_sink.recent(limit, run_id=run_id, level=level, category=category)
+        ]
+        page = JSONResponse(jsonable_encoder(recent))
+        set_page_headers(page, recent, "created_at", limit=limit)
+        return page
+
+    if before is None and after is None:
+        await log_sink.flush()
+
+    def load(db: Session) -> list[AgentLog]:
+        query = db.query(AgentLog)
+        if run_id is not None:
+            query = query.filter(AgentLog.run_id == run_id)
+        if level:
+            query = query.filter(AgentLog.level == level)
+        if category:
+            query = query.filter(AgentLog.category == category)
+        return keyset_page(query, AgentLog.created_at, AgentLog.id, limit=limit, before=before, after=after)
+
+    rows = await run_in_session(load)
+    set_page_headers(response, rows, "created_at", limit=limit)
+    return rows
+
+
+@app.get("/api/agent/pnl/series", response_model=PnlSeriesSchema)
+def pnl_series(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    resolution: Literal["auto", "raw", "1h", "1d"] = "auto",
+    points: int = Query(500, ge=1, le=10000),
+    agent_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+) -> PnlSeriesSchema:
+    """Downsampled portfolio value history of one agent (the default agent when omitted).
+
+    ``auto`` picks the finest resolution (raw snapshots, hourly, then daily rollups) that fits in
+    ``points``; defaults to the last 7 days.
+    """
+    agent_id = agent_id or default_agent_id()
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if resolution == "auto":
+        resolution = rollups.choose_resolution(db, start, end, points, agent_id=agent_id)
+    series = rollups.load_series(db, start, end, resolution, agent_id=agent_id, limit=points)
+    return PnlSeriesSchema(resolution=resolution, start=start, end=end, points=series)
 
 
 @app.get("/api/agent/pnl", response_model=list[PortfolioSnapshotSchema])
-async def list_pnl(limit: int = 50, db: Session = Depends(get_db)) -> list[PortfolioSnapshot]:
-    return db.query(PortfolioSnapshot).order_by(PortfolioSnapshot.created_at.desc()).limit(limit).all()
+def list_pnl(
+    response: Response,
+    limit: int = Query(50, ge=1, le=1000),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    run_id: Optional[int] = None,
+    agent_id: Optional[str] = None,
+    include_positions: bool = True,
+    db: Session = Depends(get_db),
+) -> list[PortfolioSnapshot]:
+    """Snapshots newest first; positions are batch-loaded in one extra query, or skipped entirely.
+
+    Packed snapshots (POSITION_STORAGE=packed) carry their positions in the row itself; the blob
+    is only selected, and decoded while serializing, when positions are included.
+    """
+    if include_positions:
+        options = (selectinload(PortfolioSnapshot.positions), undefer(PortfolioSnapshot.packed_positions))
+    else:
+        options = (noload(PortfolioSnapshot.positions),)
+    query = db.query(PortfolioSnapshot).options(*options)
+    if run_id is not None:
+        query = query.filter(PortfolioSnapshot.run_id == run_id)
+    if agent_id:
+        query = query.filter(PortfolioSnapshot.agent_id == agent_id)
+    rows = keyset_page(
+        query, PortfolioSnapshot.created_at, PortfolioSnapshot.id, limit=limit, before=before, after=after
+    )
+    set_page_headers(response, rows, "created_at", limit=limit)
+    return rows
@@ -0,0 +1,213 @@
+"""In-process metrics registry rendered in the Prometheus text exposition format.
+
+Metrics are cheap to update from any thread (one lock and a few dict operations per call), so
+they can sit on hot paths such as every Symphony request or database commit.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Optional
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, object]) -> tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...], extra: tuple[tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._labels(key)} {_number(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Gauge whose value is set directly or read from a callback at scrape time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def _samples(self) -> list[str]:
+        if self._function is not None:
+            return [f"{self.name} {_number(self._function())}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._labels(key)} {_number(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (+Inf last)], sum, count
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0, 0.0])
+            series[0][index] += 1
+            series[1][0] += value
+            series[1][1] += 1
+
+    def time(self, **labels: object) -> _Timer:
+        """Context manager that observes the duration of its block."""
+        return _Timer(self, labels)
+
+    def count(self, **labels: object) -> int:
+        series = self._series.get(self._key(labels))
+        return int(series[1][1]) if series else 0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(counts), list(totals)) for key, (counts, totals) in self._series.items()]
+        lines = []
+        for key, counts, (total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{self._labels(key, (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {int(count)}")
+        return lines
+
+
+class _Timer:
+    # a plain class: a generator-based context manager costs about twice as much per block
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: Histogram, labels: dict[str, object]) -> None:
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+REGISTRY = Registry()
+
+RUN_PHASE_SECONDS = REGISTRY.histogram(
+    "agent_run_phase_seconds", "Duration of each orchestrator phase.", ("phase",)
+)
+RUNS_TOTAL = REGISTRY.counter("agent_runs_total", "Completed agent runs by final status.", ("status",))
+RUN_SECONDS = REGISTRY.histogram("agent_run_seconds", "End-to-end duration of agent runs.")
+SYMPHONY_REQUEST_SECONDS = REGISTRY.histogram(
+    "symphony_request_seconds", "Duration of each Symphony HTTP attempt.", ("method", "endpoint", "status")
+)
+SYMPHONY_RETRIES_TOTAL = REGISTRY.counter(
+    "symphony_retries_total", "Symphony requests retried after a transient failure.", ("method", "endpoint")
+)
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    "db_write_seconds", "Duration of database write transactions by operation.", ("operation",)
+)
+RESEARCH_QUERIES_TOTAL = REGISTRY.counter(
+    "research_queries_total", "Research queries by outcome (hit, coalesced, miss, error).", ("outcome",)
+)
+RETENTION_ROWS_TOTAL = REGISTRY.counter(
+    "retention_rows_deleted_total", "Rows removed by the retention worker.", ("table",)
+)
+LOG_SINK_PENDING = REGISTRY.gauge("agent_log_sink_pending", "Log entries waiting to be written.")
+PRICE_CACHE_ENTRIES = REGISTRY.gauge("agent_price_cache_entries", "Entries held in the shared price cache.")
+EVENT_SUBSCRIBERS = REGISTRY.gauge("agent_event_subscribers", "Clients connected to the event stream.")
+RUN_QUEUE_DEPTH = REGISTRY.gauge("agent_run_queue_depth", "Runs queued but not yet started.")
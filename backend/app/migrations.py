@@ -0,0 +1,181 @@
+"""Schema migrations: create tables, add new columns and indexes, and record the schema version.
+
+Usage::
+
+    python -m app.migrations            # migrate DATABASE_URL if the schema version changed
+    python -m app.migrations --check    # exit 1 if a migration is pending
+    python -m app.migrations --force    # re-run every step even if the version matches
+
+The schema version is a fingerprint of the SQLAlchemy models, stored in ``schema_version``.
+When it matches, ``migrate`` costs a single SELECT instead of inspecting every table.
+
+Rows written before multi-agent support are assigned to ``SYMPHONY_SPOT_AGENT_ID``.
+``pnl_rollups`` rows are never dropped: retention may already have deleted the snapshots they
+were folded from, so a table whose columns or unique key changed is copied into a new one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, UniqueConstraint, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from .config import settings
+from .database import get_engine
+from .models.db import AgentConfig, AgentRun, Base, PnlRollup, PortfolioSnapshot
+
+logger = logging.getLogger(__name__)
+
+# tables whose rows belong to one agent
+AGENT_TABLES = (AgentConfig.__table__, AgentRun.__table__, PortfolioSnapshot.__table__)
+
+# kept outside Base.metadata so the fingerprint only covers the application tables
+_version_metadata = MetaData()
+schema_version_table = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", String(64), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def schema_version() -> str:
+    """Fingerprint of every table, column and index in the models; changes whenever they do."""
+    digest = hashlib.sha256()
+    for table in sorted(Base.metadata.sorted_tables, key=lambda table: table.name):
+        digest.update(f"table {table.name}\n".encode())
+        for column in table.columns:
+            digest.update(f"column {column.name} {column.type} {column.nullable}\n".encode())
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            columns = ",".join(column.name for column in index.columns)
+            digest.update(f"index {index.name} {columns} {index.unique}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def current_version(engine: Engine) -> Optional[str]:
+    """The version recorded by the last migration, or None for a new or pre-versioning database."""
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(
+                select(schema_version_table.c.version).order_by(schema_version_table.c.applied_at.desc()).limit(1)
+            )
+    except SQLAlchemyError:
+        return None
+
+
+def migrate(engine: Optional[Engine] = None, *, force: bool = False) -> bool:
+    """Bring the schema up to date; returns False when it already was (the fast path)."""
+    engine = engine or get_engine()
+    version = schema_version()
+    if not force and current_version(engine) == version:
+        return False
+
+    started = time.perf_counter()
+    _rebuild_stale_rollups(engine)
+    Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add columns and indexes introduced since then
+    _add_missing_columns(engine)
+    _assign_default_agent(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    _version_metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(schema_version_table.delete())
+        connection.execute(schema_version_table.insert().values(version=version, applied_at=datetime.utcnow()))
+    logger.info("Migrated schema to version %s in %.2fs", version, time.perf_counter() - started)
+    return True
+
+
+def _add_missing_columns(engine: Engine) -> None:
+    """Add model columns missing from existing tables (new columns must be nullable or server-defaulted)."""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                connection.execute(text(ddl))
+
+
+def _rebuild_stale_rollups(engine: Engine) -> None:
+    """Copy ``pnl_rollups`` into a table with the model's columns and unique key, if either changed.
+
+    A unique key cannot be altered in place on SQLite, so the old table is renamed, the new one
+    created, every row copied across (rows without an agent go to the default agent) and the old
+    one dropped, all in one transaction.
+    """
+    table = PnlRollup.__table__
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    keys = {tuple(constraint["column_names"]) for constraint in inspector.get_unique_constraints(table.name)}
+    expected = {
+        tuple(column.name for column in constraint.columns)
+        for constraint in table.constraints
+        if isinstance(constraint, UniqueConstraint)
+    }
+    if existing == {column.name for column in table.columns} and expected <= keys:
+        return
+
+    legacy = f"{table.name}_legacy"
+    copied = [column.name for column in table.columns if column.name in existing and column.name != "agent_id"]
+    agent = "COALESCE(agent_id, :agent_id)" if "agent_id" in existing else ":agent_id"
+    with engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {legacy}"))
+        table.create(bind=connection)
+        connection.execute(
+            text(
+                f"INSERT INTO {table.name} (agent_id, {', '.join(copied)}) "
+                f"SELECT {agent}, {', '.join(copied)} FROM {legacy}"
+            ),
+            {"agent_id": settings.symphony_spot_agent_id},
+        )
+        connection.execute(text(f"DROP TABLE {legacy}"))
+    logger.info("Rebuilt %s with the new schema, keeping its rows", table.name)
+
+
+def _assign_default_agent(engine: Engine) -> None:
+    """Give rows from before multi-agent support to the default agent."""
+    with engine.begin() as connection:
+        for table in AGENT_TABLES:
+            connection.execute(
+                table.update().where(table.c.agent_id.is_(None)).values(agent_id=settings.symphony_spot_agent_id)
+            )
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Create or update the agent database schema.")
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL")
+    parser.add_argument("--check", action="store_true", help="Only report whether a migration is pending")
+    parser.add_argument("--force", action="store_true", help="Run every step even if the version matches")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    engine = get_engine(args.database_url)
+    try:
+        if args.check:
+            current, expected = current_version(engine), schema_version()
+            logger.info("Schema version %s, models %s", current or "none", expected)
+            sys.exit(0 if current == expected else 1)
+        if not migrate(engine, force=args.force):
+            logger.info("Schema already at version %s", schema_version())
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
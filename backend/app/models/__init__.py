@@ -1,11 +1,13 @@
-from .db import AgentConfig, AgentLog, AgentRun, Base, PortfolioSnapshot, PositionSnapshot, Trade
+from .db import AgentConfig, AgentLog, AgentRun, Base, PnlRollup, PortfolioSnapshot, PositionSnapshot, RunLease, Trade
 
 __all__ = [
     "AgentConfig",
     "AgentLog",
     "AgentRun",
     "Base",
+    "PnlRollup",
     "PortfolioSnapshot",
     "PositionSnapshot",
+    "RunLease",
     "Trade",
 ]
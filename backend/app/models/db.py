@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional, Sequence
 
-from sqlalchemy import JSON, Boolean, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import JSON, Boolean, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, String, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+from .position_codec import unpack_positions
+
 
 class Base(DeclarativeBase):
     pass
@@ -13,8 +15,11 @@ class Base(DeclarativeBase):
 
 class AgentConfig(Base):
     __tablename__ = "agent_config"
+    __table_args__ = (Index("ix_agent_config_agent_id_id", "agent_id", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Symphony agent id; every agent has its own config, runs and PnL history
+    agent_id: Mapped[str] = mapped_column(String(64))
     max_weight: Mapped[float] = mapped_column(Float, default=1.0)
     max_daily_loss: Mapped[float] = mapped_column(Float, default=0.0)
     allowlist: Mapped[Optional[list[str]]] = mapped_column(JSON, default=list)
@@ -27,13 +32,22 @@ class AgentConfig(Base):
 
 class AgentRun(Base):
     __tablename__ = "agent_runs"
+    __table_args__ = (
+        Index("ix_agent_runs_started_at_id", "started_at", "id"),
+        Index("ix_agent_runs_status_started_at", "status", "started_at", "id"),
+        Index("ix_agent_runs_duration_seconds", "duration_seconds"),
+        Index("ix_agent_runs_agent_id_started_at", "agent_id", "started_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    agent_id: Mapped[str] = mapped_column(String(64))
     status: Mapped[str] = mapped_column(String(32))
     trigger: Mapped[str] = mapped_column(String(32), default="manual")
     summary: Mapped[Optional[str]] = mapped_column(String(512))
     started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    duration_seconds: Mapped[Optional[float]] = mapped_column(Float)
+    phase_timings: Mapped[Optional[dict]] = mapped_column(JSON)
 
     trades: Mapped[list[Trade]] = relationship(back_populates="run")
     snapshots: Mapped[list[PortfolioSnapshot]] = relationship(back_populates="run")
@@ -42,6 +56,12 @@ class AgentRun(Base):
 
 class Trade(Base):
     __tablename__ = "trades"
+    __table_args__ = (
+        Index("ix_trades_created_at_id", "created_at", "id"),
+        Index("ix_trades_run_id_created_at", "run_id", "created_at", "id"),
+        Index("ix_trades_status_created_at", "status", "created_at", "id"),
+        Index("ix_trades_status_next_check_at", "status", "next_check_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     run_id: Mapped[int] = mapped_column(Integer, ForeignKey("agent_runs.id"))
@@ -49,8 +69,11 @@ class Trade(Base):
     token_out: Mapped[str] = mapped_column(String(64))
     weight: Mapped[float] = mapped_column(Float)
     status: Mapped[str] = mapped_column(String(32), default="pending")
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(64), unique=True, index=True)
     tx_reference: Mapped[Optional[str]] = mapped_column(String(128))
     raw_response: Mapped[Optional[dict]] = mapped_column(JSON)
+    confirm_attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    next_check_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     run: Mapped[AgentRun] = relationship(back_populates="trades")
@@ -58,23 +81,45 @@ class Trade(Base):
 
 class PortfolioSnapshot(Base):
     __tablename__ = "portfolio_snapshots"
+    __table_args__ = (
+        Index("ix_portfolio_snapshots_created_at_id", "created_at", "id"),
+        Index("ix_portfolio_snapshots_run_id", "run_id"),
+        Index("ix_portfolio_snapshots_agent_id_created_at", "agent_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     run_id: Mapped[int] = mapped_column(Integer, ForeignKey("agent_runs.id"))
+    # copied from the run so PnL queries per agent need no join
+    agent_id: Mapped[str] = mapped_column(String(64))
     total_value: Mapped[float] = mapped_column(Float)
     realized_pnl: Mapped[float] = mapped_column(Float, default=0.0)
     unrealized_pnl: Mapped[float] = mapped_column(Float, default=0.0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # POSITION_STORAGE=packed: every position in one blob (see app.models.position_codec), only
+    # loaded when a query undefers it
+    packed_positions: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True, deferred=True)
 
     run: Mapped[AgentRun] = relationship(back_populates="snapshots")
     positions: Mapped[list[PositionSnapshot]] = relationship(back_populates="snapshot")
 
+    @property
+    def position_rows(self) -> Sequence[Any]:
+        """Positions from whichever storage the snapshot was written with.
+
+        A packed blob is decoded only if it was loaded with the row; otherwise this falls back to
+        the ``positions`` relationship, so neither triggers a lazy load when a query skipped them.
+        """
+        packed = self.__dict__.get("packed_positions")
+        if packed is not None:
+            return unpack_positions(packed)
+        return self.__dict__.get("positions", [])
+
 
 class PositionSnapshot(Base):
     __tablename__ = "positions_snapshot"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    snapshot_id: Mapped[int] = mapped_column(Integer, ForeignKey("portfolio_snapshots.id"))
+    snapshot_id: Mapped[int] = mapped_column(Integer, ForeignKey("portfolio_snapshots.id"), index=True)
     symbol: Mapped[str] = mapped_column(String(32))
     balance: Mapped[float] = mapped_column(Float)
     price: Mapped[float] = mapped_column(Float)
@@ -84,8 +129,35 @@ class PositionSnapshot(Base):
     snapshot: Mapped[PortfolioSnapshot] = relationship(back_populates="positions")
 
 
+class PnlRollup(Base):
+    __tablename__ = "pnl_rollups"
+    __table_args__ = (
+        UniqueConstraint("agent_id", "resolution", "bucket_start", name="uq_pnl_rollups_agent_resolution_bucket"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    agent_id: Mapped[str] = mapped_column(String(64))
+    resolution: Mapped[str] = mapped_column(String(8))
+    bucket_start: Mapped[datetime] = mapped_column(DateTime)
+    open_value: Mapped[float] = mapped_column(Float)
+    high_value: Mapped[float] = mapped_column(Float)
+    low_value: Mapped[float] = mapped_column(Float)
+    close_value: Mapped[float] = mapped_column(Float)
+    realized_pnl: Mapped[float] = mapped_column(Float, default=0.0)
+    unrealized_pnl: Mapped[float] = mapped_column(Float, default=0.0)
+    sample_count: Mapped[int] = mapped_column(Integer, default=0)
+    first_at: Mapped[datetime] = mapped_column(DateTime)
+    last_at: Mapped[datetime] = mapped_column(DateTime)
+
+
 class AgentLog(Base):
     __tablename__ = "agent_logs"
+    __table_args__ = (
+        Index("ix_agent_logs_created_at_id", "created_at", "id"),
+        Index("ix_agent_logs_run_id_created_at", "run_id", "created_at", "id"),
+        Index("ix_agent_logs_level_created_at", "level", "created_at", "id"),
+        Index("ix_agent_logs_category_created_at", "category", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     run_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("agent_runs.id"))
@@ -95,3 +167,18 @@ class AgentLog(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     run: Mapped[Optional[AgentRun]] = relationship(back_populates="logs")
+
+
+class RunLease(Base):
+    """Which instance currently owns a named job (see app.services.leases)."""
+
+    __tablename__ = "run_leases"
+
+    # "agent:<agent_id>" for a run slot, or a singleton loop such as "scheduler"
+    name: Mapped[str] = mapped_column(String(96), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(128))
+    # the run being executed under an agent lease, failed if the owner stops heartbeating
+    run_id: Mapped[Optional[int]] = mapped_column(Integer)
+    acquired_at: Mapped[datetime] = mapped_column(DateTime)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime)
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import struct
+from typing import Any, Iterator, Sequence
+
+import numpy as np
+
+# magic, format version, position count, byte length of the symbol dictionary
+_HEADER = struct.Struct("<4sBII")
+_MAGIC = b"PSNP"
+_VERSION = 1
+_FIELDS = ("balance", "price", "value", "weight")
+_SEPARATOR = "\x1f"
+
+
+def pack_positions(
+    symbols: Sequence[str], balances: np.ndarray, prices: np.ndarray, values: np.ndarray, weights: np.ndarray
+) -> bytes:
+    """Encode one snapshot's positions as a symbol dictionary followed by four float64 arrays."""
+    dictionary = _SEPARATOR.join(symbols).encode("utf-8")
+    columns = np.vstack([balances, prices, values, weights]).astype("<f8", copy=False)
+    return _HEADER.pack(_MAGIC, _VERSION, len(symbols), len(dictionary)) + dictionary + columns.tobytes()
+
+
+def unpack_positions(blob: bytes) -> PackedPositions:
+    magic, version, count, dictionary_size = _HEADER.unpack_from(blob)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not a packed position snapshot")
+    offset = _HEADER.size
+    dictionary = bytes(blob[offset : offset + dictionary_size]).decode("utf-8")
+    symbols = dictionary.split(_SEPARATOR) if count else []
+    columns = np.frombuffer(blob, dtype="<f8", count=4 * count, offset=offset + dictionary_size).reshape(4, count)
+    return PackedPositions(symbols, columns)
+
+
+class PackedPositions(Sequence[dict[str, Any]]):
+    """Read-only view over a decoded blob; position dicts are only built when accessed."""
+
+    def __init__(self, symbols: list[str], columns: np.ndarray) -> None:
+        self.symbols = symbols
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        row = self.columns[:, index].tolist()
+        return {"symbol": self.symbols[index], **dict(zip(_FIELDS, row))}
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for symbol, row in zip(self.symbols, self.columns.T.tolist()):
+            yield {"symbol": symbol, **dict(zip(_FIELDS, row))}
@@ -3,11 +3,12 @@ from __future__ import annotations
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, BaseModel, Field
 
 
 class AgentConfigSchema(BaseModel):
     id: int
+    agent_id: Optional[str] = None  # the default agent when omitted
     max_weight: float = 1.0
     max_daily_loss: float = 0.0
     allowlist: Optional[list[str]] = Field(default_factory=list)
@@ -35,16 +36,38 @@ class PositionSnapshotSchema(BaseModel):
 class PortfolioSnapshotSchema(BaseModel):
     id: int
     run_id: int
+    agent_id: str
     total_value: float
     realized_pnl: float
     unrealized_pnl: float
     created_at: datetime
-    positions: List[PositionSnapshotSchema] = []
+    # ORM rows expose rows or a decoded packed blob through ``position_rows``
+    positions: List[PositionSnapshotSchema] = Field(
+        default_factory=list, validation_alias=AliasChoices("position_rows", "positions")
+    )
 
     class Config:
         orm_mode = True
 
 
+class PnlPointSchema(BaseModel):
+    timestamp: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    realized_pnl: float
+    unrealized_pnl: float
+    samples: int
+
+
+class PnlSeriesSchema(BaseModel):
+    resolution: str
+    start: datetime
+    end: datetime
+    points: List[PnlPointSchema]
+
+
 class TradeSchema(BaseModel):
     id: int
     run_id: int
@@ -52,6 +75,7 @@ class TradeSchema(BaseModel):
     token_out: str
     weight: float
     status: str
+    idempotency_key: Optional[str] = None
     tx_reference: Optional[str]
     created_at: datetime
 
@@ -61,11 +85,14 @@ class TradeSchema(BaseModel):
 
 class AgentRunSchema(BaseModel):
     id: int
+    agent_id: str
     status: str
     trigger: str
     summary: Optional[str]
     started_at: datetime
     completed_at: Optional[datetime]
+    duration_seconds: Optional[float] = None
+    phase_timings: Optional[dict[str, float]] = None
 
     class Config:
         orm_mode = True
@@ -83,6 +110,12 @@ class AgentLogSchema(BaseModel):
         orm_mode = True
 
 
+class BufferedAgentLogSchema(AgentLogSchema):
+    """A log entry read from the log sink's memory (``/api/agent/logs?source=buffer``)."""
+
+    id: Optional[int]  # None until the log sink has written the entry
+
+
 class AgentStateSchema(BaseModel):
     status: str
     message: str
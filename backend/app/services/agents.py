@@ -0,0 +1,48 @@
+"""Per-agent lookups shared by the run path, the scheduler and the state cache.
+
+An agent is a Symphony agent id. Each one has its own ``agent_config`` rows (the newest is
+current), runs and PnL history; ``SYMPHONY_SPOT_AGENT_ID`` is the default agent used by
+requests that do not name one.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.db import AgentConfig, AgentRun
+
+
+def default_agent_id() -> str:
+    return settings.symphony_spot_agent_id
+
+
+def latest_config(db: Session, agent_id: str) -> Optional[AgentConfig]:
+    return db.scalars(
+        select(AgentConfig).where(AgentConfig.agent_id == agent_id).order_by(AgentConfig.id.desc()).limit(1)
+    ).first()
+
+
+def latest_configs(db: Session) -> list[AgentConfig]:
+    """The current config of every agent, in one query."""
+    newest = select(func.max(AgentConfig.id)).group_by(AgentConfig.agent_id)
+    return list(db.scalars(select(AgentConfig).where(AgentConfig.id.in_(newest)).order_by(AgentConfig.agent_id)))
+
+
+def last_runs(db: Session) -> dict[str, AgentRun]:
+    """The most recently started run of every agent that has one."""
+    newest = (
+        select(AgentRun.agent_id, func.max(AgentRun.started_at).label("started_at"))
+        .group_by(AgentRun.agent_id)
+        .subquery()
+    )
+    runs = db.scalars(
+        select(AgentRun)
+        .join(newest, (AgentRun.agent_id == newest.c.agent_id) & (AgentRun.started_at == newest.c.started_at))
+        .order_by(AgentRun.id)
+    )
+    # ties on started_at resolve to the highest id
+    return {run.agent_id: run for run in runs}
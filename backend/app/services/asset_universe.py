@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from ..clients.symphony import SymphonyClient
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def fallback_assets() -> list[dict[str, Any]]:
+    """Static Monad spot tokens used when Symphony and the disk cache are both unavailable."""
+    return [
+        {"symbol": "USDC", "chainId": settings.default_chain_id},
+        {"symbol": "MON", "chainId": settings.default_chain_id},
+        {"symbol": "ETH", "chainId": settings.default_chain_id},
+    ]
+
+
+def apply_universe_filters(
+    assets: Iterable[dict[str, Any]], allow: Iterable[str], block: Iterable[str], chain_id: int
+) -> list[dict[str, Any]]:
+    formatted_allow = {item.upper() for item in allow} or None
+    block_set = {item.upper() for item in block}
+
+    filtered = []
+    for asset in assets:
+        symbol = str(asset.get("symbol", "")).upper()
+        if formatted_allow and symbol not in formatted_allow:
+            continue
+        if symbol in block_set:
+            continue
+        if int(asset.get("chainId", chain_id)) != chain_id:
+            continue
+        filtered.append(asset)
+    return filtered
+
+
+class AssetUniverse:
+    """Cached view of Symphony's supported assets.
+
+    The list is refreshed periodically with conditional requests (ETag / If-Modified-Since)
+    and persisted to disk, so a cold start can serve the last known universe immediately.
+    Filtered views are memoised per (universe version, allowlist, blocklist, chain).
+    """
+
+    _max_filter_entries = 16
+
+    def __init__(
+        self,
+        symphony_client: SymphonyClient,
+        *,
+        protocol: str = "spot",
+        cache_path: Optional[str] = None,
+        refresh_seconds: float = 3600.0,
+    ) -> None:
+        self.symphony_client = symphony_client
+        self.protocol = protocol
+        self.cache_path = cache_path or None
+        self.refresh_seconds = refresh_seconds
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.fetched_at: Optional[datetime] = None
+        self.version = 0
+        self.using_fallback = False
+        self._assets: Optional[list[dict[str, Any]]] = None
+        self._filtered: dict[tuple, list[dict[str, Any]]] = {}
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def get_assets(self) -> list[dict[str, Any]]:
+        if self._assets is None:
+            self._load_from_disk()
+        # without a background loop, a fallback universe is retried on every call
+        if self._assets is None or (self.using_fallback and self._task is None):
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logger.warning("Supported-assets fetch failed, using fallback tokens: %s", exc)
+                if self._assets is None:
+                    self._set_assets(fallback_assets(), fallback=True)
+        return self._assets or []
+
+    async def filtered(self, allow: Iterable[str], block: Iterable[str], chain_id: Optional[int] = None) -> list[dict[str, Any]]:
+        """Return the allow/block-filtered universe, recomputing only when an input changed."""
+        assets = await self.get_assets()
+        chain_id = settings.default_chain_id if chain_id is None else chain_id
+        key = (
+            self.version,
+            frozenset(item.upper() for item in allow),
+            frozenset(item.upper() for item in block),
+            chain_id,
+        )
+        result = self._filtered.get(key)
+        if result is None:
+            result = apply_universe_filters(assets, key[1], key[2], chain_id)
+            if len(self._filtered) >= self._max_filter_entries:
+                self._filtered.clear()
+            self._filtered[key] = result
+        return result
+
+    async def refresh(self) -> bool:
+        """Refresh from Symphony; returns True when the universe changed."""
+        async with self._refresh_lock:
+            payload, etag, last_modified = await self.symphony_client.fetch_supported_assets(
+                self.protocol, etag=self.etag, last_modified=self.last_modified
+            )
+            self.fetched_at = datetime.utcnow()
+            if payload is None:
+                return False
+
+            assets = payload.get("tokens", []) if isinstance(payload, dict) else list(payload)
+            self.etag, self.last_modified = etag, last_modified
+            changed = self.using_fallback or assets != self._assets
+            if changed:
+                self._set_assets(assets)
+            await asyncio.to_thread(self._save_to_disk)
+            return changed
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self) -> None:
+        # the first pass revalidates whatever a cold start loaded from disk
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logger.warning("Supported-assets refresh failed: %s", exc)
+            await asyncio.sleep(min(self.refresh_seconds, 60.0) if self.using_fallback else self.refresh_seconds)
+
+    def _set_assets(self, assets: list[dict[str, Any]], *, fallback: bool = False) -> None:
+        self._assets = assets
+        self.using_fallback = fallback
+        self.version += 1
+        self._filtered.clear()
+
+    def _load_from_disk(self) -> None:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as handle:
+                cached = json.load(handle)
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable asset cache %s: %s", self.cache_path, exc)
+            return
+        if not isinstance(cached, dict):
+            logger.warning("Ignoring unreadable asset cache %s: not a JSON object", self.cache_path)
+            return
+        if cached.get("protocol", self.protocol) != self.protocol or not isinstance(cached.get("assets"), list):
+            return
+        self.etag = cached.get("etag")
+        self.last_modified = cached.get("last_modified")
+        self._set_assets(cached["assets"])
+
+    def _save_to_disk(self) -> None:
+        if not self.cache_path or self._assets is None:
+            return
+        payload = {
+            "protocol": self.protocol,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "fetched_at": self.fetched_at.isoformat() if self.fetched_at else None,
+            "assets": self._assets,
+        }
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(payload, handle)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as exc:
+            logger.warning("Could not persist asset cache %s: %s", self.cache_path, exc)
@@ -0,0 +1,452 @@
+"""Offline backtests: replay a historical price feed through the agent's rebalance engine.
+
+Usage::
+
+    python -m app.services.backtest prices.csv --max-weight 0.2 --stride 4
+    python -m app.services.backtest prices.csv --sweep max_weight=0.1,0.2,0.3 --sweep fee_bps=0,10 --workers 4
+    python -m app.services.backtest prices.csv --full-runs
+
+Each backtest runs on a virtual clock against ``ReplaySymphonyClient`` and writes to its own
+SQLite database (a temporary file unless ``--db`` is given), so nothing touches the live
+database or Symphony. By default every tick is planned and filled in memory and the runs,
+trades and snapshots are written in bulk; ``--full-runs`` sends every tick through
+``AgentOrchestrator.run_once`` instead, with its logs and phase timings, at a few
+milliseconds per tick.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy import event, func, insert, select
+
+from ..clients.replay import ReplayFeed, ReplaySymphonyClient
+from ..clients.research import ResearchClient
+from ..config import settings
+from ..database import async_session_scope, get_engine, make_session_factory, run_in_session, set_session_factory
+from ..migrations import migrate
+from ..models.db import AgentConfig, AgentRun, PortfolioSnapshot, PositionSnapshot, Trade
+from . import rollups
+from .asset_universe import AssetUniverse
+from .log_sink import LogSink
+from .orchestrator import AgentOrchestrator
+from .portfolio import Portfolio, RebalancePolicy, plan_rebalance
+
+# backtests write to their own database, under a fixed agent id
+BACKTEST_AGENT_ID = "backtest"
+
+
+class VirtualClock:
+    """Manually advanced clock shared by every component of a backtest."""
+
+    def __init__(self, start: datetime) -> None:
+        self._now = start
+
+    def now(self) -> datetime:
+        return self._now
+
+    def set(self, when: datetime) -> None:
+        self._now = when
+
+
+@dataclass
+class BacktestOptions:
+    feed_path: str
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    stride: int = 1
+    initial_cash: float = 10_000.0
+    base_symbol: str = "USDC"
+    max_weight: float = 1.0
+    allowlist: list[str] = field(default_factory=list)
+    blocklist: list[str] = field(default_factory=list)
+    max_turnover: float = 0.25
+    min_trade_weight: float = 0.005
+    fee_bps: float = 0.0
+    database_url: Optional[str] = None
+    # "packed" writes one row per snapshot instead of one per asset
+    position_storage: str = "packed"
+    # every tick through AgentOrchestrator.run_once, instead of the in-memory replay
+    full_runs: bool = False
+    # ticks buffered between bulk writes in the in-memory replay
+    flush_every: int = 1000
+
+
+@dataclass
+class BacktestResult:
+    options: BacktestOptions
+    runs: int
+    failed_runs: int
+    trades: int
+    start_value: float
+    final_value: float
+    total_return: float
+    max_drawdown: float
+    fees_paid: float
+    elapsed_seconds: float
+
+    def to_dict(self) -> dict[str, Any]:
+        return json.loads(json.dumps(asdict(self), default=str))
+
+
+def run_backtest(options: BacktestOptions) -> BacktestResult:
+    """Run one backtest to completion; binds this process's DB helpers to the backtest database."""
+    return asyncio.run(_run_backtest(options))
+
+
+def run_sweep(base: BacktestOptions, grid: dict[str, list[Any]], *, workers: Optional[int] = None) -> list[BacktestResult]:
+    """Run a backtest for every combination in ``grid`` across a process pool.
+
+    Each worker process gets its own temporary database; ``base.database_url`` is ignored.
+    """
+    names = list(grid)
+    variants = [
+        replace(base, database_url=None, **dict(zip(names, values)))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_backtest, variants))
+
+
+async def _run_backtest(options: BacktestOptions) -> BacktestResult:
+    started = time.perf_counter()
+    feed = ReplayFeed.load(options.feed_path)
+    ticks = feed.ticks(options.start, options.end)[:: max(1, options.stride)]
+    if not ticks:
+        raise ValueError("No ticks in the requested backtest window")
+
+    temporary_path = None
+    database_url = options.database_url
+    if database_url is None:
+        temporary_path = os.path.join(tempfile.gettempdir(), f"backtest-{uuid.uuid4().hex}.db")
+        database_url = f"sqlite:///{temporary_path}"
+    engine = _backtest_engine(database_url)
+    migrate(engine)
+    set_session_factory(make_session_factory(engine))
+
+    clock = VirtualClock(ticks[0])
+    client = ReplaySymphonyClient(
+        feed,
+        clock.now,
+        balances={options.base_symbol: options.initial_cash},
+        fee_bps=options.fee_bps,
+        chain_id=settings.default_chain_id,
+    )
+    def seed_config(db) -> None:
+        db.add(
+            AgentConfig(
+                agent_id=BACKTEST_AGENT_ID,
+                max_weight=options.max_weight,
+                allowlist=options.allowlist,
+                blocklist=options.blocklist,
+            )
+        )
+
+    try:
+        await run_in_session(seed_config)
+        if options.full_runs:
+            await _run_orchestrator(options, ticks, clock, client)
+        else:
+            await _replay(options, feed, ticks, clock, client)
+        values, runs, failed_runs, trades = await run_in_session(_collect)
+    finally:
+        engine.dispose()
+        if temporary_path is not None and os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+    series = np.asarray(values, dtype=float)
+    start_value = float(series[0]) if len(series) else 0.0
+    final_value = float(series[-1]) if len(series) else 0.0
+    peaks = np.maximum.accumulate(series) if len(series) else series
+    drawdowns = np.divide(peaks - series, peaks, out=np.zeros_like(series), where=peaks > 0)
+    return BacktestResult(
+        options=options,
+        runs=runs,
+        failed_runs=failed_runs,
+        trades=trades,
+        start_value=start_value,
+        final_value=final_value,
+        total_return=final_value / start_value - 1 if start_value else 0.0,
+        max_drawdown=float(drawdowns.max()) if len(drawdowns) else 0.0,
+        fees_paid=client.fees_paid,
+        elapsed_seconds=time.perf_counter() - started,
+    )
+
+
+def _policy(options: BacktestOptions) -> RebalancePolicy:
+    return RebalancePolicy(
+        base_symbol=options.base_symbol,
+        max_turnover=options.max_turnover,
+        min_trade_weight=options.min_trade_weight,
+    )
+
+
+async def _run_orchestrator(
+    options: BacktestOptions, ticks: list[datetime], clock: VirtualClock, client: ReplaySymphonyClient
+) -> None:
+    # flush only when the buffer fills or at the end, so log writes stay off the run path
+    log_sink = LogSink(batch_size=5000, flush_interval=3600.0, max_pending=100_000, clock=clock.now)
+    orchestrator = AgentOrchestrator(
+        client,
+        ResearchClient(""),
+        asset_universe=AssetUniverse(client, protocol="spot", cache_path=None),
+        log_sink=log_sink,
+        clock=clock.now,
+        simulate=False,
+        policy=_policy(options),
+        balance_source=client,
+        position_storage=options.position_storage,
+    )
+    async with async_session_scope() as db:
+        for tick in ticks:
+            clock.set(tick)
+            await orchestrator.run_once(db, trigger="backtest", agent_id=BACKTEST_AGENT_ID)
+    await log_sink.stop()
+
+
+async def _replay(
+    options: BacktestOptions,
+    feed: ReplayFeed,
+    ticks: list[datetime],
+    clock: VirtualClock,
+    client: ReplaySymphonyClient,
+) -> None:
+    """What ``run_once`` does on every tick, without its per-run unit of work, logs and events.
+
+    The allow/block-filtered universe is resolved once. Each tick prices it from the feed row
+    (1.0 and untradable where the feed has no price yet, like the orchestrator's fallback),
+    reads the balances through ``client.get_balances``, which the fills are sized against,
+    plans with ``plan_rebalance`` and fills the legs in plan order. Runs, trades and snapshots are inserted in
+    bulk every ``flush_every`` ticks, and the PnL rollups are rebuilt once at the end.
+    """
+    universe = AssetUniverse(client, protocol="spot", cache_path=None)
+    assets = await universe.filtered(options.allowlist, options.blocklist, settings.default_chain_id)
+    symbols = [asset["symbol"] for asset in assets]
+    columns = {symbol: column for column, symbol in enumerate(feed.symbols)}
+    known = np.array([symbol in columns for symbol in symbols], dtype=bool)
+    # (tick x universe) prices; the fallback 1.0, and untradable, where the feed has none (yet)
+    prices = np.full((len(ticks), len(symbols)), np.nan)
+    prices[:, known] = feed.prices[
+        np.ix_([feed.index_at(tick) for tick in ticks], [columns[symbol] for symbol in symbols if symbol in columns])
+    ]
+    tradable = ~np.isnan(prices)
+    prices[~tradable] = 1.0
+    policy = _policy(options)
+    packed = options.position_storage == "packed"
+
+    runs: list[dict[str, Any]] = []
+    # (index into runs, leg, row) and (index into runs, row, position rows)
+    trades: list[tuple[int, int, dict[str, Any]]] = []
+    snapshots: list[tuple[int, dict[str, Any], list[dict[str, Any]]]] = []
+    for tick, row, priced in zip(ticks, prices, tradable):
+        started = time.perf_counter()
+        clock.set(tick)
+        run = {"agent_id": BACKTEST_AGENT_ID, "trigger": "backtest", "started_at": tick, "completed_at": tick}
+        if not symbols:
+            run.update(status="failed", summary="No assets available after allow/block filters")
+        else:
+            balances = await client.get_balances(symbols)
+            portfolio = Portfolio(
+                symbols=symbols,
+                prices=row,
+                balances=np.fromiter((balances[symbol] for symbol in symbols), dtype=float, count=len(symbols)),
+                tradable=priced,
+            )
+            plan = plan_rebalance(
+                portfolio,
+                max_weight=options.max_weight,
+                allow=options.allowlist,
+                block=options.blocklist,
+                policy=policy,
+            )
+            for leg, trade in enumerate(plan):
+                try:
+                    fill = await client.batch_swap(
+                        trade["token_in"], trade["token_out"], trade["weight"], agent_id=BACKTEST_AGENT_ID
+                    )
+                except LookupError:
+                    fill = None
+                trades.append(
+                    (
+                        len(runs),
+                        leg,
+                        {
+                            **trade,
+                            "status": "submitted" if fill else "error",
+                            "tx_reference": fill["txHash"] if fill else None,
+                            "raw_response": fill,
+                            "created_at": tick,
+                        },
+                    )
+                )
+            snapshot = {
+                "agent_id": BACKTEST_AGENT_ID,
+                "total_value": portfolio.total_value,
+                "realized_pnl": 0.0,
+                "unrealized_pnl": 0.0,
+                "created_at": tick,
+            }
+            if packed:
+                snapshot["packed_positions"] = portfolio.packed_positions()
+            snapshots.append((len(runs), snapshot, [] if packed else portfolio.positions()))
+            run.update(
+                status="success",
+                summary=f"Executed {len(plan)} trades; portfolio value=${snapshot['total_value']:,.2f}",
+            )
+        run["duration_seconds"] = round(time.perf_counter() - started, 6)
+        runs.append(run)
+        if len(runs) >= max(1, options.flush_every):
+            await run_in_session(lambda db: _write_replay(db, runs, trades, snapshots))
+            runs, trades, snapshots = [], [], []
+    if runs:
+        await run_in_session(lambda db: _write_replay(db, runs, trades, snapshots))
+    await run_in_session(rollups.rebuild)
+
+
+def _write_replay(
+    db,
+    runs: list[dict[str, Any]],
+    trades: list[tuple[int, int, dict[str, Any]]],
+    snapshots: list[tuple[int, dict[str, Any], list[dict[str, Any]]]],
+) -> None:
+    # table inserts skip the ORM's per-row bookkeeping. RETURNING order is only guaranteed row
+    # by row on SQLite, so the ids are matched back by tick, which is unique per run.
+    returned = db.execute(insert(AgentRun.__table__).returning(AgentRun.started_at, AgentRun.id), runs).all()
+    ids_by_tick = dict(returned)
+    run_ids = [ids_by_tick[run["started_at"]] for run in runs]
+    if trades:
+        db.execute(
+            insert(Trade.__table__),
+            [
+                {**trade, "run_id": run_ids[run], "idempotency_key": f"run-{run_ids[run]}:leg-{leg}"}
+                for run, leg, trade in trades
+            ],
+        )
+    if not snapshots:
+        return
+    rows = [{**snapshot, "run_id": run_ids[run]} for run, snapshot, _ in snapshots]
+    if not any(positions for _, _, positions in snapshots):
+        # packed positions: nothing refers back to the snapshots
+        db.execute(insert(PortfolioSnapshot.__table__), rows)
+        return
+    returned = db.execute(
+        insert(PortfolioSnapshot.__table__).returning(PortfolioSnapshot.run_id, PortfolioSnapshot.id), rows
+    ).all()
+    ids_by_run = dict(returned)
+    db.execute(
+        insert(PositionSnapshot.__table__),
+        [
+            {**position, "snapshot_id": ids_by_run[run_ids[run]]}
+            for run, _, positions in snapshots
+            for position in positions
+        ],
+    )
+
+
+def _backtest_engine(database_url: str):
+    engine = get_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        # throwaway database: trade durability for speed
+        @event.listens_for(engine, "connect")
+        def _pragmas(connection, _record) -> None:
+            cursor = connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.close()
+
+    return engine
+
+
+def _collect(db) -> tuple[list[float], int, int, int]:
+    values = db.scalars(select(PortfolioSnapshot.total_value).order_by(PortfolioSnapshot.created_at, PortfolioSnapshot.id)).all()
+    runs = db.scalar(select(func.count()).select_from(AgentRun))
+    failed_runs = db.scalar(select(func.count()).select_from(AgentRun).where(AgentRun.status == "failed"))
+    trades = db.scalar(select(func.count()).select_from(Trade))
+    return list(values), runs, failed_runs, trades
+
+
+_SWEEPABLE = {
+    "max_weight": float,
+    "max_turnover": float,
+    "min_trade_weight": float,
+    "fee_bps": float,
+    "stride": int,
+    "initial_cash": float,
+    "base_symbol": str,
+}
+
+
+def _parse_sweep(specs: list[str]) -> dict[str, list[Any]]:
+    grid: dict[str, list[Any]] = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in _SWEEPABLE or not values:
+            raise SystemExit(f"Invalid --sweep {spec!r}; expected one of {', '.join(_SWEEPABLE)} as name=v1,v2")
+        grid[name] = [_SWEEPABLE[name](value) for value in values.split(",")]
+    return grid
+
+
+def main(argv: Optional[list[str]] = None) -> list[BacktestResult]:
+    parser = argparse.ArgumentParser(description="Replay a historical price feed through the agent.")
+    parser.add_argument("feed", help="CSV (or .parquet) file with timestamp,symbol,price rows")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument("--stride", type=int, default=1, help="Run the agent every N feed ticks")
+    parser.add_argument("--initial-cash", type=float, default=10_000.0)
+    parser.add_argument("--base-symbol", default="USDC")
+    parser.add_argument("--max-weight", type=float, default=1.0)
+    parser.add_argument("--allow", action="append", default=[])
+    parser.add_argument("--block", action="append", default=[])
+    parser.add_argument("--max-turnover", type=float, default=0.25)
+    parser.add_argument("--min-trade-weight", type=float, default=0.005)
+    parser.add_argument("--fee-bps", type=float, default=0.0)
+    parser.add_argument("--db", help="Keep results in this database URL instead of a temporary SQLite file")
+    parser.add_argument("--sweep", action="append", default=[], help="name=v1,v2,... (repeatable)")
+    parser.add_argument("--workers", type=int, help="Process pool size for sweeps")
+    parser.add_argument(
+        "--full-runs", action="store_true", help="Run every tick through the orchestrator, with logs (much slower)"
+    )
+    parser.add_argument("--flush-every", type=int, default=1000, help="Ticks between bulk writes")
+    parser.add_argument("--position-storage", choices=("rows", "packed"), default="packed")
+    args = parser.parse_args(argv)
+
+    options = BacktestOptions(
+        feed_path=args.feed,
+        start=args.start,
+        end=args.end,
+        stride=args.stride,
+        initial_cash=args.initial_cash,
+        base_symbol=args.base_symbol,
+        max_weight=args.max_weight,
+        allowlist=args.allow,
+        blocklist=args.block,
+        max_turnover=args.max_turnover,
+        min_trade_weight=args.min_trade_weight,
+        fee_bps=args.fee_bps,
+        database_url=args.db,
+        full_runs=args.full_runs,
+        flush_every=args.flush_every,
+        position_storage=args.position_storage,
+    )
+    if args.sweep:
+        results = run_sweep(options, _parse_sweep(args.sweep), workers=args.workers)
+    else:
+        results = [run_backtest(options)]
+    return results
+
+
+if __name__ == "__main__":
+    for result in main():
+        print(json.dumps(result.to_dict()))
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Iterable, Optional
+
+from ..models.position_codec import PackedPositions
+
+logger = logging.getLogger(__name__)
+
+
+class TooManySubscribers(Exception):
+    """Raised by ``EventBus.subscribe`` when ``max_subscribers`` are already connected."""
+
+
+@dataclass
+class Event:
+    id: int
+    type: str
+    data: dict[str, Any]
+    _encoded: Optional[bytes] = field(default=None, repr=False)
+
+    def encode(self) -> bytes:
+        """The event as one Server-Sent Events message, serialised once for all subscribers."""
+        if self._encoded is None:
+            payload = json.dumps(self.data, default=_json_default, separators=(",", ":"))
+            self._encoded = f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n".encode("utf-8")
+        return self._encoded
+
+
+class Subscription:
+    def __init__(self, bus: EventBus, queue_size: int, types: Optional[frozenset[str]]) -> None:
+        self.bus = bus
+        self.types = types
+        self.queue: asyncio.Queue[Optional[Event]] = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def wants(self, event: Event) -> bool:
+        return self.types is None or event.type in self.types
+
+    async def next(self, timeout: float) -> Optional[Event]:
+        """The next event, or None after ``timeout`` seconds or once the subscription is closed."""
+        if self.closed and self.queue.empty():
+            return None
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is None:
+            self.closed = True
+        return event
+
+
+class EventBus:
+    """In-process fan-out of run progress (runs, phases, logs, trades, snapshots).
+
+    ``publish`` never blocks: each subscriber has a bounded queue, and one that falls
+    ``queue_size`` events behind is evicted rather than slowing the publisher or holding
+    memory. The last ``replay_size`` events are kept so a reconnecting client can resume from
+    its ``Last-Event-ID``. Listeners are called synchronously with every event, for in-process
+    consumers that must never miss one. All methods must be called from the event loop.
+    """
+
+    def __init__(self, *, queue_size: int = 256, max_subscribers: int = 100, replay_size: int = 500) -> None:
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: set[Subscription] = set()
+        self._listeners: list[Callable[[Event], None]] = []
+        self._replay: deque[Event] = deque(maxlen=replay_size)
+        self._next_id = 1
+        self.published = 0
+        self.evicted = 0
+
+    def publish(self, event_type: str, data: dict[str, Any]) -> None:
+        event = Event(self._next_id, event_type, data)
+        self._next_id += 1
+        self.published += 1
+        self._replay.append(event)
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:  # noqa: BLE001 - one bad listener must not break publishing
+                logger.exception("Event listener failed for %s event %s", event.type, event.id)
+        for subscription in list(self._subscribers):
+            if not subscription.wants(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._evict(subscription)
+
+    def add_listener(self, listener: Callable[[Event], None]) -> None:
+        self._listeners.append(listener)
+
+    def subscribe(self, *, last_event_id: Optional[int] = None, types: Optional[Iterable[str]] = None) -> Subscription:
+        """Register a subscriber; with ``last_event_id``, newer events still in the replay buffer are queued first."""
+        if len(self._subscribers) >= self.max_subscribers:
+            raise TooManySubscribers(f"Event stream is limited to {self.max_subscribers} subscribers")
+        subscription = Subscription(self, self.queue_size, frozenset(types) if types else None)
+        if last_event_id is not None:
+            missed = [event for event in self._replay if event.id > last_event_id and subscription.wants(event)]
+            for event in missed[-self.queue_size :]:
+                subscription.queue.put_nowait(event)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        subscription.closed = True
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "max_subscribers": self.max_subscribers,
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "evicted": self.evicted,
+            "last_event_id": self._next_id - 1,
+        }
+
+    def _evict(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        self.evicted += 1
+        # replace the backlog with the close marker; the client resumes via Last-Event-ID
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, PackedPositions):
+        # decoded only if a subscriber actually receives the event
+        return list(value)
+    return str(value)
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from ..database import async_session_scope, run_in_session
+from ..models.db import AgentRun, RunLease
+from .agents import default_agent_id
+from .leases import LeaseManager, agent_lease
+from .orchestrator import AgentOrchestrator
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT_STATUSES = ("pending", "running")
+
+
+class RunQueueFull(Exception):
+    """Raised when the run queue cannot accept another job."""
+
+
+@dataclass
+class RunJob:
+    trigger: str
+    agent_id: str
+    run_id: Optional[int] = None
+    created: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class RunQueue:
+    """Bounded queue that executes agent runs in the background, coordinated through the database.
+
+    Submitting creates the ``AgentRun`` row up front with status "pending" and returns its id
+    immediately. Each agent has at most one pending or running run; further submissions for
+    that agent, on this instance or any other, join it instead of starting another run.
+
+    With ``execute`` (every role but "api"), ``concurrency`` workers take jobs off the queue,
+    which caps how many runs (of different agents) execute here at once, and every
+    ``poll_seconds`` the queue picks up pending runs submitted to other instances. A worker
+    first takes the agent's lease (see ``app.services.leases``) and then claims the run by
+    moving it from "pending" to "running", so a run executes exactly once and runs of one
+    agent never overlap across instances. A run whose agent lease is held elsewhere stays
+    pending for a later poll. The same poll fails runs that can no longer finish: running runs
+    whose lease has expired and pending runs older than ``pending_timeout_seconds``.
+    """
+
+    def __init__(
+        self,
+        orchestrator: AgentOrchestrator,
+        *,
+        max_size: int = 64,
+        concurrency: int = 1,
+        leases: Optional[LeaseManager] = None,
+        execute: bool = True,
+        poll_seconds: float = 2.0,
+        pending_timeout_seconds: float = 900.0,
+    ) -> None:
+        self.orchestrator = orchestrator
+        self.concurrency = max(1, concurrency)
+        self.leases = leases or LeaseManager()
+        self.execute = execute
+        self.poll_seconds = poll_seconds
+        self.pending_timeout_seconds = pending_timeout_seconds
+        self._queue: asyncio.Queue[RunJob] = asyncio.Queue(maxsize=max_size)
+        self._inflight: dict[str, RunJob] = {}
+        self._by_run_id: dict[int, RunJob] = {}
+        self._tasks: list[asyncio.Task] = []
+        self.running = 0
+        self.picked_up = 0
+        self.deferred = 0
+        self.lost_claims = 0
+        self.orphaned = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self) -> None:
+        if self.execute and not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+            self._tasks.append(asyncio.create_task(self._poll_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "execute": self.execute,
+            "depth": self.depth,
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "in_flight_agents": sorted(self._inflight),
+            "picked_up": self.picked_up,
+            "deferred": self.deferred,
+            "lost_claims": self.lost_claims,
+            "orphaned": self.orphaned,
+        }
+
+    async def submit(self, trigger: str = "manual", *, agent_id: Optional[str] = None) -> tuple[int, bool]:
+        """Queue a run of ``agent_id`` (default agent when omitted) and return ``(run_id, joined)``.
+
+        ``joined`` is True when the agent already had a pending or running run.
+        """
+        agent_id = agent_id or default_agent_id()
+        existing = self._inflight.get(agent_id)
+        if existing is not None:
+            return await asyncio.shield(existing.created), True
+        if self.execute and self._queue.full():
+            raise RunQueueFull("Run queue is full")
+
+        # reserve the agent before awaiting the insert so concurrent submits join this job
+        job = RunJob(trigger=trigger, agent_id=agent_id)
+        self._inflight[agent_id] = job
+        try:
+            created_at = datetime.utcnow()
+            job.run_id, joined = await run_in_session(lambda db: self._create_run(db, agent_id, trigger, created_at))
+        except BaseException as exc:
+            self._inflight.pop(agent_id, None)
+            if isinstance(exc, Exception):
+                job.created.set_exception(exc)
+                job.created.exception()  # joiners re-raise it; mark it retrieved for the loop
+            else:
+                job.created.cancel()
+            raise
+        job.created.set_result(job.run_id)
+        if joined or not self.execute:
+            # another instance's run, or one a worker will pick up from the database
+            self._inflight.pop(agent_id, None)
+        else:
+            self._by_run_id[job.run_id] = job
+            self._queue.put_nowait(job)
+        if not joined and self.orchestrator.events is not None:
+            self.orchestrator.events.publish(
+                "run",
+                {"run_id": job.run_id, "agent_id": agent_id, "status": "pending", "trigger": trigger, "started_at": created_at},
+            )
+        return job.run_id, joined
+
+    async def wait(self, run_id: int, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for a run to finish; True if it is done.
+
+        Runs queued here are awaited directly; runs executing on another instance (or left
+        pending for one) are polled in the database.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = self._by_run_id.get(run_id)
+            if job is not None:
+                try:
+                    await asyncio.wait_for(job.done.wait(), timeout=max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    return False
+            status = await run_in_session(lambda db: db.scalar(select(AgentRun.status).where(AgentRun.id == run_id)))
+            if status not in IN_FLIGHT_STATUSES:
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(self.poll_seconds, remaining))
+
+    async def poll(self) -> int:
+        """Fail runs that can no longer finish and queue pending runs from other instances."""
+        now = datetime.utcnow()
+        for run in await run_in_session(lambda db: self._fail_abandoned(db, now)):
+            self.orphaned += 1
+            logger.warning("Run %s of agent %s failed: %s", run["run_id"], run["agent_id"], run["summary"])
+            if self.orchestrator.events is not None:
+                self.orchestrator.events.publish("run", run)
+
+        picked = 0
+        for run_id, agent_id, trigger in await run_in_session(lambda db: self._load_pending(db, now)):
+            if agent_id in self._inflight or run_id in self._by_run_id or self._queue.full():
+                continue
+            job = RunJob(trigger=trigger, agent_id=agent_id, run_id=run_id)
+            job.created.set_result(run_id)
+            self._inflight[agent_id] = job
+            self._by_run_id[run_id] = job
+            self._queue.put_nowait(job)
+            picked += 1
+        self.picked_up += picked
+        return picked
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - keep polling across database hiccups
+                logger.exception("Run queue poll failed")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self.running += 1
+            try:
+                await self._execute(job)
+            except Exception:  # noqa: BLE001 - run_once records its own failures
+                logger.exception("Run %s crashed outside the orchestrator guard", job.run_id)
+            finally:
+                self.running -= 1
+                self._inflight.pop(job.agent_id, None)
+                self._by_run_id.pop(job.run_id, None)
+                job.done.set()
+                self._queue.task_done()
+
+    async def _execute(self, job: RunJob) -> None:
+        lease = await self.leases.acquire(agent_lease(job.agent_id), run_id=job.run_id)
+        if lease is None:
+            # another instance is running this agent; the run stays pending for a later poll
+            self.deferred += 1
+            return
+        try:
+            if not await run_in_session(lambda db: self._claim_run(db, job.run_id)):
+                # already executed, or failed, by someone else
+                self.lost_claims += 1
+                return
+            async with async_session_scope() as db:
+                await self.orchestrator.run_once(
+                    db, trigger=job.trigger, run_id=job.run_id, agent_id=job.agent_id, lease=lease
+                )
+        finally:
+            await lease.release()
+
+    @staticmethod
+    def _create_run(db: Session, agent_id: str, trigger: str, started_at: datetime) -> tuple[int, bool]:
+        existing = db.scalar(
+            select(AgentRun.id)
+            .where(AgentRun.agent_id == agent_id, AgentRun.status.in_(IN_FLIGHT_STATUSES))
+            .order_by(AgentRun.id.desc())
+            .limit(1)
+        )
+        if existing is not None:
+            return existing, True
+        run = AgentRun(agent_id=agent_id, status="pending", trigger=trigger, started_at=started_at)
+        db.add(run)
+        db.flush()
+        return run.id, False
+
+    @staticmethod
+    def _claim_run(db: Session, run_id: int) -> bool:
+        claimed = db.execute(
+            update(AgentRun).where(AgentRun.id == run_id, AgentRun.status == "pending").values(status="running")
+        ).rowcount
+        db.commit()
+        return bool(claimed)
+
+    def _load_pending(self, db: Session, now: datetime) -> list[tuple[int, str, str]]:
+        """The oldest pending run of every agent whose lease is free."""
+        held = select(RunLease.name).where(RunLease.expires_at >= now)
+        rows = db.execute(
+            select(AgentRun.id, AgentRun.agent_id, AgentRun.trigger)
+            .where(AgentRun.status == "pending", ("agent:" + AgentRun.agent_id).not_in(held))
+            .order_by(AgentRun.started_at, AgentRun.id)
+            .limit(self._queue.maxsize)
+        ).all()
+        oldest: dict[str, tuple[int, str, str]] = {}
+        for row in rows:
+            oldest.setdefault(row.agent_id, (row.id, row.agent_id, row.trigger))
+        return list(oldest.values())
+
+    def _fail_abandoned(self, db: Session, now: datetime) -> list[dict[str, Any]]:
+        """Fail running runs nobody holds a lease for and pending runs nobody picked up.
+
+        There is deliberately no blanket "fail everything in flight" at startup: other
+        instances may be executing runs against the same database. A run is only failed once
+        no live lease covers it, and a pending run only when it is neither leased (a worker
+        somewhere is about to claim it) nor queued on this instance.
+        """
+        leased = select(RunLease.run_id).where(RunLease.run_id.is_not(None), RunLease.expires_at >= now)
+        pending_cutoff = now - timedelta(seconds=self.pending_timeout_seconds)
+        candidates = {
+            "Interrupted: the instance executing it stopped": (AgentRun.status == "running") & AgentRun.id.not_in(leased),
+            f"Not picked up within {self.pending_timeout_seconds:g}s": (AgentRun.status == "pending")
+            & (AgentRun.started_at < pending_cutoff)
+            & AgentRun.id.not_in(leased)
+            & AgentRun.id.not_in(list(self._by_run_id)),
+        }
+        failed = []
+        for summary, condition in candidates.items():
+            rows = db.execute(select(AgentRun.id, AgentRun.agent_id, AgentRun.status).where(condition)).all()
+            for row in rows:
+                # re-check the status so a run that just finished is left alone
+                if db.execute(
+                    update(AgentRun)
+                    .where(AgentRun.id == row.id, AgentRun.status == row.status)
+                    .values(status="failed", summary=summary, completed_at=now)
+                ).rowcount:
+                    failed.append({"run_id": row.id, "agent_id": row.agent_id, "status": "failed", "summary": summary})
+        db.commit()
+        return failed
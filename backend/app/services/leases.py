@@ -0,0 +1,258 @@
+"""Database-backed leases that give one instance at a time ownership of a named job.
+
+Every agent has a run lease (``agent:<agent_id>``) that a worker holds while it executes that
+agent's run, and the singleton loops (scheduler, reconciler, retention) each have one too.
+A lease is a row in ``run_leases`` with an owner and an expiry. It is taken with a
+compare-and-swap UPDATE (or the first INSERT), so it works the same on Postgres and SQLite.
+The holder renews it every ``ttl / 3`` seconds; a lease that has not been renewed within
+``ttl`` is expired and the next instance to ask takes it over. When the expired holder was
+executing a run, that run is marked failed as part of the takeover.
+
+Expiry is judged by each instance's own clock, so instances need roughly synchronised clocks
+(NTP); keep the TTL well above the expected skew.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..database import run_in_session
+from ..models.db import AgentRun, RunLease
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_LEASE = "scheduler"
+RECONCILER_LEASE = "reconciler"
+RETENTION_LEASE = "retention"
+
+
+class LeaseLost(Exception):
+    """Raised by ``Lease.confirm`` when another instance has taken the lease over."""
+
+
+def agent_lease(agent_id: str) -> str:
+    return f"agent:{agent_id}"
+
+
+def default_owner() -> str:
+    """``<host>-<pid>-<random>``: unique per process, readable in ``run_leases``."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class Lease:
+    """A lease this instance holds; renewed in the background until released."""
+
+    def __init__(self, manager: LeaseManager, name: str, run_id: Optional[int]) -> None:
+        self.manager = manager
+        self.name = name
+        self.run_id = run_id
+        self.lost = False
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def confirm(self) -> None:
+        """Renew now and raise ``LeaseLost`` if another instance owns the lease.
+
+        Call it right before irreversible work (e.g. submitting swaps) as a fencing check.
+        """
+        if self.lost or not await self.manager.renew(self.name):
+            self.lost = True
+            raise LeaseLost(f"Lease {self.name} was taken over by another instance")
+
+    def _start_heartbeat(self) -> None:
+        self._heartbeat = asyncio.create_task(self._beat())
+
+    async def _beat(self) -> None:
+        while not self.lost:
+            await asyncio.sleep(self.manager.ttl_seconds / 3)
+            try:
+                if not await self.manager.renew(self.name):
+                    self.lost = True
+                    logger.error("Lost lease %s to another instance", self.name)
+            except Exception:  # noqa: BLE001 - keep trying until the lease actually expires
+                logger.exception("Renewing lease %s failed", self.name)
+
+    async def release(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        if not self.lost:
+            await self.manager.release(self.name)
+
+
+class LeaseManager:
+    """Acquires, renews and releases leases in ``run_leases`` on behalf of ``owner``."""
+
+    def __init__(
+        self,
+        owner: Optional[str] = None,
+        *,
+        ttl_seconds: float = 30.0,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ) -> None:
+        self.owner = owner or default_owner()
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.acquired = 0
+        self.contended = 0
+        self.takeovers = 0
+        self._held: set[str] = set()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "owner": self.owner,
+            "ttl_seconds": self.ttl_seconds,
+            "held": sorted(self._held),
+            "acquired": self.acquired,
+            "contended": self.contended,
+            "takeovers": self.takeovers,
+        }
+
+    async def acquire(self, name: str, *, run_id: Optional[int] = None) -> Optional[Lease]:
+        """Take ``name`` and keep it renewed, or return None while another instance holds it."""
+        if not await run_in_session(lambda db: self._acquire(db, name, run_id)):
+            return None
+        lease = Lease(self, name, run_id)
+        lease._start_heartbeat()
+        return lease
+
+    @asynccontextmanager
+    async def hold(self, name: str, *, run_id: Optional[int] = None) -> AsyncIterator[Optional[Lease]]:
+        """``async with`` form of ``acquire``; yields None when the lease is taken."""
+        lease = await self.acquire(name, run_id=run_id)
+        try:
+            yield lease
+        finally:
+            if lease is not None:
+                await lease.release()
+
+    async def claim(self, name: str) -> bool:
+        """Acquire or renew ``name`` without a heartbeat, for loops that call this every tick."""
+        return await run_in_session(lambda db: self._acquire(db, name, None))
+
+    async def renew(self, name: str) -> bool:
+        return await run_in_session(lambda db: self._renew(db, name))
+
+    async def release(self, name: str) -> None:
+        await run_in_session(lambda db: self._release(db, name))
+
+    async def release_stale(self) -> int:
+        """Expire leases a previous process with the same ``owner`` left behind.
+
+        Only matters with a fixed ``INSTANCE_ID``; their runs are then failed by the next
+        run-queue poll instead of waiting out the TTL.
+        """
+
+        def expire(db: Session) -> int:
+            expired = db.execute(
+                update(RunLease)
+                .where(RunLease.owner == self.owner, RunLease.expires_at > self.clock())
+                .values(expires_at=self.clock())
+            ).rowcount
+            db.commit()
+            return expired
+
+        return await run_in_session(expire)
+
+    def _acquire(self, db: Session, name: str, run_id: Optional[int]) -> bool:
+        now = self.clock()
+        values = {
+            "owner": self.owner,
+            "run_id": run_id,
+            "heartbeat_at": now,
+            "expires_at": now + timedelta(seconds=self.ttl_seconds),
+        }
+        current = db.execute(
+            select(RunLease.owner, RunLease.run_id, RunLease.heartbeat_at, RunLease.expires_at).where(
+                RunLease.name == name
+            )
+        ).first()
+        if current is None:
+            try:
+                db.execute(insert(RunLease).values(name=name, acquired_at=now, **values))
+                db.commit()
+            except IntegrityError:
+                # another instance inserted it first
+                db.rollback()
+                self.contended += 1
+                return False
+            return self._took(name)
+
+        if current.owner != self.owner and current.expires_at >= now:
+            self.contended += 1
+            return False
+        if current.owner != self.owner or name not in self._held:
+            values["acquired_at"] = now
+        # compare-and-swap: only succeeds if nobody renewed or took the lease since the SELECT
+        swapped = db.execute(
+            update(RunLease)
+            .where(RunLease.name == name, RunLease.owner == current.owner, RunLease.expires_at == current.expires_at)
+            .values(**values)
+        ).rowcount
+        if not swapped:
+            db.rollback()
+            self.contended += 1
+            return False
+        # ``release`` sets heartbeat_at == expires_at; anything else expired without a release
+        if current.owner != self.owner and current.heartbeat_at < current.expires_at:
+            self.takeovers += 1
+            logger.warning("Took over expired lease %s from %s", name, current.owner)
+            if current.run_id is not None:
+                fail_orphaned_run(db, current.run_id, current.owner, now)
+        db.commit()
+        return self._took(name)
+
+    def _took(self, name: str) -> bool:
+        if name not in self._held:
+            self.acquired += 1
+            self._held.add(name)
+        return True
+
+    def _renew(self, db: Session, name: str) -> bool:
+        now = self.clock()
+        renewed = db.execute(
+            update(RunLease)
+            .where(RunLease.name == name, RunLease.owner == self.owner)
+            .values(heartbeat_at=now, expires_at=now + timedelta(seconds=self.ttl_seconds))
+        ).rowcount
+        db.commit()
+        if not renewed:
+            self._held.discard(name)
+        return bool(renewed)
+
+    def _release(self, db: Session, name: str) -> None:
+        # expire rather than delete, so the row stays and shows who held it last
+        now = self.clock()
+        db.execute(
+            update(RunLease)
+            .where(RunLease.name == name, RunLease.owner == self.owner)
+            .values(heartbeat_at=now, expires_at=now, run_id=None)
+        )
+        db.commit()
+        self._held.discard(name)
+
+
+def fail_orphaned_run(db: Session, run_id: int, owner: str, now: datetime) -> None:
+    """Mark a run failed whose executing instance stopped renewing its lease (caller commits).
+
+    A run still "pending" was never claimed, so it is left for the next worker to pick up.
+    """
+    db.execute(
+        update(AgentRun)
+        .where(AgentRun.id == run_id, AgentRun.status == "running")
+        .values(status="failed", summary=f"Interrupted: instance {owner} stopped heartbeating", completed_at=now)
+    )
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..database import run_in_session
+from ..models.db import AgentLog
+from .event_bus import EventBus
+
+logger = logging.getLogger(__name__)
+
+
+class LogSink:
+    """Asynchronous, batched writer for ``agent_logs``.
+
+    ``emit`` appends to an in-memory pending queue and returns immediately; a background task
+    bulk-inserts pending entries whenever ``batch_size`` accumulate or ``flush_interval`` elapses.
+    When ``max_pending`` entries are waiting, ``emit_wait`` (the run path) makes the producer
+    wait for the flusher for up to ``backpressure_timeout`` seconds, and an entry that still
+    finds no room is dropped and counted; ``emit`` drops straight away. The most
+    recent ``recent_size`` entries are also kept in a ring buffer for cheap reads, and every
+    accepted entry is published to ``events`` when one is given.
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        recent_size: int = 1000,
+        backpressure_timeout: float = 1.0,
+        clock: Callable[[], datetime] = datetime.utcnow,
+        events: Optional[EventBus] = None,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.backpressure_timeout = backpressure_timeout
+        self.clock = clock
+        self.events = events
+        self._pending: deque[dict[str, Any]] = deque()
+        self._recent: deque[dict[str, Any]] = deque(maxlen=recent_size)
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.emitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.flush_errors = 0
+
+    def emit(
+        self, message: str, *, run_id: Optional[int] = None, level: str = "info", category: str = "general"
+    ) -> bool:
+        """Queue a log entry without blocking; returns False if it was dropped."""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        entry = {
+            "id": None,
+            "run_id": run_id,
+            "level": level,
+            "category": category,
+            "message": message[:512],
+            "created_at": self.clock(),
+        }
+        self._pending.append(entry)
+        self._recent.append(entry)
+        self.emitted += 1
+        if self.events is not None:
+            self.events.publish("log", {key: value for key, value in entry.items() if key != "id"})
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        self._ensure_started()
+        return True
+
+    async def emit_wait(
+        self, message: str, *, run_id: Optional[int] = None, level: str = "info", category: str = "general"
+    ) -> bool:
+        """Like ``emit``, but waits for the flusher to make room before dropping."""
+        if len(self._pending) >= self.max_pending:
+            self.backpressure_waits += 1
+            self._ensure_started()
+            self._space.clear()
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._space.wait(), timeout=self.backpressure_timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.emit(message, run_id=run_id, level=level, category=category)
+
+    def recent(self, limit: int = 100, **filters: Any) -> list[dict[str, Any]]:
+        """Newest-first entries from the ring buffer, including ones not yet written.
+
+        ``filters`` match entry fields exactly (e.g. ``run_id=3, level="error"``); None is ignored.
+        """
+        active = {key: value for key, value in filters.items() if value is not None}
+        selected = []
+        for entry in reversed(self._recent):
+            if all(entry.get(key) == value for key, value in active.items()):
+                selected.append(entry)
+                if len(selected) >= limit:
+                    break
+        return selected
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "recent": len(self._recent),
+            "emitted": self.emitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "backpressure_waits": self.backpressure_waits,
+            "flush_errors": self.flush_errors,
+        }
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop the background flusher and write everything still pending."""
+        if self._task is not None:
+            # ask the loop to return rather than cancelling it: wait_for swallows a cancel that
+            # lands as the wakeup fires, and one that lands mid-write would lose the batch
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        while self._pending:
+            if not await self.flush():
+                logger.error("Dropping %d unflushed log entries at shutdown", len(self._pending))
+                self.dropped += len(self._pending)
+                self._pending.clear()
+
+    async def flush(self) -> bool:
+        """Write pending entries in batches; returns False if a batch failed."""
+        async with self._flush_lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                try:
+                    ids = await run_in_session(lambda db: self._write(db, batch))
+                except Exception:
+                    logger.exception("Failed to write %d log entries", len(batch))
+                    self.flush_errors += 1
+                    self._pending.extendleft(reversed(batch))
+                    return False
+                for entry, entry_id in zip(batch, ids):
+                    entry["id"] = entry_id
+                self.written += len(batch)
+                self._space.set()
+        return True
+
+    def _ensure_started(self) -> None:
+        if self._task is None:
+            try:
+                self.start()
+            except RuntimeError:
+                # no running loop; entries are written on the next explicit flush
+                pass
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                return
+            await self.flush()
+
+    @staticmethod
+    def _write(db: Session, batch: list[dict[str, Any]]) -> list[int]:
+        rows = [{key: value for key, value in entry.items() if key != "id"} for entry in batch]
+        with metrics.DB_WRITE_SECONDS.time(operation="log_flush"):
+            ids = db.scalars(insert(AgentLog).returning(AgentLog.id, sort_by_parameter_order=True), rows).all()
+            db.commit()
+        return ids
@@ -1,225 +1,381 @@
 from __future__ import annotations
 
+import asyncio
+import time
+from collections import defaultdict
 from datetime import datetime
-from typing import Any, Iterable, Optional
+from typing import Any, Callable, Iterable, Optional, Protocol
 
 from sqlalchemy.orm import Session
 
+from .. import metrics
 from ..clients.research import ResearchClient
 from ..clients.symphony import SymphonyClient
 from ..config import settings
-from ..models.db import (
-    AgentConfig,
-    AgentLog,
-    AgentRun,
-    PortfolioSnapshot,
-    PositionSnapshot,
-    Trade,
-)
+from ..models.db import AgentRun
+from .agents import default_agent_id
+from .asset_universe import AssetUniverse
+from .event_bus import EventBus
+from .leases import Lease
+from .log_sink import LogSink
+from .portfolio import Portfolio, RebalancePolicy, plan_rebalance
+from .price_cache import PriceCache
+from .unit_of_work import RunUnitOfWork
+
+
+class BalanceSource(Protocol):
+    async def get_balances(self, symbols: list[str]) -> dict[str, float]:
+        ...
 
 
 class AgentOrchestrator:
-    """Minimal agent runner that ties together Symphony, research, and persistence."""
+    """Minimal agent runner that ties together Symphony, research, and persistence.
+
+    One orchestrator serves every agent: runs of the same agent are serialised, runs of
+    different agents may overlap and share the asset universe, the price cache and in-flight
+    batch price requests. ``clock``, ``simulate``, ``policy``, ``balance_source`` and
+    ``position_storage`` default to the live settings; the backtester overrides them to replay
+    history against a simulated exchange. Run progress is published to ``events`` when one is
+    given.
+    """
 
     def __init__(
         self,
         symphony_client: SymphonyClient,
         research_client: ResearchClient,
+        price_cache: Optional[PriceCache] = None,
+        asset_universe: Optional[AssetUniverse] = None,
+        log_sink: Optional[LogSink] = None,
+        *,
+        clock: Optional[Callable[[], datetime]] = None,
+        simulate: Optional[bool] = None,
+        policy: Optional[RebalancePolicy] = None,
+        balance_source: Optional[BalanceSource] = None,
+        events: Optional[EventBus] = None,
+        position_storage: Optional[str] = None,
     ) -> None:
+        position_storage = position_storage or settings.position_storage
+        if position_storage not in ("rows", "packed"):
+            raise ValueError(f"Unknown position storage {position_storage!r}; expected 'rows' or 'packed'")
         self.symphony_client = symphony_client
         self.research_client = research_client
+        self.clock = clock or datetime.utcnow
+        self.simulate = (settings.simulate_only or not settings.symphony_api_key) if simulate is None else simulate
+        self.policy = policy or RebalancePolicy(
+            base_symbol=settings.rebalance_base_symbol,
+            max_turnover=settings.rebalance_max_turnover,
+            min_trade_weight=settings.rebalance_min_trade_weight,
+        )
+        self.balance_source = balance_source
+        self.events = events
+        self.position_storage = position_storage
+        self.log_sink = log_sink or LogSink()
+        self.price_cache = price_cache or PriceCache(
+            self._fetch_price,
+            ttl_seconds=settings.price_cache_ttl_seconds,
+            stale_seconds=settings.price_cache_stale_seconds,
+            max_entries=settings.price_cache_max_entries,
+            clock=(lambda: self.clock().timestamp()) if clock else time.monotonic,
+        )
+        self.asset_universe = asset_universe or AssetUniverse(
+            symphony_client,
+            protocol="spot",
+            cache_path=settings.asset_cache_path,
+            refresh_seconds=settings.asset_refresh_seconds,
+        )
+        self._run_locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        # symbol -> future of its price, for batch requests another run already has in flight
+        self._batch_inflight: dict[tuple[str, int], asyncio.Future] = {}
+        self.batch_prices_shared = 0
+
+    async def run_once(
+        self,
+        db: Session,
+        *,
+        trigger: str = "manual",
+        run_id: Optional[int] = None,
+        agent_id: Optional[str] = None,
+        lease: Optional[Lease] = None,
+    ) -> AgentRun:
+        """Execute one run of ``agent_id`` (the default agent when omitted).
+
+        Concurrent calls for the same agent are serialised so its runs never overlap.
+        ``run_id`` picks up a run row that was created up front (status "pending"). All work on
+        ``db`` is dispatched to the DB executor, so the event loop never blocks on the database.
+        With the agent's ``lease``, the run fails rather than trades if the lease was lost.
+        """
+        agent_id = agent_id or default_agent_id()
+        async with self._run_locks[agent_id]:
+            return await self._run(db, trigger=trigger, run_id=run_id, agent_id=agent_id, lease=lease)
 
-    async def run_once(self, db: Session, *, trigger: str = "manual") -> AgentRun:
-        run = AgentRun(status="running", trigger=trigger, started_at=datetime.utcnow())
-        db.add(run)
-        db.commit()
-        db.refresh(run)
+    async def _run(
+        self, db: Session, *, trigger: str, run_id: Optional[int], agent_id: str, lease: Optional[Lease]
+    ) -> AgentRun:
+        uow, config = await RunUnitOfWork.begin(
+            db, self.log_sink, trigger=trigger, agent_id=agent_id, run_id=run_id, clock=self.clock, events=self.events
+        )
 
         try:
-            config = self._get_or_create_config(db)
-            self._log(db, f"Starting agent run (simulate_only={settings.simulate_only})", run)
+            await uow.log(f"Starting agent run (simulate_only={self.simulate})")
 
-            assets = await self._discover_assets()
-            filtered_assets = self._apply_universe_filters(assets, config.allowlist or [], config.blocklist or [])
+            with uow.phase("discover"):
+                filtered_assets = await self._discover_assets(config.allowlist or [], config.blocklist or [])
             if not filtered_assets:
                 raise RuntimeError("No assets available after allow/block filters")
 
-            priced_assets = await self._get_prices(filtered_assets)
-            trade_plan = self._propose_simple_plan(priced_assets, max_weight=config.max_weight)
+            with uow.phase("price"):
+                priced_assets = await self._get_prices(filtered_assets)
+                if self.balance_source is not None:
+                    await self._apply_balances(priced_assets)
+            fallbacks = [asset["symbol"] for asset in priced_assets if asset["price_source"] == "fallback"]
+            if fallbacks:
+                await uow.log(
+                    f"Priced {len(priced_assets)} assets; {len(fallbacks)} fell back to default: {', '.join(fallbacks[:10])}",
+                    level="warning",
+                    category="pricing",
+                )
+            if settings.research_enabled:
+                with uow.phase("research"):
+                    await self._research(uow, priced_assets)
+            with uow.phase("plan"):
+                portfolio = Portfolio.from_assets(priced_assets, trade_fallback_prices=self.simulate)
+                trade_plan = plan_rebalance(
+                    portfolio,
+                    max_weight=config.max_weight,
+                    allow=config.allowlist or [],
+                    block=config.blocklist or [],
+                    policy=self.policy,
+                )
 
-            trades = await self._execute_trades(db, run, trade_plan, simulate=settings.simulate_only)
-            snapshot = await self._record_snapshot(db, run, priced_assets)
+            if lease is not None:
+                # fencing: another instance may have taken the agent over while we planned
+                await lease.confirm()
+            with uow.phase("trade"):
+                trades = await self._execute_trades(uow, trade_plan, simulate=self.simulate)
+            with uow.phase("snapshot"):
+                snapshot = self._record_snapshot(uow, portfolio)
 
-            run.status = "success"
-            run.summary = f"Executed {len(trades)} trades; portfolio value=${snapshot.total_value:,.2f}"
-            run.completed_at = datetime.utcnow()
-            db.commit()
-            db.refresh(run)
-            self._log(db, run.summary, run, category="summary")
+            summary = f"Executed {len(trades)} trades; portfolio value=${snapshot['total_value']:,.2f}"
+            await uow.log(summary, category="summary")
+            # stored timings end here; the commit itself is only observed in the histogram
+            with uow.phase("commit"):
+                await uow.complete("success", summary)
         except Exception as exc:  # noqa: BLE001 - top level guard for agent loop
-            db.rollback()
-            run.status = "failed"
-            run.summary = str(exc)
-            run.completed_at = datetime.utcnow()
-            db.add(run)
-            db.commit()
-            self._log(db, f"Run failed: {exc}", run, level="error", category="error")
-        return run
-
-    def _get_or_create_config(self, db: Session) -> AgentConfig:
-        config = db.query(AgentConfig).order_by(AgentConfig.id.desc()).first()
-        if not config:
-            config = AgentConfig()
-            db.add(config)
-            db.commit()
-            db.refresh(config)
-        return config
-
-    async def _discover_assets(self) -> list[dict[str, Any]]:
-        try:
-            response = await self.symphony_client.list_supported_assets("spot")
-            return response.get("tokens", []) if isinstance(response, dict) else response
-        except Exception:
-            # Fall back to static Monad spot tokens to allow dev/testing
-            return [
-                {"symbol": "USDC", "chainId": settings.default_chain_id},
-                {"symbol": "MON", "chainId": settings.default_chain_id},
-                {"symbol": "ETH", "chainId": settings.default_chain_id},
-            ]
+            await uow.log(f"Run failed: {exc}", level="error", category="error")
+            await uow.fail(str(exc))
+        metrics.RUNS_TOTAL.inc(status=uow.run.status)
+        if uow.run.duration_seconds is not None:
+            metrics.RUN_SECONDS.observe(uow.run.duration_seconds)
+        return uow.run
 
-    @staticmethod
-    def _apply_universe_filters(assets: Iterable[dict[str, Any]], allow: list[str], block: list[str]) -> list[dict[str, Any]]:
-        formatted_allow = {item.upper() for item in allow} if allow else None
-        block_set = {item.upper() for item in block}
-
-        filtered = []
-        for asset in assets:
-            symbol = str(asset.get("symbol", "")).upper()
-            if formatted_allow and symbol not in formatted_allow:
-                continue
-            if symbol in block_set:
-                continue
-            if int(asset.get("chainId", settings.default_chain_id)) != settings.default_chain_id:
-                continue
-            filtered.append(asset)
-        return filtered
+    async def _research(self, uow: RunUnitOfWork, assets: list[dict[str, Any]]) -> None:
+        """Look up recent news for the first ``RESEARCH_MAX_QUERIES`` non-base assets and log it."""
+        symbols = [asset["symbol"] for asset in assets if asset["symbol"] != self.policy.base_symbol]
+        queries = [f"{symbol} crypto token news" for symbol in symbols[: settings.research_max_queries]]
+        if not queries:
+            return
+        results = await self.research_client.search_many(queries, settings.research_results_per_query)
+        await uow.log(f"Research: {len(results)} unique results for {len(queries)} queries", category="research")
+        for line in self.research_client.summarize_links(results[:10]):
+            await uow.log(line, category="research")
+
+    async def _discover_assets(self, allow: list[str], block: list[str]) -> list[dict[str, Any]]:
+        """Return the cached supported-asset universe after allow/block and chain filters."""
+        return await self.asset_universe.filtered(allow, block, settings.default_chain_id)
 
     async def _get_prices(self, assets: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Price every asset concurrently, falling back to 1.0 for anything that fails.
+
+        Prices come from the shared price cache first; misses go to the batch endpoint (if
+        configured) and then to individual lookups. Each priced entry carries
+        ``price_source`` ("symphony" or "fallback") so callers can tell which prices are real.
+        """
+        chain_id = settings.default_chain_id
+        symbols = [asset.get("symbol") for asset in assets]
+
+        prices: dict[str, float] = {}
+        for symbol in dict.fromkeys(symbols):
+            price = self._parse_price(self.price_cache.lookup(symbol, chain_id))
+            if price is not None:
+                prices[symbol] = price
+
+        missing = [symbol for symbol in dict.fromkeys(symbols) if symbol not in prices]
+        prices.update(await self._fetch_batch_prices(missing))
+
+        missing = [symbol for symbol in missing if symbol not in prices]
+        semaphore = asyncio.Semaphore(max(1, settings.price_fetch_concurrency))
+
+        async def fetch(symbol: str) -> Optional[float]:
+            async with semaphore:
+                try:
+                    result = await self.price_cache.fetch(symbol, chain_id)
+                except Exception:
+                    return None
+            return self._parse_price(result)
+
+        for symbol, price in zip(missing, await asyncio.gather(*(fetch(symbol) for symbol in missing))):
+            if price is not None:
+                prices[symbol] = price
+
         priced = []
-        for asset in assets:
-            symbol = asset.get("symbol")
-            price = 1.0
+        for symbol in symbols:
+            price = prices.get(symbol)
+            priced.append({
+                "symbol": symbol,
+                "price": price if price is not None else 1.0,
+                "price_source": "symphony" if price is not None else "fallback",
+                "weight": 0.0,
+                "balance": 1.0,
+            })
+        return priced
+
+    async def _apply_balances(self, priced_assets: list[dict[str, Any]]) -> None:
+        balances = await self.balance_source.get_balances([asset["symbol"] for asset in priced_assets])
+        for asset in priced_assets:
+            asset["balance"] = balances.get(asset["symbol"], 0.0)
+
+    async def _fetch_price(self, symbol: str, *, chain_id: int) -> Any:
+        return await asyncio.wait_for(
+            self.symphony_client.get_token_price(symbol, chain_id=chain_id),
+            timeout=settings.price_fetch_timeout_seconds,
+        )
+
+    async def _fetch_batch_prices(self, symbols: list[str]) -> dict[str, float]:
+        """Batch-price ``symbols``, joining requests other agents' runs already have in flight."""
+        if not symbols or not self.symphony_client.supports_batch_prices:
+            return {}
+        chain_id = settings.default_chain_id
+        shared = {
+            symbol: self._batch_inflight[(symbol, chain_id)]
+            for symbol in symbols
+            if (symbol, chain_id) in self._batch_inflight
+        }
+        own = [symbol for symbol in symbols if symbol not in shared]
+        self.batch_prices_shared += len(shared)
+        loop = asyncio.get_running_loop()
+        pending = {symbol: loop.create_future() for symbol in own}
+        for symbol, future in pending.items():
+            self._batch_inflight[(symbol, chain_id)] = future
+
+        prices: dict[str, float] = {}
+        try:
+            prices.update(await self._request_batch_prices(own, chain_id))
+        finally:
+            for symbol, future in pending.items():
+                self._batch_inflight.pop((symbol, chain_id), None)
+                if not future.done():
+                    # None sends joiners on to their own individual lookup
+                    future.set_result(prices.get(symbol))
+        for symbol, future in shared.items():
+            price = await asyncio.shield(future)
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+    async def _request_batch_prices(self, symbols: list[str], chain_id: int) -> dict[str, float]:
+        if not symbols:
+            return {}
+        chunk_size = max(1, settings.price_batch_size)
+        chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+
+        async def fetch(chunk: list[str]) -> dict[str, Any]:
             try:
-                result = await self.symphony_client.get_token_price(symbol, chain_id=settings.default_chain_id)
-                if isinstance(result, dict):
-                    price = float(result.get("price", price))
+                return await asyncio.wait_for(
+                    self.symphony_client.get_token_prices(chunk, chain_id=chain_id),
+                    timeout=settings.price_fetch_timeout_seconds,
+                )
             except Exception:
-                # keep fallback price
-                price = price
-            priced.append({"symbol": symbol, "price": price, "weight": 0.0, "balance": 1.0})
-        return priced
+                # symbols left unpriced here are retried individually
+                return {}
 
-    def _propose_simple_plan(self, priced_assets: list[dict[str, Any]], max_weight: float) -> list[dict[str, Any]]:
-        trades = []
-        if len(priced_assets) < 2:
-            return trades
-        target_weight = min(max_weight, 0.25)
-        token_in = priced_assets[0]["symbol"]
-        for asset in priced_assets[1:3]:
-            trades.append({
-                "token_in": token_in,
-                "token_out": asset["symbol"],
-                "weight": target_weight,
-            })
-        return trades
+        prices: dict[str, float] = {}
+        for result in await asyncio.gather(*(fetch(chunk) for chunk in chunks)):
+            for symbol, raw in result.items():
+                price = self._parse_price(raw)
+                if price is not None:
+                    self.price_cache.put(symbol, chain_id, raw)
+                    prices[symbol] = price
+        return prices
+
+    @staticmethod
+    def _parse_price(result: Any) -> Optional[float]:
+        try:
+            if isinstance(result, dict):
+                return float(result["price"]) if result.get("price") is not None else None
+            return float(result) if isinstance(result, (int, float, str)) else None
+        except (TypeError, ValueError):
+            return None
 
     async def _execute_trades(
         self,
-        db: Session,
-        run: AgentRun,
+        uow: RunUnitOfWork,
         trade_plan: list[dict[str, Any]],
         *,
         simulate: bool = False,
-    ) -> list[Trade]:
-        executed: list[Trade] = []
-        for plan in trade_plan:
-            status = "simulated" if simulate or not settings.symphony_api_key else "pending"
-            tx_ref: Optional[str] = None
-            raw_response: Optional[dict[str, Any]] = None
-
-            if not simulate and settings.symphony_api_key:
+    ) -> list[dict[str, Any]]:
+        """Record and (when live) submit every leg of the plan.
+
+        Live legs are committed as "pending" with a deterministic idempotency key
+        (``run-<id>:leg-<n>``) before any swap is sent, then submitted concurrently, at most
+        ``trade_submit_concurrency`` at a time. Each leg's status is written as soon as its
+        response arrives, and the key makes Symphony ignore resubmissions of the same leg.
+        """
+        live = not simulate
+        trades = [
+            {
+                "token_in": plan["token_in"],
+                "token_out": plan["token_out"],
+                "weight": plan["weight"],
+                "status": "pending" if live else "simulated",
+                "idempotency_key": f"run-{uow.run.id}:leg-{leg}",
+                "tx_reference": None,
+                "raw_response": None,
+                "created_at": self.clock(),
+            }
+            for leg, plan in enumerate(trade_plan)
+        ]
+        if not live or not trades:
+            uow.add_trades(trades)
+            return trades
+
+        await uow.persist_trades(trades)
+        semaphore = asyncio.Semaphore(max(1, settings.trade_submit_concurrency))
+
+        async def submit(trade: dict[str, Any]) -> None:
+            async with semaphore:
                 try:
                     resp = await self.symphony_client.batch_swap(
-                        plan["token_in"], plan["token_out"], plan["weight"], agent_id=settings.symphony_spot_agent_id
+                        trade["token_in"],
+                        trade["token_out"],
+                        trade["weight"],
+                        agent_id=uow.run.agent_id,
+                        idempotency_key=trade["idempotency_key"],
                     )
-                    raw_response = resp if isinstance(resp, dict) else None
-                    tx_ref = raw_response.get("txHash") if isinstance(raw_response, dict) else None
-                    status = "submitted"
                 except Exception as exc:
-                    status = "error"
-                    self._log(db, f"Trade failed: {exc}", run, level="error", category="trade")
-
-            trade = Trade(
-                run_id=run.id,
-                token_in=plan["token_in"],
-                token_out=plan["token_out"],
-                weight=plan["weight"],
-                status=status,
-                tx_reference=tx_ref,
+                    await uow.log(f"Trade {trade['idempotency_key']} failed: {exc}", level="error", category="trade")
+                    await uow.update_trade(trade, status="error")
+                    return
+            raw_response = resp if isinstance(resp, dict) else None
+            await uow.update_trade(
+                trade,
+                status="submitted",
+                tx_reference=raw_response.get("txHash") if raw_response else None,
                 raw_response=raw_response,
-                created_at=datetime.utcnow(),
             )
-            db.add(trade)
-            executed.append(trade)
-        db.commit()
-        for trade in executed:
-            db.refresh(trade)
-        return executed
-
-    async def _record_snapshot(self, db: Session, run: AgentRun, priced_assets: list[dict[str, Any]]) -> PortfolioSnapshot:
-        total_value = sum(asset["price"] * asset.get("balance", 1.0) for asset in priced_assets)
-        snapshot = PortfolioSnapshot(
-            run_id=run.id,
-            total_value=total_value,
-            realized_pnl=0.0,
-            unrealized_pnl=0.0,
-            created_at=datetime.utcnow(),
-        )
-        db.add(snapshot)
-        db.commit()
-        db.refresh(snapshot)
 
-        positions = []
-        for asset in priced_assets:
-            positions.append(
-                PositionSnapshot(
-                    snapshot_id=snapshot.id,
-                    symbol=asset["symbol"],
-                    balance=asset.get("balance", 1.0),
-                    price=asset.get("price", 0.0),
-                    value=asset.get("price", 0.0) * asset.get("balance", 1.0),
-                    weight=asset.get("weight", 0.0),
-                )
-            )
-        db.add_all(positions)
-        db.commit()
-        return snapshot
+        await asyncio.gather(*(submit(trade) for trade in trades))
+        return trades
 
-    def _log(
-        self,
-        db: Session,
-        message: str,
-        run: Optional[AgentRun] = None,
-        *,
-        level: str = "info",
-        category: str = "general",
-    ) -> None:
-        log = AgentLog(
-            run_id=run.id if run else None,
-            level=level,
-            category=category,
-            message=message,
-            created_at=datetime.utcnow(),
-        )
-        db.add(log)
-        db.commit()
+    def _record_snapshot(self, uow: RunUnitOfWork, portfolio: Portfolio) -> dict[str, Any]:
+        snapshot = {
+            "total_value": portfolio.total_value,
+            "realized_pnl": 0.0,
+            "unrealized_pnl": 0.0,
+            "created_at": self.clock(),
+        }
+        if self.position_storage == "packed":
+            snapshot["packed_positions"] = portfolio.packed_positions()
+            uow.set_snapshot(snapshot, [])
+        else:
+            uow.set_snapshot(snapshot, portfolio.positions())
+        return snapshot
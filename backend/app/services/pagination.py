@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+from typing import Any, Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import InstrumentedAttribute, Query
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+
+def keyset_page(
+    query: Query,
+    timestamp_column: InstrumentedAttribute,
+    id_column: InstrumentedAttribute,
+    *,
+    limit: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> list[Any]:
+    """Return one newest-first page ordered by (timestamp, id).
+
+    ``before`` pages towards older rows and ``after`` towards newer rows; both use the opaque
+    cursors produced by ``set_page_headers`` and map onto the (timestamp, id) indexes.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+
+    # the redundant bound on the timestamp alone is what lets the planner range-scan the
+    # (timestamp, id) index; with only the OR it walks the index from the top
+    if before:
+        timestamp, row_id = decode_cursor(before)
+        query = query.filter(
+            and_(timestamp_column <= timestamp, or_(timestamp_column < timestamp, id_column < row_id))
+        )
+    if after:
+        timestamp, row_id = decode_cursor(after)
+        query = query.filter(
+            and_(timestamp_column >= timestamp, or_(timestamp_column > timestamp, id_column > row_id))
+        )
+        # walk upwards from the cursor, then flip back to newest-first
+        rows = query.order_by(timestamp_column.asc(), id_column.asc()).limit(limit).all()
+        return list(reversed(rows))
+    return query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit).all()
+
+
+def set_page_headers(response: Response, rows: list[Any], timestamp_attr: str, *, limit: int) -> None:
+    """Expose cursors for the neighbouring pages as ``X-Next-Cursor`` (older) / ``X-Prev-Cursor`` (newer)."""
+    persisted = [row for row in rows if _value(row, "id") is not None]
+    if not persisted:
+        return
+    first, last = persisted[0], persisted[-1]
+    response.headers["X-Prev-Cursor"] = encode_cursor(_value(first, timestamp_attr), _value(first, "id"))
+    if len(rows) >= limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(_value(last, timestamp_attr), _value(last, "id"))
+
+
+def _value(row: Any, attr: str) -> Any:
+    return row[attr] if isinstance(row, dict) else getattr(row, attr)
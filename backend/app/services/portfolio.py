@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from ..models.position_codec import pack_positions
+
+EPSILON = 1e-12
+
+
+@dataclass(frozen=True)
+class RebalancePolicy:
+    """Knobs for ``plan_rebalance`` that come from deployment settings rather than the agent config."""
+
+    base_symbol: Optional[str] = None
+    max_turnover: float = 0.0
+    min_trade_weight: float = 0.0
+
+
+@dataclass
+class Portfolio:
+    """Holdings as parallel NumPy arrays, indexed like ``symbols``.
+
+    ``tradable`` marks assets whose price can be trusted for sizing swaps; the rest keep their
+    current weight through a rebalance.
+    """
+
+    symbols: list[str]
+    prices: np.ndarray
+    balances: np.ndarray
+    tradable: np.ndarray
+    keys: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        # upper-cased symbols, so allow/block and base lookups stay vectorised
+        self.keys = np.array([(symbol or "").upper() for symbol in self.symbols])
+
+    @classmethod
+    def from_assets(cls, assets: list[dict[str, Any]], *, trade_fallback_prices: bool = False) -> Portfolio:
+        return cls(
+            symbols=[asset["symbol"] for asset in assets],
+            prices=np.fromiter((asset["price"] for asset in assets), dtype=float, count=len(assets)),
+            balances=np.fromiter((asset.get("balance", 0.0) for asset in assets), dtype=float, count=len(assets)),
+            tradable=np.fromiter(
+                (trade_fallback_prices or asset.get("price_source") != "fallback" for asset in assets),
+                dtype=bool,
+                count=len(assets),
+            ),
+        )
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.prices * self.balances
+
+    @property
+    def total_value(self) -> float:
+        return float(self.values.sum())
+
+    @property
+    def weights(self) -> np.ndarray:
+        values = self.values
+        total = values.sum()
+        return values / total if total > 0 else np.zeros_like(values)
+
+    def positions(self) -> list[dict[str, Any]]:
+        """Row dicts for ``positions_snapshot``."""
+        values, weights = self.values, self.weights
+        return [
+            {"symbol": symbol, "balance": balance, "price": price, "value": value, "weight": weight}
+            for symbol, balance, price, value, weight in zip(
+                self.symbols,
+                self.balances.tolist(),
+                self.prices.tolist(),
+                values.tolist(),
+                weights.tolist(),
+            )
+        ]
+
+    def packed_positions(self) -> bytes:
+        """The same positions encoded for ``portfolio_snapshots.packed_positions``."""
+        return pack_positions(self.symbols, self.balances, self.prices, self.values, self.weights)
+
+    def index_of(self, symbol: Optional[str]) -> int:
+        """Position of ``symbol`` (case-insensitive), or 0 when it is absent."""
+        matches = np.flatnonzero(self.keys == symbol.upper()) if symbol else ()
+        return int(matches[0]) if len(matches) else 0
+
+    def eligible(self, allow: Iterable[str], block: Iterable[str]) -> np.ndarray:
+        """Mask of assets the config allows holding."""
+        mask = np.ones(len(self.keys), dtype=bool)
+        allow = [item.upper() for item in allow]
+        block = [item.upper() for item in block]
+        if allow:
+            mask &= np.isin(self.keys, allow)
+        if block:
+            mask &= ~np.isin(self.keys, block)
+        return mask
+
+
+def target_weights(
+    current: np.ndarray, eligible: np.ndarray, tradable: np.ndarray, *, base: int, max_weight: float
+) -> np.ndarray:
+    """Equal-weight the eligible assets, capped at ``max_weight``, with the remainder in ``base``.
+
+    Untradable assets keep their current weight, and ineligible tradable ones go to zero.
+    """
+    target = np.where(tradable, 0.0, current)
+    budget = 1.0 - target.sum()
+    risk = eligible & tradable
+    risk[base] = False
+    count = int(risk.sum())
+    if count:
+        target[risk] = min(max_weight, budget / (count + 1))
+    target[base] = budget - target[risk].sum()
+    return target
+
+
+def rebalance_deltas(
+    current: np.ndarray,
+    target: np.ndarray,
+    *,
+    base: int,
+    max_turnover: float = 0.0,
+    min_trade_weight: float = 0.0,
+) -> np.ndarray:
+    """Weight changes that move ``current`` towards ``target``.
+
+    One-way turnover (half the summed absolute change) is capped at ``max_turnover`` by scaling
+    every change uniformly; changes smaller than ``min_trade_weight`` are dropped and absorbed
+    by ``base`` so the result still sums to zero.
+    """
+    delta = target - current
+    turnover = 0.5 * np.abs(delta).sum()
+    if max_turnover > 0 and turnover > max_turnover:
+        delta *= max_turnover / turnover
+    if min_trade_weight > 0:
+        delta[np.abs(delta) < min_trade_weight] = 0.0
+    delta[base] = 0.0
+    delta[base] = -delta.sum()
+    return delta
+
+
+def swap_legs(symbols: list[str], current: np.ndarray, delta: np.ndarray) -> list[dict[str, Any]]:
+    """Pair sells with buys into at most ``sellers + buyers - 1`` swaps.
+
+    Sells and buys are each sorted largest-first and matched along their cumulative sums, so
+    every leg moves as much weight as possible. Each leg's ``weight`` is a fraction of the
+    ``token_in`` balance the plan was made from, never of what is left after earlier legs: a
+    seller split across several legs has weights summing to the share of it being sold, and
+    the legs can be filled in any order, or concurrently, with the same result.
+    """
+    sellers = np.flatnonzero(delta < -EPSILON)
+    buyers = np.flatnonzero(delta > EPSILON)
+    if not len(sellers) or not len(buyers):
+        return []
+    # stable: equal changes keep universe order, so the same portfolio always gives the same legs
+    sellers = sellers[np.argsort(delta[sellers], kind="stable")]
+    buyers = buyers[np.argsort(-delta[buyers], kind="stable")]
+    sold = np.cumsum(-delta[sellers])
+    bought = np.cumsum(delta[buyers])
+
+    total = min(sold[-1], bought[-1])
+    # repeated bounds only add empty intervals, which ``keep`` drops, so a plain sort will do
+    bounds = np.concatenate(([0.0], sold, bought))
+    bounds.sort()
+    bounds = np.concatenate((bounds[bounds < total], (total,)))
+    amounts = bounds[1:] - bounds[:-1]
+    midpoints = bounds[:-1] + amounts / 2
+    keep = amounts > EPSILON
+    seller_at = sellers[np.searchsorted(sold, midpoints[keep])]
+    buyer_at = buyers[np.searchsorted(bought, midpoints[keep])]
+    fractions = np.minimum(amounts[keep] / np.maximum(current[seller_at], EPSILON), 1.0)
+
+    return [
+        {"token_in": symbols[token_in], "token_out": symbols[token_out], "weight": fraction}
+        for token_in, token_out, fraction in zip(seller_at.tolist(), buyer_at.tolist(), fractions.tolist())
+    ]
+
+
+def plan_rebalance(
+    portfolio: Portfolio,
+    *,
+    max_weight: float,
+    allow: Iterable[str] = (),
+    block: Iterable[str] = (),
+    policy: RebalancePolicy = RebalancePolicy(),
+) -> list[dict[str, Any]]:
+    """Swap legs that move ``portfolio`` towards its constrained equal-weight target."""
+    values = portfolio.values
+    total = values.sum()
+    if len(portfolio.symbols) < 2 or total <= 0:
+        # nothing held means nothing to sell; weights of an empty portfolio are all zero
+        return []
+    base = portfolio.index_of(policy.base_symbol)
+    if not portfolio.tradable[base]:
+        return []
+    current = values / total
+    target = target_weights(
+        current, portfolio.eligible(allow, block), portfolio.tradable, base=base, max_weight=max_weight
+    )
+    delta = rebalance_deltas(
+        current, target, base=base, max_turnover=policy.max_turnover, min_trade_weight=policy.min_trade_weight
+    )
+    return swap_legs(portfolio.symbols, current, delta)
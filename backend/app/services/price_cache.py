@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+PriceKey = tuple[str, int]
+PriceFetcher = Callable[..., Awaitable[Any]]
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    fetched_at: float
+
+
+class PriceCache:
+    """In-process LRU cache for token prices keyed by (symbol, chain_id).
+
+    Entries younger than ``ttl_seconds`` are served as-is. Entries that are past the TTL but
+    still within ``stale_seconds`` are served immediately while a background refresh replaces
+    them. Concurrent fetches for the same key share a single upstream request.
+    """
+
+    def __init__(
+        self,
+        fetcher: PriceFetcher,
+        *,
+        ttl_seconds: float = 30.0,
+        stale_seconds: float = 120.0,
+        max_entries: int = 5000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._fetcher = fetcher
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict[PriceKey, _CacheEntry] = OrderedDict()
+        self._inflight: dict[PriceKey, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fetch_errors = 0
+
+    def lookup(self, symbol: str, chain_id: int) -> Optional[Any]:
+        """Return a cached price without touching the network, or None on a miss.
+
+        Stale entries are returned and refreshed in the background.
+        """
+        key = (symbol, chain_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        age = self._clock() - entry.fetched_at
+        if age <= self.ttl_seconds:
+            self.hits += 1
+        elif age <= self.ttl_seconds + self.stale_seconds:
+            self.stale_hits += 1
+            self._start_fetch(key)
+        else:
+            self.misses += 1
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    async def fetch(self, symbol: str, chain_id: int) -> Any:
+        """Fetch a price upstream (coalescing with any in-flight fetch) and cache it."""
+        return await asyncio.shield(self._start_fetch((symbol, chain_id)))
+
+    def put(self, symbol: str, chain_id: int, value: Any) -> None:
+        key = (symbol, chain_id)
+        self._entries[key] = _CacheEntry(value=value, fetched_at=self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "fetch_errors": self.fetch_errors,
+            "inflight": len(self._inflight),
+        }
+
+    def _start_fetch(self, key: PriceKey) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key))
+            # background refreshes may have no awaiter; retrieve their errors here
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: PriceKey) -> Any:
+        symbol, chain_id = key
+        try:
+            value = await self._fetcher(symbol, chain_id=chain_id)
+        except Exception:
+            self.fetch_errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.put(symbol, chain_id, value)
+        return value
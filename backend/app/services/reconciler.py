@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Optional, Protocol
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..clients.symphony import SymphonyClient
+from ..database import run_in_session
+from ..models.db import Trade
+from .event_bus import EventBus
+from .leases import RECONCILER_LEASE, LeaseManager
+
+logger = logging.getLogger(__name__)
+
+FILLED_STATUSES = frozenset({"filled", "confirmed", "success", "completed"})
+FAILED_STATUSES = frozenset({"failed", "reverted", "error", "cancelled", "rejected"})
+
+
+class TradeStatusSource(Protocol):
+    async def get_statuses(self, trades: list[dict[str, Any]]) -> dict[int, str]:
+        """Map trade ids to "filled" or "failed"; trades that are still open are left out."""
+        ...
+
+
+class SymphonyStatusSource:
+    """Looks up each submitted trade's ``tx_reference`` through Symphony's swap-status endpoint."""
+
+    def __init__(self, symphony_client: SymphonyClient, *, concurrency: int = 8) -> None:
+        self.symphony_client = symphony_client
+        self.concurrency = concurrency
+
+    async def get_statuses(self, trades: list[dict[str, Any]]) -> dict[int, str]:
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def lookup(trade: dict[str, Any]) -> Optional[str]:
+            if not trade["tx_reference"]:
+                return None
+            async with semaphore:
+                try:
+                    result = await self.symphony_client.get_swap_status(trade["tx_reference"])
+                except Exception as exc:
+                    logger.warning("Status lookup for trade %s failed: %s", trade["id"], exc)
+                    return None
+            return normalize_status(result)
+
+        results = await asyncio.gather(*(lookup(trade) for trade in trades))
+        return {trade["id"]: status for trade, status in zip(trades, results) if status is not None}
+
+
+class StubStatusSource:
+    """Local stand-in that reports every trade as filled once it is ``fill_after`` seconds old."""
+
+    def __init__(self, *, fill_after: float = 0.0) -> None:
+        self.fill_after = fill_after
+
+    async def get_statuses(self, trades: list[dict[str, Any]]) -> dict[int, str]:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.fill_after)
+        return {trade["id"]: "filled" for trade in trades if trade["created_at"] <= cutoff}
+
+
+def normalize_status(result: Any) -> Optional[str]:
+    raw = result.get("status") if isinstance(result, dict) else result
+    if not isinstance(raw, str):
+        return None
+    raw = raw.lower()
+    if raw in FILLED_STATUSES:
+        return "filled"
+    if raw in FAILED_STATUSES:
+        return "failed"
+    return None
+
+
+class TradeReconciler:
+    """Background worker that moves "submitted" trades to "filled" or "failed".
+
+    Every ``interval`` seconds it loads up to ``batch_size`` submitted trades whose
+    ``next_check_at`` has passed, asks the status source about all of them at once, and writes
+    the outcome with one bulk UPDATE. Trades that are still open are re-checked after an
+    exponentially growing delay (``backoff_base * 2**attempts``, capped at ``backoff_max``) and
+    marked failed after ``max_attempts`` checks. Each trade that reaches "filled" or "failed" is
+    published as a ``trade`` event on ``events``. With ``leases``, a sweep only runs while this
+    instance holds the "reconciler" lease, so instances never check the same trades twice.
+    """
+
+    def __init__(
+        self,
+        source: TradeStatusSource,
+        *,
+        interval: float = 15.0,
+        batch_size: int = 100,
+        backoff_base: float = 5.0,
+        backoff_max: float = 300.0,
+        max_attempts: int = 20,
+        leases: Optional[LeaseManager] = None,
+        events: Optional[EventBus] = None,
+    ) -> None:
+        self.source = source
+        self.events = events
+        self.leases = leases
+        self.interval = interval
+        self.batch_size = batch_size
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.filled = 0
+        self.failed = 0
+        self.expired = 0
+        self.errors = 0
+        self.standby = 0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "sweeps": self.sweeps,
+            "filled": self.filled,
+            "failed": self.failed,
+            "expired": self.expired,
+            "errors": self.errors,
+            "standby": self.standby,
+        }
+
+    async def sweep(self) -> int:
+        """Check one batch of due trades; returns how many rows were updated."""
+        now = datetime.utcnow()
+        trades = await run_in_session(lambda db: self._load_due(db, now))
+        if not trades:
+            return 0
+        statuses = await self.source.get_statuses(trades)
+
+        changes = []
+        for trade in trades:
+            attempts = trade["confirm_attempts"] + 1
+            status = statuses.get(trade["id"], "submitted")
+            if status == "submitted" and attempts >= self.max_attempts:
+                status = "failed"
+                self.expired += 1
+            elif status == "filled":
+                self.filled += 1
+            elif status == "failed":
+                self.failed += 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+            changes.append({
+                "id": trade["id"],
+                "status": status,
+                "confirm_attempts": attempts,
+                "next_check_at": now + timedelta(seconds=delay) if status == "submitted" else None,
+            })
+        # every row carries the same keys, so this is a single executemany UPDATE by primary key
+        await run_in_session(lambda db: self._write(db, changes))
+        self.sweeps += 1
+        if self.events is not None:
+            for trade, change in zip(trades, changes):
+                if change["status"] != "submitted":
+                    self.events.publish("trade", {**trade, **change})
+        return len(changes)
+
+    @staticmethod
+    def _write(db: Session, changes: list[dict[str, Any]]) -> None:
+        with metrics.DB_WRITE_SECONDS.time(operation="trade_reconcile"):
+            db.execute(update(Trade), changes)
+            db.commit()
+
+    def _load_due(self, db: Session, now: datetime) -> list[dict[str, Any]]:
+        rows = db.execute(
+            select(
+                Trade.id,
+                Trade.run_id,
+                Trade.token_in,
+                Trade.token_out,
+                Trade.weight,
+                Trade.idempotency_key,
+                Trade.tx_reference,
+                Trade.confirm_attempts,
+                Trade.created_at,
+            )
+            .where(Trade.status == "submitted", or_(Trade.next_check_at.is_(None), Trade.next_check_at <= now))
+            .order_by(Trade.next_check_at, Trade.id)
+            .limit(self.batch_size)
+        ).all()
+        return [
+            {
+                "id": row.id,
+                "run_id": row.run_id,
+                "token_in": row.token_in,
+                "token_out": row.token_out,
+                "weight": row.weight,
+                "idempotency_key": row.idempotency_key,
+                "tx_reference": row.tx_reference,
+                "confirm_attempts": row.confirm_attempts or 0,
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ]
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if self.leases is None:
+                    await self._drain()
+                else:
+                    async with self.leases.hold(RECONCILER_LEASE) as lease:
+                        if lease is None:
+                            # another instance is sweeping
+                            self.standby += 1
+                        else:
+                            await self._drain()
+            except Exception:
+                self.errors += 1
+                logger.exception("Trade reconciliation sweep failed")
+            await asyncio.sleep(self.interval)
+
+    async def _drain(self) -> None:
+        # drain backlogs quickly; otherwise wait for the next interval
+        while await self.sweep() >= self.batch_size:
+            pass
@@ -0,0 +1,318 @@
+"""Retention for the append-only tables: archive rows past their age limit, then delete them.
+
+Usage::
+
+    python -m app.services.retention             # one sweep with the configured policies
+    python -m app.services.retention --dry-run   # only count what a sweep would remove
+
+Rows are removed oldest first in chunks of ``batch_size``, each in its own short transaction,
+so a sweep never holds long locks. Before a chunk is deleted it is written to a compressed
+columnar file under ``archive_dir/<table>/<YYYY-MM>/``. PnL history stays available through
+``pnl_rollups``, which are never pruned.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Any, Optional
+
+import numpy as np
+from sqlalchemy import JSON, Boolean, DateTime, Float, Integer, LargeBinary, delete, func, select
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..config import settings
+from ..database import run_in_session
+from ..models.db import AgentLog, PortfolioSnapshot, PositionSnapshot, Trade
+from .leases import RETENTION_LEASE, LeaseManager
+
+logger = logging.getLogger(__name__)
+
+# trades the reconciler still has to resolve are kept regardless of age
+OPEN_TRADE_STATUSES = ("pending", "submitted")
+TABLES = {"agent_logs": AgentLog, "trades": Trade, "portfolio_snapshots": PortfolioSnapshot}
+
+
+class ColumnarArchive:
+    """Writes row batches as one compressed columnar file per table and month.
+
+    ``npz`` (the default) is a NumPy ``savez_compressed`` archive with one typed array per
+    column plus a ``<column>__null`` mask where values were missing; it loads with
+    ``np.load(path)`` and needs no pickling. ``parquet`` (zstd) needs the optional ``pyarrow``
+    package. JSON columns are stored as JSON text in both formats. In ``npz``, a binary column
+    (packed positions) is the concatenated bytes plus a ``<column>__offsets`` array, so value
+    ``i`` is ``column[offsets[i]:offsets[i + 1]]``.
+    """
+
+    def __init__(self, directory: str, *, file_format: str = "npz") -> None:
+        if file_format not in ("npz", "parquet"):
+            raise ValueError(f"Unknown archive format {file_format!r}; expected 'npz' or 'parquet'")
+        if file_format == "parquet":
+            if importlib.util.find_spec("pyarrow") is None:
+                raise RuntimeError("Parquet archives require the 'pyarrow' package")
+        self.directory = directory
+        self.file_format = file_format
+        self.files_written = 0
+
+    def write(self, model: type, rows: list[dict[str, Any]], months: list[str]) -> list[str]:
+        """Write ``rows`` grouped by their ``months`` entry ("YYYY-MM"); returns the file paths."""
+        table = model.__table__
+        paths = []
+        pairs = sorted(zip(months, range(len(rows))))
+        for month, group in groupby(pairs, key=lambda pair: pair[0]):
+            batch = [rows[index] for _, index in group]
+            folder = os.path.join(self.directory, table.name, month)
+            os.makedirs(folder, exist_ok=True)
+            filename = f"{table.name}-{batch[0]['id']}-{batch[-1]['id']}-{uuid.uuid4().hex[:6]}.{self.file_format}"
+            path = os.path.join(folder, filename)
+            tmp_path = f"{path}.tmp"
+            if self.file_format == "parquet":
+                self._write_parquet(tmp_path, table, batch)
+            else:
+                self._write_npz(tmp_path, table, batch)
+            os.replace(tmp_path, path)
+            self.files_written += 1
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def _write_npz(path: str, table: Any, rows: list[dict[str, Any]]) -> None:
+        arrays: dict[str, np.ndarray] = {}
+        for column in table.columns:
+            values = [row[column.name] for row in rows]
+            missing = np.array([value is None for value in values])
+            if isinstance(column.type, JSON):
+                array = np.array([json.dumps(value) if value is not None else "" for value in values], dtype=str)
+            elif isinstance(column.type, DateTime):
+                array = np.array(values, dtype="datetime64[us]")
+            elif isinstance(column.type, Boolean):
+                array = np.array([bool(value) for value in values], dtype=bool)
+            elif isinstance(column.type, Integer):
+                array = np.array([value if value is not None else 0 for value in values], dtype=np.int64)
+            elif isinstance(column.type, Float):
+                array = np.array([value if value is not None else np.nan for value in values], dtype=np.float64)
+            elif isinstance(column.type, LargeBinary):
+                blobs = [value or b"" for value in values]
+                array = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+                arrays[f"{column.name}__offsets"] = np.cumsum([0] + [len(blob) for blob in blobs], dtype=np.int64)
+            else:
+                array = np.array([str(value) if value is not None else "" for value in values], dtype=str)
+            arrays[column.name] = array
+            if missing.any():
+                arrays[f"{column.name}__null"] = missing
+        with open(path, "wb") as handle:
+            np.savez_compressed(handle, **arrays)
+
+    @staticmethod
+    def _write_parquet(path: str, table: Any, rows: list[dict[str, Any]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {}
+        for column in table.columns:
+            values = [row[column.name] for row in rows]
+            if isinstance(column.type, JSON):
+                values = [json.dumps(value) if value is not None else None for value in values]
+            columns[column.name] = values
+        pq.write_table(pa.table(columns), path, compression="zstd")
+
+
+class RetentionWorker:
+    """Background worker that applies per-table age limits every ``interval`` seconds.
+
+    ``policies`` maps ``agent_logs``, ``trades`` and ``portfolio_snapshots`` to the number of
+    days to keep; 0 keeps a table forever. Snapshot positions are archived and deleted with
+    their snapshot. Without an ``archive``, expired rows are deleted without a copy. With
+    ``leases``, only the instance holding the "retention" lease sweeps.
+    """
+
+    def __init__(
+        self,
+        policies: dict[str, float],
+        *,
+        archive: Optional[ColumnarArchive] = None,
+        batch_size: int = 2000,
+        interval: float = 3600.0,
+        pause: float = 0.05,
+        leases: Optional[LeaseManager] = None,
+    ) -> None:
+        unknown = set(policies) - set(TABLES)
+        if unknown:
+            raise ValueError(f"No retention support for {', '.join(sorted(unknown))}")
+        self.policies = policies
+        self.archive = archive
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self.leases = leases
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.errors = 0
+        self.standby = 0
+        self.deleted: dict[str, int] = {}
+        self.last_sweep_at: Optional[datetime] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "policies": self.policies,
+            "sweeps": self.sweeps,
+            "errors": self.errors,
+            "standby": self.standby,
+            "deleted": self.deleted,
+            "archive_files": self.archive.files_written if self.archive else 0,
+            "last_sweep_at": self.last_sweep_at,
+        }
+
+    async def sweep(self) -> dict[str, int]:
+        """Expire every table once; returns the rows deleted per table (positions included)."""
+        deleted: dict[str, int] = {}
+        for name, keep_days in self.policies.items():
+            if keep_days <= 0:
+                continue
+            cutoff = datetime.utcnow() - timedelta(days=keep_days)
+            while True:
+                counts = await run_in_session(lambda db: self._purge_chunk(db, name, cutoff))
+                for table, count in counts.items():
+                    deleted[table] = deleted.get(table, 0) + count
+                    self.deleted[table] = self.deleted.get(table, 0) + count
+                if counts.get(name, 0) < self.batch_size:
+                    break
+                # let other writers in between chunks
+                await asyncio.sleep(self.pause)
+        self.sweeps += 1
+        self.last_sweep_at = datetime.utcnow()
+        return deleted
+
+    async def sweep_exclusive(self) -> Optional[dict[str, int]]:
+        """``sweep`` while holding the retention lease; None if another instance holds it."""
+        if self.leases is None:
+            return await self.sweep()
+        async with self.leases.hold(RETENTION_LEASE) as lease:
+            return await self.sweep() if lease is not None else None
+
+    async def count_expired(self) -> dict[str, int]:
+        """Rows each policy would remove right now, without touching them."""
+
+        def count(db: Session) -> dict[str, int]:
+            now = datetime.utcnow()
+            counts = {}
+            for name, keep_days in self.policies.items():
+                if keep_days > 0:
+                    expired = self._expired(TABLES[name], now - timedelta(days=keep_days)).subquery()
+                    counts[name] = db.scalar(select(func.count()).select_from(expired))
+            return counts
+
+        return await run_in_session(count)
+
+    def _purge_chunk(self, db: Session, name: str, cutoff: datetime) -> dict[str, int]:
+        model = TABLES[name]
+        rows = [dict(row._mapping) for row in db.execute(self._expired(model, cutoff).limit(self.batch_size))]
+        if not rows:
+            return {name: 0}
+        ids = [row["id"] for row in rows]
+        counts = {name: len(rows)}
+
+        with metrics.DB_WRITE_SECONDS.time(operation="retention_delete"):
+            if model is PortfolioSnapshot:
+                positions = [
+                    dict(row._mapping)
+                    for row in db.execute(
+                        select(*PositionSnapshot.__table__.columns).where(PositionSnapshot.snapshot_id.in_(ids))
+                    )
+                ]
+                if positions:
+                    if self.archive is not None:
+                        month_of = {row["id"]: _month(row["created_at"]) for row in rows}
+                        self.archive.write(PositionSnapshot, positions, [month_of[row["snapshot_id"]] for row in positions])
+                    db.execute(delete(PositionSnapshot).where(PositionSnapshot.snapshot_id.in_(ids)))
+                    counts["positions_snapshot"] = len(positions)
+            if self.archive is not None:
+                self.archive.write(model, rows, [_month(row["created_at"]) for row in rows])
+            db.execute(delete(model).where(model.id.in_(ids)))
+            db.commit()
+
+        for table, count in counts.items():
+            metrics.RETENTION_ROWS_TOTAL.inc(count, table=table)
+        return counts
+
+    @staticmethod
+    def _expired(model: type, cutoff: datetime):
+        query = select(*model.__table__.columns).where(model.created_at < cutoff)
+        if model is Trade:
+            query = query.where(Trade.status.not_in(OPEN_TRADE_STATUSES))
+        # oldest first along the (created_at, id) index
+        return query.order_by(model.created_at, model.id)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                deleted = await self.sweep_exclusive()
+                if deleted is None:
+                    # another instance is sweeping
+                    self.standby += 1
+                elif any(deleted.values()):
+                    logger.info("Retention removed %s", deleted)
+            except Exception:
+                self.errors += 1
+                logger.exception("Retention sweep failed")
+            await asyncio.sleep(self.interval)
+
+
+def _month(value: Optional[datetime]) -> str:
+    return value.strftime("%Y-%m") if value else "unknown"
+
+
+def from_settings(leases: Optional[LeaseManager] = None) -> RetentionWorker:
+    return RetentionWorker(
+        {
+            "agent_logs": settings.retention_logs_days,
+            "trades": settings.retention_trades_days,
+            "portfolio_snapshots": settings.retention_snapshots_days,
+        },
+        archive=ColumnarArchive(settings.retention_archive_dir, file_format=settings.retention_archive_format)
+        if settings.retention_archive_dir
+        else None,
+        batch_size=settings.retention_batch_size,
+        interval=settings.retention_interval_seconds,
+        leases=leases,
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> dict[str, int]:
+    parser = argparse.ArgumentParser(description="Archive and delete rows past their retention period.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the rows a sweep would remove")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    worker = from_settings(LeaseManager(settings.instance_id or None, ttl_seconds=settings.lease_ttl_seconds))
+    result = asyncio.run(worker.count_expired() if args.dry_run else worker.sweep_exclusive())
+    if result is None:
+        raise SystemExit("Another instance is running a retention sweep")
+    return result
+
+
+if __name__ == "__main__":
+    print(json.dumps(main()))
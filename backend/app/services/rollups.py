@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import bindparam, case, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..models.db import PnlRollup, PortfolioSnapshot
+
+RESOLUTIONS: dict[str, timedelta] = {"1h": timedelta(hours=1), "1d": timedelta(days=1)}
+
+
+def bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    if resolution == "1h":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if resolution == "1d":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+
+_value = bindparam("p_value")
+_created_at = bindparam("p_created_at")
+_realized = bindparam("p_realized")
+_unrealized = bindparam("p_unrealized")
+_is_first = PnlRollup.first_at > _created_at
+_is_last = PnlRollup.last_at <= _created_at
+
+# built once: statement construction and cache-key generation dominate per-snapshot cost
+_FOLD_INTO_BUCKET = (
+    update(PnlRollup)
+    .where(
+        PnlRollup.agent_id == bindparam("p_agent_id"),
+        PnlRollup.resolution == bindparam("p_resolution"),
+        PnlRollup.bucket_start == bindparam("p_bucket_start"),
+    )
+    .values(
+        high_value=case((PnlRollup.high_value < _value, _value), else_=PnlRollup.high_value),
+        low_value=case((PnlRollup.low_value > _value, _value), else_=PnlRollup.low_value),
+        sample_count=PnlRollup.sample_count + 1,
+        open_value=case((_is_first, _value), else_=PnlRollup.open_value),
+        first_at=case((_is_first, _created_at), else_=PnlRollup.first_at),
+        close_value=case((_is_last, _value), else_=PnlRollup.close_value),
+        realized_pnl=case((_is_last, _realized), else_=PnlRollup.realized_pnl),
+        unrealized_pnl=case((_is_last, _unrealized), else_=PnlRollup.unrealized_pnl),
+        last_at=case((_is_last, _created_at), else_=PnlRollup.last_at),
+    )
+)
+_INSERT_BUCKET = insert(PnlRollup.__table__).values(
+    agent_id=bindparam("p_agent_id"),
+    resolution=bindparam("p_resolution"),
+    bucket_start=bindparam("p_bucket_start"),
+    open_value=_value,
+    high_value=_value,
+    low_value=_value,
+    close_value=_value,
+    realized_pnl=_realized,
+    unrealized_pnl=_unrealized,
+    sample_count=1,
+    first_at=_created_at,
+    last_at=_created_at,
+)
+
+
+def apply_snapshot(db: Session, snapshot: dict[str, Any]) -> None:
+    """Fold one portfolio snapshot into every rollup resolution of its agent (caller commits).
+
+    Open and close follow the snapshot timestamps, so late or out-of-order snapshots (e.g. from
+    a backfill) still produce correct buckets. Existing buckets are folded with a single
+    UPDATE, which is atomic per row; a bucket is inserted only when that matches nothing.
+    """
+    created_at: datetime = snapshot["created_at"]
+    connection = db.connection()
+    for resolution in RESOLUTIONS:
+        params = {
+            "p_agent_id": snapshot["agent_id"],
+            "p_resolution": resolution,
+            "p_bucket_start": bucket_start(created_at, resolution),
+            "p_value": float(snapshot["total_value"]),
+            "p_created_at": created_at,
+            "p_realized": snapshot.get("realized_pnl", 0.0),
+            "p_unrealized": snapshot.get("unrealized_pnl", 0.0),
+        }
+        if not connection.execute(_FOLD_INTO_BUCKET, params).rowcount:
+            connection.execute(_INSERT_BUCKET, params)
+
+
+def rebuild(db: Session, *, batch_size: int = 5000) -> int:
+    """Recompute all rollups from ``portfolio_snapshots``; returns the number of snapshots folded."""
+    # plain dicts and one bulk insert: ORM attribute events cost more than the folding itself
+    buckets: dict[tuple[str, str, datetime], dict[str, Any]] = {}
+    folded = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(
+                PortfolioSnapshot.id,
+                PortfolioSnapshot.agent_id,
+                PortfolioSnapshot.created_at,
+                PortfolioSnapshot.total_value,
+                PortfolioSnapshot.realized_pnl,
+                PortfolioSnapshot.unrealized_pnl,
+            )
+            .where(PortfolioSnapshot.id > last_id)
+            .order_by(PortfolioSnapshot.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for _, agent_id, created_at, value, realized, unrealized in rows:
+            for resolution in RESOLUTIONS:
+                key = (agent_id, resolution, bucket_start(created_at, resolution))
+                rollup = buckets.get(key)
+                if rollup is None:
+                    buckets[key] = {
+                        "agent_id": agent_id,
+                        "resolution": resolution,
+                        "bucket_start": key[2],
+                        "open_value": value,
+                        "high_value": value,
+                        "low_value": value,
+                        "close_value": value,
+                        "realized_pnl": realized,
+                        "unrealized_pnl": unrealized,
+                        "sample_count": 1,
+                        "first_at": created_at,
+                        "last_at": created_at,
+                    }
+                    continue
+                if value > rollup["high_value"]:
+                    rollup["high_value"] = value
+                if value < rollup["low_value"]:
+                    rollup["low_value"] = value
+                rollup["sample_count"] += 1
+                if created_at < rollup["first_at"]:
+                    rollup["first_at"], rollup["open_value"] = created_at, value
+                if created_at >= rollup["last_at"]:
+                    rollup["last_at"], rollup["close_value"] = created_at, value
+                    rollup["realized_pnl"], rollup["unrealized_pnl"] = realized, unrealized
+        folded += len(rows)
+        last_id = rows[-1].id
+
+    db.query(PnlRollup).delete()
+    if buckets:
+        db.execute(insert(PnlRollup.__table__), list(buckets.values()))
+    db.flush()
+    return folded
+
+
+def needs_backfill(db: Session) -> bool:
+    has_rollups = db.execute(select(PnlRollup.id).limit(1)).first() is not None
+    has_snapshots = db.execute(select(PortfolioSnapshot.id).limit(1)).first() is not None
+    return has_snapshots and not has_rollups
+
+
+def choose_resolution(db: Session, start: datetime, end: datetime, max_points: int, *, agent_id: str) -> str:
+    """Pick the finest resolution whose point count fits ``max_points`` (raw, then 1h, then 1d).
+
+    Raw snapshots are only considered while they still cover the window: when it reaches back
+    before the oldest stored snapshot and the rollups hold history from there (retention has
+    pruned those snapshots), the choice is between rollups by window span alone.
+    """
+    if _raw_covers(db, start, end, agent_id=agent_id):
+        # bounded count: stop scanning the index once the budget is exceeded
+        in_range = (
+            select(PortfolioSnapshot.id)
+            .where(
+                PortfolioSnapshot.agent_id == agent_id,
+                PortfolioSnapshot.created_at >= start,
+                PortfolioSnapshot.created_at <= end,
+            )
+            .limit(max_points + 1)
+            .subquery()
+        )
+        if db.scalar(select(func.count()).select_from(in_range)) <= max_points:
+            return "raw"
+    span = end - start
+    for resolution, width in RESOLUTIONS.items():
+        if span / width <= max_points:
+            return resolution
+    return "1d"
+
+
+def _raw_covers(db: Session, start: datetime, end: datetime, *, agent_id: str) -> bool:
+    """False when rollups have history in the window from before the oldest stored snapshot."""
+    oldest = db.scalar(select(func.min(PortfolioSnapshot.created_at)).where(PortfolioSnapshot.agent_id == agent_id))
+    if oldest is not None and oldest <= start:
+        return True
+    pruned = db.scalar(
+        select(PnlRollup.id)
+        .where(
+            PnlRollup.agent_id == agent_id,
+            PnlRollup.resolution == "1d",
+            PnlRollup.bucket_start <= end,
+            PnlRollup.last_at >= start,
+            PnlRollup.first_at < (oldest if oldest is not None and oldest < end else end),
+        )
+        .limit(1)
+    )
+    return pruned is None
+
+
+def load_series(
+    db: Session, start: datetime, end: datetime, resolution: str, *, agent_id: str, limit: Optional[int] = None
+) -> list[dict[str, Any]]:
+    """Oldest-first OHLC points for one agent between ``start`` and ``end`` at the given resolution."""
+    if resolution == "raw":
+        query = (
+            select(
+                PortfolioSnapshot.created_at,
+                PortfolioSnapshot.total_value,
+                PortfolioSnapshot.realized_pnl,
+                PortfolioSnapshot.unrealized_pnl,
+            )
+            .where(
+                PortfolioSnapshot.agent_id == agent_id,
+                PortfolioSnapshot.created_at >= start,
+                PortfolioSnapshot.created_at <= end,
+            )
+            .order_by(PortfolioSnapshot.created_at, PortfolioSnapshot.id)
+        )
+        if limit:
+            query = query.limit(limit)
+        return [
+            {
+                "timestamp": row.created_at,
+                "open": row.total_value,
+                "high": row.total_value,
+                "low": row.total_value,
+                "close": row.total_value,
+                "realized_pnl": row.realized_pnl,
+                "unrealized_pnl": row.unrealized_pnl,
+                "samples": 1,
+            }
+            for row in db.execute(query)
+        ]
+
+    query = (
+        select(PnlRollup)
+        .where(
+            PnlRollup.agent_id == agent_id,
+            PnlRollup.resolution == resolution,
+            PnlRollup.bucket_start >= bucket_start(start, resolution),
+            PnlRollup.bucket_start <= end,
+        )
+        .order_by(PnlRollup.bucket_start)
+    )
+    if limit:
+        query = query.limit(limit)
+    return [
+        {
+            "timestamp": rollup.bucket_start,
+            "open": rollup.open_value,
+            "high": rollup.high_value,
+            "low": rollup.low_value,
+            "close": rollup.close_value,
+            "realized_pnl": rollup.realized_pnl,
+            "unrealized_pnl": rollup.unrealized_pnl,
+            "samples": rollup.sample_count,
+        }
+        for rollup in db.scalars(query)
+    ]
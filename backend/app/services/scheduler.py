@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..database import run_in_session
+from ..models.db import AgentRun
+from .agents import latest_configs
+from .jobs import RunQueue, RunQueueFull
+from .leases import SCHEDULER_LEASE, LeaseManager
+from .state_cache import StateCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _AgentTimer:
+    last_started: float
+    jitter: float
+
+
+class AgentScheduler:
+    """Submits runs for every agent at the cadence stored in its latest ``AgentConfig``.
+
+    Configs are re-read on every poll (from ``state_cache`` when given, so polls never touch
+    the database except to anchor a newly enabled agent), so toggling
+    ``auto_trading_enabled`` or changing ``run_frequency_seconds`` takes effect without a
+    restart. Each agent's ticks are anchored to the start of its previous run plus a random
+    jitter; ticks missed while a run overran (or the loop was blocked) are coalesced into a
+    single catch-up run rather than replayed. Agents that are due together are submitted
+    together; the run queue's worker count caps how many of them execute at once.
+
+    With ``leases``, only the instance holding the "scheduler" lease submits runs; the others
+    stand by and re-anchor on the runs in the database if they take over.
+    """
+
+    def __init__(
+        self,
+        run_queue: RunQueue,
+        *,
+        poll_seconds: float = 5.0,
+        jitter_seconds: float = 30.0,
+        min_interval_seconds: float = 30.0,
+        state_cache: Optional[StateCache] = None,
+        leases: Optional[LeaseManager] = None,
+    ) -> None:
+        self.run_queue = run_queue
+        self.state_cache = state_cache
+        self.leases = leases
+        self.leader = leases is None
+        self.poll_seconds = poll_seconds
+        self.jitter_seconds = jitter_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.runs_started = 0
+        self.ticks_missed = 0
+        self.ticks_skipped = 0
+        self._timers: dict[str, _AgentTimer] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.leases is not None and self.leader:
+            self.leader = False
+            # hand over now rather than after the TTL
+            await self.leases.release(SCHEDULER_LEASE)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "leader": self.leader,
+            "scheduled_agents": sorted(self._timers),
+            "runs_started": self.runs_started,
+            "ticks_missed": self.ticks_missed,
+            "ticks_skipped": self.ticks_skipped,
+        }
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - keep the scheduler alive across bad ticks
+                logger.exception("Scheduler tick failed")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _poll(self) -> None:
+        if self.leases is not None:
+            leader = await self.leases.claim(SCHEDULER_LEASE)
+            if leader != self.leader:
+                logger.info("Scheduler %s", "took the lead" if leader else "is standing by for another instance")
+            self.leader = leader
+            if not leader:
+                self._timers.clear()
+                return
+        if self.state_cache is not None and self.state_cache.agent_ids:
+            schedules = {config.agent_id: self._schedule(config) for config in self.state_cache.configs()}
+        else:
+            schedules = await run_in_session(self._load_schedules)
+        enabled = {agent_id: interval for agent_id, (on, interval) in schedules.items() if on}
+        now = time.monotonic()
+        for agent_id in set(self._timers) - set(enabled):
+            # disabled (or removed): re-anchor on the last run once it is enabled again
+            del self._timers[agent_id]
+
+        unanchored = [agent_id for agent_id in enabled if agent_id not in self._timers]
+        if unanchored:
+            ages = await run_in_session(lambda db: self._last_run_ages(db, unanchored))
+            for agent_id in unanchored:
+                interval = enabled[agent_id]
+                age = ages.get(agent_id)
+                self._timers[agent_id] = _AgentTimer(
+                    last_started=now - (age if age is not None else interval), jitter=self._sample_jitter(interval)
+                )
+
+        due = [
+            agent_id
+            for agent_id, interval in enabled.items()
+            if now >= self._timers[agent_id].last_started + interval + self._timers[agent_id].jitter
+        ]
+        for agent_id in due:
+            await self._submit(agent_id, enabled[agent_id], now)
+
+    async def _submit(self, agent_id: str, interval: float, now: float) -> None:
+        timer = self._timers[agent_id]
+        missed = int((now - (timer.last_started + interval + timer.jitter)) // interval)
+        if missed:
+            self.ticks_missed += missed
+            logger.warning("Scheduler missed %d tick(s) for agent %s; running once to catch up", missed, agent_id)
+
+        timer.last_started = now
+        timer.jitter = self._sample_jitter(interval)
+        try:
+            run_id, joined = await self.run_queue.submit("scheduled", agent_id=agent_id)
+        except RunQueueFull:
+            self.ticks_skipped += 1
+            logger.warning("Skipping scheduled tick for agent %s: the run queue is full", agent_id)
+            return
+        if joined:
+            # the in-flight run covers this tick
+            self.ticks_skipped += 1
+            logger.info("Skipping scheduled tick for agent %s: a run is already in progress", agent_id)
+            return
+        self.runs_started += 1
+        logger.info("Scheduled run %s submitted for agent %s", run_id, agent_id)
+
+    def _load_schedules(self, db: Session) -> dict[str, tuple[bool, float]]:
+        return {config.agent_id: self._schedule(config) for config in latest_configs(db)}
+
+    @staticmethod
+    def _last_run_ages(db: Session, agent_ids: list[str]) -> dict[str, float]:
+        """Seconds since each agent's last run started, for agents that have run before."""
+        rows = db.execute(
+            select(AgentRun.agent_id, func.max(AgentRun.started_at))
+            .where(AgentRun.agent_id.in_(agent_ids))
+            .group_by(AgentRun.agent_id)
+        )
+        now = datetime.utcnow()
+        return {agent_id: (now - started_at).total_seconds() for agent_id, started_at in rows if started_at}
+
+    def _schedule(self, config: Any) -> tuple[bool, float]:
+        if not config or not config.auto_trading_enabled:
+            return False, 0.0
+        return True, max(float(config.run_frequency_seconds or 0), self.min_interval_seconds)
+
+    def _sample_jitter(self, interval: float) -> float:
+        return random.uniform(0.0, min(self.jitter_seconds, interval * 0.1))
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from typing import Any, Optional
+
+from sqlalchemy.orm import Session
+
+from ..database import run_in_session
+from ..models.db import AgentConfig
+from ..schemas import AgentConfigSchema, AgentStateSchema
+from .agents import default_agent_id, last_runs, latest_config, latest_configs
+from .event_bus import Event
+
+logger = logging.getLogger(__name__)
+
+IDLE_MESSAGE = "Agent skeleton initialized. Configure Symphony and database to proceed."
+
+
+class StateCache:
+    """In-memory copy of every agent's current ``AgentConfig`` and most recent run.
+
+    ``load`` fills it once at startup; afterwards it is kept current write-through by
+    ``apply``, which listens to the event bus for "config" and "run" events, so the state and
+    config endpoints never query the database. Each agent has its own version counters, and
+    the ETags combine them with a per-process epoch so a restart never reuses an old tag.
+    Methods that take an ``agent_id`` default to the default agent.
+
+    Events only reach the instance that produced them, so with several instances ``start``
+    also re-reads the database every ``refresh_seconds`` to pick up configs saved and runs
+    executed elsewhere; versions (and ETags) only change when something actually did.
+    """
+
+    def __init__(self) -> None:
+        self.epoch = uuid.uuid4().hex[:8]
+        self.config_versions: dict[str, int] = defaultdict(int)
+        self.run_versions: dict[str, int] = defaultdict(int)
+        self._configs: dict[str, AgentConfigSchema] = {}
+        self._last_runs: dict[str, dict[str, Any]] = {}
+        self._states: dict[str, tuple[str, AgentStateSchema]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+
+    def load(self, db: Session) -> None:
+        if latest_config(db, default_agent_id()) is None:
+            db.add(AgentConfig(agent_id=default_agent_id()))
+            db.commit()
+        self.refresh(db)
+
+    def refresh(self, db: Session) -> int:
+        """Apply every agent's current config and last run; returns how many entries changed."""
+        changed = 0
+        for config in latest_configs(db):
+            schema = AgentConfigSchema.model_validate(config, from_attributes=True)
+            if self._configs.get(config.agent_id) != schema:
+                self.set_config(schema)
+                changed += 1
+        for agent_id, run in last_runs(db).items():
+            current = self._last_runs.get(agent_id, {})
+            if (current.get("run_id"), current.get("status"), current.get("summary")) != (run.id, run.status, run.summary):
+                self.set_run({"run_id": run.id, "agent_id": agent_id, "status": run.status, "summary": run.summary})
+                changed += 1
+        self.refreshes += 1
+        return changed
+
+    def start(self, refresh_seconds: float) -> None:
+        if refresh_seconds > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop(refresh_seconds))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self, refresh_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(refresh_seconds)
+            try:
+                await run_in_session(self.refresh)
+            except Exception:  # noqa: BLE001 - serve the last known state until the next refresh
+                logger.exception("State cache refresh failed")
+
+    @property
+    def agent_ids(self) -> list[str]:
+        return sorted(self._configs)
+
+    def configs(self) -> list[AgentConfigSchema]:
+        return [self._configs[agent_id] for agent_id in self.agent_ids]
+
+    def config(self, agent_id: Optional[str] = None) -> Optional[AgentConfigSchema]:
+        return self._configs.get(agent_id or default_agent_id())
+
+    def config_etag(self, agent_id: Optional[str] = None) -> str:
+        agent_id = agent_id or default_agent_id()
+        return f'"{self.epoch}-{agent_id}-c{self.config_versions[agent_id]}"'
+
+    def state_etag(self, agent_id: Optional[str] = None) -> str:
+        agent_id = agent_id or default_agent_id()
+        return f'"{self.epoch}-{agent_id}-c{self.config_versions[agent_id]}-r{self.run_versions[agent_id]}"'
+
+    def set_config(self, config: AgentConfigSchema) -> None:
+        agent_id = config.agent_id or default_agent_id()
+        if config.agent_id is None:
+            config = config.model_copy(update={"agent_id": agent_id})
+        self._configs[agent_id] = config
+        self.config_versions[agent_id] += 1
+
+    def set_run(self, run: dict[str, Any]) -> None:
+        agent_id = run.get("agent_id") or default_agent_id()
+        last_run = self._last_runs.get(agent_id)
+        # an older run finishing (e.g. after a newer one was queued) does not replace the newer one
+        if last_run is not None and run["run_id"] < last_run["run_id"]:
+            return
+        if last_run is not None and run["run_id"] == last_run["run_id"]:
+            run = {**last_run, **run}
+        self._last_runs[agent_id] = run
+        self.run_versions[agent_id] += 1
+
+    def apply(self, event: Event) -> None:
+        """Event-bus listener that applies config and run changes."""
+        if event.type == "config":
+            self.set_config(AgentConfigSchema.model_validate(event.data))
+        elif event.type == "run":
+            self.set_run(
+                {key: event.data.get(key) for key in ("run_id", "agent_id", "status", "summary") if key in event.data}
+            )
+
+    def state(self, agent_id: Optional[str] = None) -> AgentStateSchema:
+        """The ``/api/agent/state`` payload for one agent, rebuilt only when its versions change."""
+        agent_id = agent_id or default_agent_id()
+        etag = self.state_etag(agent_id)
+        cached = self._states.get(agent_id)
+        if cached is None or cached[0] != etag:
+            last_run = self._last_runs.get(agent_id)
+            cached = (
+                etag,
+                AgentStateSchema(
+                    status=last_run["status"] if last_run else "idle",
+                    message=(last_run.get("summary") or f"Run {last_run['run_id']} is {last_run['status']}")
+                    if last_run
+                    else IDLE_MESSAGE,
+                    agent_id=agent_id,
+                    last_run_id=last_run["run_id"] if last_run else None,
+                    last_run_status=last_run["status"] if last_run else None,
+                    config=self._configs.get(agent_id),
+                ),
+            )
+            self._states[agent_id] = cached
+        return cached[1]
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Iterator, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..database import run_db, run_in_session
+from ..models.db import AgentConfig, AgentRun, PortfolioSnapshot, PositionSnapshot, Trade
+from ..models.position_codec import unpack_positions
+from . import rollups
+from .agents import latest_config
+from .event_bus import EventBus
+from .log_sink import LogSink
+
+
+class RunUnitOfWork:
+    """Buffers everything a run writes and persists it in as few transactions as possible.
+
+    ``begin`` commits the run as "running" (together with the config lookup) so a crash mid-run
+    still leaves a trace. Trades and the snapshot are buffered in memory and written by
+    ``flush``/``complete`` as bulk INSERTs, using RETURNING for generated ids instead of
+    per-row refreshes; the snapshot's PnL rollups are updated in the same transaction. Log
+    lines go to the shared ``LogSink``, which batches them separately.
+
+    Live trades are the exception: ``persist_trades`` commits them as "pending" before anything
+    is submitted, and ``update_trade`` records each outcome as it arrives, so a crash mid-run
+    never loses a swap that may have reached Symphony.
+
+    ``phase`` times a block of the run; the timings and total duration are stored on the run
+    row when it completes. With ``events``, run status, phase boundaries, trades and the
+    snapshot are published as they become durable.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        run: AgentRun,
+        log_sink: LogSink,
+        *,
+        clock: Callable[[], datetime] = datetime.utcnow,
+        events: Optional[EventBus] = None,
+    ) -> None:
+        self.db = db
+        self.run = run
+        self.log_sink = log_sink
+        self.clock = clock
+        self.events = events
+        self.timings: dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._trades: list[dict[str, Any]] = []
+        self._snapshot: Optional[dict[str, Any]] = None
+        self._positions: list[dict[str, Any]] = []
+
+    @classmethod
+    async def begin(
+        cls,
+        db: Session,
+        log_sink: LogSink,
+        *,
+        trigger: str,
+        agent_id: str,
+        run_id: Optional[int] = None,
+        clock: Callable[[], datetime] = datetime.utcnow,
+        events: Optional[EventBus] = None,
+    ) -> tuple[RunUnitOfWork, AgentConfig]:
+        run, config = await run_db(cls._start, db, agent_id, trigger, run_id, clock())
+        uow = cls(db, run, log_sink, clock=clock, events=events)
+        uow._publish_run()
+        return uow, config
+
+    async def log(self, message: str, *, level: str = "info", category: str = "general") -> None:
+        """Queue a log line for the run; waits for room when the sink is full (backpressure)."""
+        await self.log_sink.emit_wait(message, run_id=self.run.id, level=level, category=category)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        # checked here rather than in _publish, so runs without events skip building the payloads
+        if self.events is not None:
+            self._publish("phase", {"run_id": self.run.id, "phase": name, "state": "started"})
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = round(elapsed, 6)
+            metrics.RUN_PHASE_SECONDS.observe(elapsed, phase=name)
+            if self.events is not None:
+                self._publish(
+                    "phase", {"run_id": self.run.id, "phase": name, "state": "finished", "seconds": self.timings[name]}
+                )
+
+    def add_trades(self, trades: list[dict[str, Any]]) -> None:
+        """Stage trade rows; ids are assigned into the dicts when they are flushed."""
+        for trade in trades:
+            trade["run_id"] = self.run.id
+        self._trades.extend(trades)
+
+    async def persist_trades(self, trades: list[dict[str, Any]]) -> None:
+        """Stage trade rows and commit them immediately, assigning their ids."""
+        self.add_trades(trades)
+        await self.flush()
+
+    async def update_trade(self, trade: dict[str, Any], **values: Any) -> None:
+        """Persist new field values for an already-committed trade in its own short transaction.
+
+        Uses a separate session so concurrent legs can report back without sharing ``self.db``.
+        """
+        trade.update(values)
+
+        def write(db: Session) -> None:
+            with metrics.DB_WRITE_SECONDS.time(operation="trade_update"):
+                db.execute(update(Trade).where(Trade.id == trade["id"]).values(**values))
+                db.commit()
+
+        await run_in_session(write)
+        self._publish("trade", dict(trade))
+
+    def set_snapshot(self, snapshot: dict[str, Any], positions: list[dict[str, Any]]) -> None:
+        """Buffer the run's snapshot; ``positions`` is empty when it carries ``packed_positions``."""
+        snapshot["run_id"] = self.run.id
+        snapshot["agent_id"] = self.run.agent_id
+        self._snapshot = snapshot
+        self._positions = positions
+
+    async def flush(self) -> None:
+        """Write all buffered rows in one transaction."""
+        await self._commit(None, None)
+
+    async def complete(self, status: str, summary: str) -> None:
+        """Write all buffered rows and the final run status in one transaction."""
+        await self._commit(status, summary)
+
+    async def fail(self, summary: str) -> None:
+        """Discard the failed transaction, then persist buffered trades and the failure."""
+        await run_db(self.db.rollback)
+        self._snapshot = None
+        self._positions = []
+        try:
+            await self.complete("failed", summary)
+        except Exception:
+            # the buffered rows themselves may be what failed; record at least the outcome
+            await run_db(self.db.rollback)
+            self._trades = []
+            await self.complete("failed", summary)
+
+    async def _commit(self, status: Optional[str], summary: Optional[str]) -> None:
+        pending_trades = [trade for trade in self._trades if trade.get("id") is None]
+        unsaved_snapshot = self._snapshot is not None and self._snapshot.get("id") is None
+        await run_db(self._write, status, summary)
+        if self.events is None:
+            return
+        for trade in pending_trades:
+            self._publish("trade", dict(trade))
+        if unsaved_snapshot and self._snapshot is not None:
+            snapshot = {key: value for key, value in self._snapshot.items() if key != "packed_positions"}
+            packed = self._snapshot.get("packed_positions")
+            snapshot["positions"] = unpack_positions(packed) if packed is not None else self._positions
+            self._publish("snapshot", snapshot)
+        if status is not None:
+            self._publish_run()
+
+    def _publish_run(self) -> None:
+        run = self.run
+        self._publish("run", {
+            "run_id": run.id,
+            "agent_id": run.agent_id,
+            "status": run.status,
+            "trigger": run.trigger,
+            "summary": run.summary,
+            "started_at": run.started_at,
+            "completed_at": run.completed_at,
+            "duration_seconds": run.duration_seconds,
+            "phase_timings": run.phase_timings,
+        })
+
+    def _publish(self, event_type: str, data: dict[str, Any]) -> None:
+        if self.events is not None:
+            self.events.publish(event_type, data)
+
+    @staticmethod
+    def _start(
+        db: Session, agent_id: str, trigger: str, run_id: Optional[int], now: datetime
+    ) -> tuple[AgentRun, AgentConfig]:
+        run = db.get(AgentRun, run_id) if run_id is not None else None
+        if run is None:
+            run = AgentRun(agent_id=agent_id, trigger=trigger)
+            db.add(run)
+        run.status = "running"
+        run.started_at = now
+
+        config = latest_config(db, agent_id)
+        if not config:
+            config = AgentConfig(agent_id=agent_id)
+            db.add(config)
+        db.commit()
+        return run, config
+
+    def _write(self, status: Optional[str], summary: Optional[str]) -> None:
+        with metrics.DB_WRITE_SECONDS.time(operation="run_commit" if status else "run_flush"):
+            self._write_rows(status, summary)
+
+    def _write_rows(self, status: Optional[str], summary: Optional[str]) -> None:
+        db = self.db
+        pending_trades = [trade for trade in self._trades if trade.get("id") is None]
+        trade_ids: list[int] = []
+        if pending_trades:
+            trade_ids = db.scalars(
+                insert(Trade).returning(Trade.id, sort_by_parameter_order=True),
+                [{key: value for key, value in trade.items() if key != "id"} for trade in pending_trades],
+            ).all()
+
+        snapshot_id: Optional[int] = None
+        if self._snapshot is not None and self._snapshot.get("id") is None:
+            snapshot_id = db.scalar(insert(PortfolioSnapshot).returning(PortfolioSnapshot.id), self._snapshot)
+            if self._positions:
+                db.execute(
+                    insert(PositionSnapshot),
+                    [{**position, "snapshot_id": snapshot_id} for position in self._positions],
+                )
+            rollups.apply_snapshot(db, self._snapshot)
+
+        if status is not None:
+            self.run.status = status
+            self.run.summary = summary
+            self.run.completed_at = self.clock()
+            self.run.duration_seconds = round(time.perf_counter() - self._started, 6)
+            self.run.phase_timings = dict(self.timings)
+        db.commit()
+
+        # only record generated ids once they are durable
+        for trade, trade_id in zip(pending_trades, trade_ids):
+            trade["id"] = trade_id
+        if snapshot_id is not None:
+            self._snapshot["id"] = snapshot_id
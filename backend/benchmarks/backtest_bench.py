@@ -0,0 +1,120 @@
+"""Time a year-long backtest of 15-minute ticks, and check the fast replay against full runs.
+
+Usage::
+
+    python -m benchmarks.backtest_bench --ticks 35040 --assets 4 --target-seconds 10
+    python -m benchmarks.backtest_bench --ticks 35040 --assets 50 --parity-ticks 200
+
+Writes a synthetic feed (``--assets`` random walks plus a USDC price of 1.0, one row per asset
+and ``--interval-minutes`` tick) to a temporary CSV, then:
+
+- backtests the first ``--parity-ticks`` ticks twice, with ``full_runs`` (every tick through
+  ``AgentOrchestrator.run_once``) and with the default in-memory replay. Runs, trades, values,
+  fees and drawdown must agree.
+- backtests every tick with the in-memory replay. ``elapsed_seconds`` covers loading the feed,
+  migrating the database and writing every run, trade and snapshot, and must stay within
+  ``--target-seconds``. ``full_runs_projected_seconds`` is the same ticks at the full-run rate.
+
+Exits 1 when either check fails.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import tempfile
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from app.services.backtest import BacktestOptions, BacktestResult, run_backtest
+
+COMPARED = ("runs", "failed_runs", "trades", "start_value", "final_value", "fees_paid", "max_drawdown")
+
+
+def write_feed(path: str, *, ticks: int, assets: int, interval_minutes: int, seed: int) -> None:
+    rng = random.Random(seed)
+    origin = datetime(2025, 1, 1)
+    prices = {f"TOKEN{index}": rng.uniform(0.5, 500.0) for index in range(1, assets + 1)}
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(("timestamp", "symbol", "price"))
+        for tick in range(ticks):
+            timestamp = (origin + timedelta(minutes=interval_minutes * tick)).isoformat()
+            writer.writerow((timestamp, "USDC", 1.0))
+            for symbol, price in prices.items():
+                # ~1% moves per tick, so the rebalancer keeps trading
+                prices[symbol] = price * math.exp(rng.gauss(0.0, 0.01))
+                writer.writerow((timestamp, symbol, f"{prices[symbol]:.8f}"))
+
+
+def summary(result: BacktestResult) -> dict[str, Any]:
+    return {name: value for name, value in asdict(result).items() if name in COMPARED}
+
+
+def same_results(left: BacktestResult, right: BacktestResult, tolerance: float = 1e-9) -> bool:
+    return all(
+        math.isclose(getattr(left, name), getattr(right, name), rel_tol=tolerance, abs_tol=tolerance)
+        for name in COMPARED
+    )
+
+
+def check_parity(options: BacktestOptions, ticks: int, interval_minutes: int) -> dict[str, Any]:
+    window = BacktestOptions(
+        **{**asdict(options), "end": datetime(2025, 1, 1) + timedelta(minutes=interval_minutes * (ticks - 1))}
+    )
+    full = run_backtest(BacktestOptions(**{**asdict(window), "full_runs": True}))
+    replay = run_backtest(window)
+    return {
+        "ticks": full.runs,
+        "full_runs": summary(full),
+        "replay": summary(replay),
+        "same": same_results(full, replay),
+        "full_runs_ms_per_tick": round(full.elapsed_seconds / full.runs * 1000, 3),
+        "replay_ms_per_tick": round(replay.elapsed_seconds / replay.runs * 1000, 3),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark a year-long backtest and check it against full runs.")
+    parser.add_argument("--ticks", type=int, default=35_040, help="Feed length (35040 is a year of 15-minute ticks)")
+    parser.add_argument("--assets", type=int, default=4, help="Random-walk assets besides USDC")
+    parser.add_argument("--interval-minutes", type=int, default=15)
+    parser.add_argument("--parity-ticks", type=int, default=672, help="Ticks backtested both ways")
+    parser.add_argument("--max-weight", type=float, default=0.3)
+    parser.add_argument("--fee-bps", type=float, default=10.0)
+    parser.add_argument("--target-seconds", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        feed_path = os.path.join(workdir, "feed.csv")
+        write_feed(
+            feed_path, ticks=args.ticks, assets=args.assets, interval_minutes=args.interval_minutes, seed=args.seed
+        )
+        options = BacktestOptions(feed_path, max_weight=args.max_weight, fee_bps=args.fee_bps)
+        parity = check_parity(options, min(args.parity_ticks, args.ticks), args.interval_minutes)
+        result = run_backtest(options)
+
+    report = {
+        "parity": parity,
+        "backtest": {
+            **summary(result),
+            "elapsed_seconds": round(result.elapsed_seconds, 3),
+            "us_per_tick": round(result.elapsed_seconds / result.runs * 1e6, 1),
+            "full_runs_projected_seconds": round(parity["full_runs_ms_per_tick"] * result.runs / 1000, 1),
+            "target_seconds": args.target_seconds,
+            "target_met": result.elapsed_seconds <= args.target_seconds,
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if not parity["same"] or not report["backtest"]["target_met"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
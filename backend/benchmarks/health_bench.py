@@ -0,0 +1,216 @@
+"""Measure ``/api/health`` latency percentiles while runs and list queries are in flight.
+
+Usage::
+
+    python -m benchmarks.health_bench --seconds 20 --runners 2 --readers 8
+    python -m benchmarks.health_bench --url http://127.0.0.1:8080 --seconds 30
+
+Without ``--url`` the app is started with uvicorn in a subprocess against a temporary SQLite
+database, with the scheduler, reconciler and retention worker disabled and Symphony pointed at
+a closed local port (every price falls back, so runs are DB-bound). ``--agents`` extra agents
+are created first so runs of several agents overlap.
+
+Two phases are measured for ``--seconds`` each: ``idle`` (only the health probe) and
+``loaded``, where ``--runners`` tasks keep submitting runs of every agent and ``--readers``
+tasks page through ``/api/agent/runs``, ``trades``, ``logs`` and ``pnl``. The probe runs in its
+own thread with its own connection, one request every ``--interval-ms``, so its latency is the
+server's and not the load generator's. A liveness probe that blocks behind database work shows
+up as a loaded p99 far above the idle one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Optional
+
+import httpx
+
+LIST_PATHS = ("/api/agent/runs", "/api/agent/trades", "/api/agent/logs", "/api/agent/pnl")
+
+
+def percentiles(samples: list[float]) -> dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+
+class Probe(threading.Thread):
+    """Requests ``/api/health`` at a fixed interval until stopped and records each latency."""
+
+    def __init__(self, url: str, interval: float) -> None:
+        super().__init__(daemon=True)
+        self.url = url
+        self.interval = interval
+        self.samples: list[float] = []
+        self.errors = 0
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        with httpx.Client(base_url=self.url, timeout=10.0) as client:
+            while not self._stopping.is_set():
+                started = time.perf_counter()
+                try:
+                    client.get("/api/health").raise_for_status()
+                    self.samples.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    self.errors += 1
+                self._stopping.wait(max(0.0, self.interval - (time.perf_counter() - started)))
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self.join()
+
+
+async def _submit_runs(client: httpx.AsyncClient, agents: list[Optional[str]], until: float, counts: dict) -> None:
+    while time.monotonic() < until:
+        for agent_id in agents:
+            params = {"trigger": "bench"} if agent_id is None else {"trigger": "bench", "agent_id": agent_id}
+            response = await client.post("/api/agent/run", params=params)
+            counts["runs_submitted" if response.status_code == 202 else "run_errors"] += 1
+        await asyncio.sleep(0.05)
+
+
+async def _read_lists(client: httpx.AsyncClient, until: float, counts: dict, latencies: list[float]) -> None:
+    index = 0
+    while time.monotonic() < until:
+        path = LIST_PATHS[index % len(LIST_PATHS)]
+        index += 1
+        started = time.perf_counter()
+        response = await client.get(path, params={"limit": 100})
+        latencies.append(time.perf_counter() - started)
+        counts["list_requests" if response.status_code == 200 else "list_errors"] += 1
+
+
+async def _load(url: str, seconds: float, runners: int, readers: int, agents: list[Optional[str]]) -> dict[str, Any]:
+    counts = {"runs_submitted": 0, "run_errors": 0, "list_requests": 0, "list_errors": 0}
+    latencies: list[float] = []
+    until = time.monotonic() + seconds
+    async with httpx.AsyncClient(base_url=url, timeout=60.0) as client:
+        await asyncio.gather(
+            *(_submit_runs(client, agents, until, counts) for _ in range(runners)),
+            *(_read_lists(client, until, counts, latencies) for _ in range(readers)),
+        )
+    return {**counts, "list_latency": percentiles(latencies)}
+
+
+def measure(url: str, args: argparse.Namespace, agents: list[Optional[str]], *, loaded: bool) -> dict[str, Any]:
+    probe = Probe(url, args.interval_ms / 1000)
+    probe.start()
+    if loaded:
+        background = asyncio.run(_load(url, args.seconds, args.runners, args.readers, agents))
+    else:
+        time.sleep(args.seconds)
+        background = {}
+    probe.stop()
+    return {"health": {**percentiles(probe.samples), "errors": probe.errors}, **background}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/api/health/ready", timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout:g}s")
+
+
+def _serve(workdir: str) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'health.db')}",
+        "ASSET_CACHE_PATH": os.path.join(workdir, "assets.json"),
+        "RESEARCH_CACHE_PATH": "",
+        "RETENTION_ARCHIVE_DIR": "",
+        "SCHEDULER_ENABLED": "false",
+        "RECONCILER_ENABLED": "false",
+        "RETENTION_ENABLED": "false",
+        "SYMPHONY_BASE_URL": "http://127.0.0.1:9",
+        "SYMPHONY_MAX_RETRIES": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return server, f"http://127.0.0.1:{port}"
+
+
+def _create_agents(url: str, count: int) -> list[Optional[str]]:
+    agents: list[Optional[str]] = [None]
+    for index in range(count):
+        agent_id = f"health-bench-{index}"
+        now = datetime.utcnow().isoformat()
+        payload = {"id": 0, "agent_id": agent_id, "created_at": now, "updated_at": now}
+        httpx.post(f"{url}/api/agent/config", json=payload, timeout=10.0).raise_for_status()
+        agents.append(agent_id)
+    return agents
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark /api/health latency under run and list-query load.")
+    parser.add_argument("--url", default=None, help="Target a running server instead of starting one")
+    parser.add_argument("--seconds", type=float, default=15.0, help="Length of each phase")
+    parser.add_argument("--interval-ms", type=float, default=10.0, help="Time between health probes")
+    parser.add_argument("--runners", type=int, default=2, help="Tasks submitting runs")
+    parser.add_argument("--readers", type=int, default=8, help="Tasks paging through list endpoints")
+    parser.add_argument("--agents", type=int, default=3, help="Extra agents to create (local server only)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        url = args.url
+        if url is None:
+            server, url = _serve(workdir)
+        try:
+            _wait_ready(url)
+            agents = _create_agents(url, args.agents) if server is not None else [None]
+            report = {
+                "url": url,
+                "agents": len(agents),
+                "idle": measure(url, args, agents, loaded=False),
+                "loaded": measure(url, args, agents, loaded=True),
+            }
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Measure what metrics instrumentation adds to an agent run, per call and across whole backtests.
+
+Usage::
+
+    python -m benchmarks.metrics_bench --rounds 8 --ticks 300
+
+Three measurements:
+
+- ``per_call_us``: one ``Counter.inc``, ``Gauge.set``, ``Histogram.observe``, an empty
+  ``Histogram.time`` block and an empty ``RunUnitOfWork.phase`` block, next to a bare pair of
+  ``perf_counter`` calls.
+- ``per_run``: how many of each a run makes, counted over a ``--ticks`` backtest with
+  ``full_runs`` (every tick through ``AgentOrchestrator.run_once``), and what they add up to.
+- ``backtest``: ms per run over ``--rounds`` such backtests with instrumentation, and as many
+  with every metric update and ``phase`` swapped for no-ops, alternating which goes first.
+  The overhead is the difference of the medians; it is within noise when it is smaller than
+  the spread of the uninstrumented backtests.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import tempfile
+import time
+import timeit
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator, Optional
+
+from app import metrics
+from app.services.backtest import BacktestOptions, BacktestResult, run_backtest
+from app.services.unit_of_work import RunUnitOfWork
+
+from .backtest_bench import write_feed
+
+# operation -> (owner, method) swapped out by ``replaced``
+OPERATIONS = {
+    "counter_inc": (metrics.Counter, "inc"),
+    "gauge_set": (metrics.Gauge, "set"),
+    "histogram_observe": (metrics.Histogram, "observe"),
+    "histogram_time": (metrics.Histogram, "time"),
+    "uow_phase": (RunUnitOfWork, "phase"),
+}
+_IDLE = contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def replaced(make: Callable[[str, Callable], Callable]) -> Iterator[None]:
+    """Swap every instrumented method for ``make(operation, original)`` inside the block."""
+    originals = {name: getattr(owner, method) for name, (owner, method) in OPERATIONS.items()}
+    try:
+        for name, (owner, method) in OPERATIONS.items():
+            setattr(owner, method, make(name, originals[name]))
+        yield
+    finally:
+        for name, (owner, method) in OPERATIONS.items():
+            setattr(owner, method, originals[name])
+
+
+def no_op(name: str, original: Callable) -> Callable:
+    if name in ("histogram_time", "uow_phase"):
+        # still used in ``with`` blocks
+        return lambda self, *args, **kwargs: _IDLE
+    return lambda self, *args, **kwargs: None
+
+
+def counting(counts: Counter) -> Callable[[str, Callable], Callable]:
+    def make(name: str, original: Callable) -> Callable:
+        def call(self: Any, *args: Any, **kwargs: Any) -> Any:
+            counts[name] += 1
+            return original(self, *args, **kwargs)
+
+        return call
+
+    return make
+
+
+def per_call(repeat: int) -> dict[str, float]:
+    counter = metrics.Counter("bench_total", "Bench counter.", ("status",))
+    gauge = metrics.Gauge("bench_gauge", "Bench gauge.")
+    histogram = metrics.Histogram("bench_seconds", "Bench histogram.", ("phase",))
+    # phase() only touches the run id, its timings and the (absent) event bus
+    uow = RunUnitOfWork(None, SimpleNamespace(id=1), None)
+
+    def block(manager: Any) -> None:
+        with manager:
+            pass
+
+    calls = {
+        "perf_counter_pair": lambda: time.perf_counter() - time.perf_counter(),
+        "counter_inc": lambda: counter.inc(status="success"),
+        "gauge_set": lambda: gauge.set(1.0),
+        "histogram_observe": lambda: histogram.observe(0.01, phase="plan"),
+        "histogram_time": lambda: block(histogram.time(phase="plan")),
+        "uow_phase": lambda: block(uow.phase("plan")),
+    }
+    return {name: round(timeit.timeit(call, number=repeat) / repeat * 1e6, 3) for name, call in calls.items()}
+
+
+def backtest(feed_path: str) -> BacktestResult:
+    return run_backtest(BacktestOptions(feed_path, max_weight=0.3, fee_bps=10, full_runs=True))
+
+
+def ms_per_run(feed_path: str) -> float:
+    result = backtest(feed_path)
+    return result.elapsed_seconds / result.runs * 1000
+
+
+def spread(samples: list[float]) -> dict[str, float]:
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def run(feed_path: str, *, rounds: int, repeat: int) -> dict[str, Any]:
+    costs = per_call(repeat)
+
+    counts: Counter = Counter()
+    with replaced(counting(counts)):
+        runs = backtest(feed_path).runs
+    # time blocks and phases observe their histogram themselves, and their cost includes it
+    direct = Counter(counts)
+    direct["histogram_observe"] -= counts["histogram_time"] + counts["uow_phase"]
+    estimated_us = sum(count * costs[name] for name, count in direct.items()) / runs
+
+    ms_per_run(feed_path)  # warm-up: imports, first connections, allocator
+    samples: dict[str, list[float]] = {"instrumented": [], "disabled": []}
+    for index in range(rounds):
+        for variant in ("instrumented", "disabled") if index % 2 == 0 else ("disabled", "instrumented"):
+            with replaced(no_op) if variant == "disabled" else contextlib.nullcontext():
+                samples[variant].append(ms_per_run(feed_path))
+
+    instrumented, disabled = (statistics.median(samples[name]) for name in ("instrumented", "disabled"))
+    overhead = instrumented - disabled
+    noise = max(samples["disabled"]) - min(samples["disabled"])
+    return {
+        "per_call_us": costs,
+        "per_run": {
+            "calls": {name: round(direct[name] / runs, 2) for name in OPERATIONS},
+            "estimated_us": round(estimated_us, 1),
+            "estimated_pct": round(estimated_us / (disabled * 1000) * 100, 2),
+        },
+        "backtest": {
+            "runs_per_backtest": runs,
+            "instrumented": spread(samples["instrumented"]),
+            "disabled": spread(samples["disabled"]),
+            "overhead_ms": round(overhead, 3),
+            "overhead_pct": round(overhead / disabled * 100, 2),
+            "noise_ms": round(noise, 3),
+            "within_noise": abs(overhead) <= noise,
+        },
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the cost of metrics instrumentation on agent runs.")
+    parser.add_argument("--rounds", type=int, default=8, help="Backtests per variant")
+    parser.add_argument("--ticks", type=int, default=300, help="Runs per backtest")
+    parser.add_argument("--assets", type=int, default=4, help="Random-walk assets besides USDC")
+    parser.add_argument("--repeat", type=int, default=100_000, help="Calls per per-call measurement")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        feed_path = os.path.join(workdir, "feed.csv")
+        write_feed(feed_path, ticks=args.ticks, assets=args.assets, interval_minutes=15, seed=1)
+        report = run(feed_path, rounds=args.rounds, repeat=args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Compare keyset and OFFSET pagination latency at increasing depth.
+
+Usage::
+
+    python -m benchmarks.pagination_bench --rows 2000000 --depths 0 1000 100000 1000000 1990000
+    python -m benchmarks.pagination_bench --database-url sqlite:////tmp/pages.db --rows 5000000
+
+Seeds ``agent_logs`` with ``--rows`` rows (skipped when the table already holds that many),
+then fetches one ``--limit`` page at every depth both ways, with the same query and indexes as
+``/api/agent/logs``: ``ORDER BY created_at DESC, id DESC OFFSET <depth>``, and
+``keyset_page(before=<cursor of the row just above depth>)``. The cursor lookup is not timed;
+both methods must return the same ids. Without ``--database-url`` the rows go into a SQLite
+file in a temporary directory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import get_engine, make_session_factory
+from app.migrations import migrate
+from app.models.db import AgentLog
+from app.services.pagination import encode_cursor, keyset_page
+
+LEVELS = ("info", "info", "info", "warning", "error")
+CATEGORIES = ("run", "price", "plan", "trade", "research")
+
+
+def seed(db: Session, rows: int, chunk: int = 50_000) -> float:
+    """Top ``agent_logs`` up to ``rows`` rows, one second apart; returns the seconds it took."""
+    existing = db.scalar(select(func.count()).select_from(AgentLog))
+    started = time.perf_counter()
+    origin = datetime(2024, 1, 1)
+    for offset in range(existing, rows, chunk):
+        db.execute(
+            insert(AgentLog),
+            [
+                {
+                    "run_id": index // 50 + 1,
+                    "level": LEVELS[index % len(LEVELS)],
+                    "category": CATEGORIES[index % len(CATEGORIES)],
+                    "message": f"bench entry {index}",
+                    "created_at": origin + timedelta(seconds=index),
+                }
+                for index in range(offset, min(offset + chunk, rows))
+            ],
+        )
+        db.commit()
+    return time.perf_counter() - started
+
+
+def offset_page(db: Session, depth: int, limit: int) -> list[int]:
+    rows = (
+        db.query(AgentLog)
+        .order_by(AgentLog.created_at.desc(), AgentLog.id.desc())
+        .offset(depth)
+        .limit(limit)
+        .all()
+    )
+    return [row.id for row in rows]
+
+
+def cursor_at(db: Session, depth: int) -> Optional[str]:
+    """Cursor of the row just above ``depth``, as a previous page's ``X-Next-Cursor`` would be."""
+    if depth == 0:
+        return None
+    row = db.execute(
+        select(AgentLog.created_at, AgentLog.id)
+        .order_by(AgentLog.created_at.desc(), AgentLog.id.desc())
+        .offset(depth - 1)
+        .limit(1)
+    ).first()
+    return encode_cursor(row.created_at, row.id)
+
+
+def keyset(db: Session, cursor: Optional[str], limit: int) -> list[int]:
+    rows = keyset_page(db.query(AgentLog), AgentLog.created_at, AgentLog.id, limit=limit, before=cursor)
+    return [row.id for row in rows]
+
+
+def timed(fetch: Any, repeat: int) -> tuple[float, list[int]]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        ids = fetch()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), ids
+
+
+def run(database_url: str, *, rows: int, depths: list[int], limit: int, repeat: int) -> dict[str, Any]:
+    engine = get_engine(database_url)
+    migrate(engine)
+    try:
+        with make_session_factory(engine)() as db:
+            seed_seconds = seed(db, rows)
+            total = db.scalar(select(func.count()).select_from(AgentLog))
+            report: dict[str, Any] = {}
+            for depth in depths:
+                if depth >= total:
+                    continue
+                cursor = cursor_at(db, depth)
+                offset_seconds, offset_ids = timed(lambda: offset_page(db, depth, limit), repeat)
+                keyset_seconds, keyset_ids = timed(lambda: keyset(db, cursor, limit), repeat)
+                if offset_ids != keyset_ids:
+                    raise RuntimeError(f"keyset and OFFSET pages differ at depth {depth}")
+                report[str(depth)] = {
+                    "offset_ms": round(offset_seconds * 1000, 3),
+                    "keyset_ms": round(keyset_seconds * 1000, 3),
+                    "speedup": round(offset_seconds / keyset_seconds, 1),
+                }
+    finally:
+        engine.dispose()
+    return {"rows": total, "seed_seconds": round(seed_seconds, 1), "limit": limit, "depths": report}
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark keyset vs OFFSET pagination at depth.")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1_000, 10_000, 100_000, 1_000_000, 1_990_000])
+    parser.add_argument("--limit", type=int, default=100, help="Page size")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per page; the median is reported")
+    parser.add_argument("--database-url", default=None, help="Database to seed and reuse; a temporary SQLite file by default")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'pages.db')}"
+        report = run(database_url, rows=args.rows, depths=args.depths, limit=args.limit, repeat=args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Compare the NumPy rebalance engine with a per-asset Python loop, and check both agree.
+
+Usage::
+
+    python -m benchmarks.portfolio_bench --assets 10 100 1000 10000 --cases 500
+
+``loop_plan`` (``tests/portfolio_reference.py``, shared with the test suite) is the same
+algorithm as ``plan_rebalance`` written as plain Python loops over the assets, the way the
+planner would look without NumPy. For every universe size both are
+timed on the same random portfolio (the median of ``--repeat`` samples); ``from_assets``, the
+conversion of priced assets into arrays, is reported separately.
+
+Two parity checks run first:
+
+- ``--cases`` random portfolios (random prices, balances, fallback prices, allow/block lists,
+  policies): the engine and the loop must plan as many legs, moving the same weight out of
+  and into every asset.
+- the legacy planner the engine replaced (``legacy_plan``, "first asset into the next two at
+  min(max_weight, 25%)"), which never looked at holdings. It only makes sense when every unit
+  of value sits in the first asset; there the engine must plan exactly the legacy legs. The
+  report also shows the default three-token run, where the legacy planner traded on every run
+  and the engine plans nothing because the holdings are already on target.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+from app.services.portfolio import Portfolio, RebalancePolicy, plan_rebalance
+from tests.portfolio_reference import (
+    engine_plan,
+    legacy_plan,
+    loop_plan,
+    random_assets,
+    random_case,
+    same_flows,
+    same_legs,
+)
+
+
+def check_parity(cases: int, seed: int) -> dict[str, Any]:
+    rng = random.Random(seed)
+    mismatches = []
+    legs = 0
+    for case in range(cases):
+        assets, options = random_case(rng)
+        expected = loop_plan(assets, **options)
+        legs += len(expected)
+        if not same_flows(assets, engine_plan(assets, **options), expected):
+            mismatches.append(case)
+    return {"cases": cases, "legs": legs, "mismatches": mismatches}
+
+
+def check_legacy() -> dict[str, Any]:
+    """Engine vs the legacy planner where the legacy planner's assumption holds, and the default run."""
+    policy = RebalancePolicy(base_symbol="USDC")
+    cases = []
+    for max_weight in (0.05, 0.1, 0.2, 0.25):
+        # all value in the first asset, nothing to sell elsewhere: the only case the legacy plan fits
+        assets = [
+            {"symbol": "USDC", "price": 1.0, "balance": 1000.0, "price_source": "symphony"},
+            {"symbol": "WMON", "price": 3.0, "balance": 0.0, "price_source": "symphony"},
+            {"symbol": "WETH", "price": 2500.0, "balance": 0.0, "price_source": "symphony"},
+        ]
+        legacy = legacy_plan(assets, max_weight)
+        engine = engine_plan(assets, max_weight=max_weight, policy=policy)
+        cases.append({"max_weight": max_weight, "legacy": legacy, "engine": engine, "same": same_legs(legacy, engine)})
+
+    # what a default simulated run plans: three fallback-priced assets with the placeholder balance of 1
+    default_assets = [
+        {"symbol": symbol, "price": 1.0, "balance": 1.0, "price_source": "fallback"} for symbol in ("USDC", "MON", "ETH")
+    ]
+    default_run = {
+        "weights": Portfolio.from_assets(default_assets).weights.round(4).tolist(),
+        "legacy_trades": len(legacy_plan(default_assets, 1.0)),
+        "engine_trades": len(engine_plan(default_assets, max_weight=1.0, policy=policy, trade_fallback_prices=True)),
+    }
+    return {"funded_base": cases, "default_run": default_run}
+
+
+def time_plans(sizes: list[int], repeat: int, seed: int) -> dict[str, Any]:
+    rng = random.Random(seed)
+    policy = RebalancePolicy(base_symbol="USDC", max_turnover=0.25, min_trade_weight=0.005)
+    report = {}
+    for count in sizes:
+        assets = random_assets(rng, count)
+        portfolio = Portfolio.from_assets(assets)
+        steps = {
+            # building the arrays happens once per run; the snapshot reuses the same Portfolio
+            "from_assets": lambda: Portfolio.from_assets(assets),
+            "numpy": lambda: plan_rebalance(portfolio, max_weight=0.2, policy=policy),
+            "loop": lambda: loop_plan(assets, max_weight=0.2, policy=policy),
+        }
+        samples: dict[str, list[float]] = {name: [] for name in steps}
+        for _ in range(repeat):
+            for name, step in steps.items():
+                started = time.perf_counter()
+                step()
+                samples[name].append(time.perf_counter() - started)
+        medians = {name: statistics.median(values) for name, values in samples.items()}
+        report[str(count)] = {
+            **{f"{name}_us": round(seconds * 1e6, 1) for name, seconds in medians.items()},
+            "speedup": round(medians["loop"] / medians["numpy"], 1),
+            "speedup_with_from_assets": round(medians["loop"] / (medians["numpy"] + medians["from_assets"]), 1),
+        }
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark and parity-check the NumPy rebalance engine.")
+    parser.add_argument("--assets", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Universe sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="Samples per size; the median is reported")
+    parser.add_argument("--cases", type=int, default=500, help="Random portfolios for the parity check")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    report = {
+        "parity": check_parity(args.cases, args.seed),
+        "legacy": check_legacy(),
+        "timing": time_plans(args.assets, args.repeat, args.seed),
+        "numpy": np.__version__,
+    }
+    print(json.dumps(report, indent=2))
+    if report["parity"]["mismatches"] or not all(case["same"] for case in report["legacy"]["funded_base"]):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
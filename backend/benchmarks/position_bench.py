@@ -0,0 +1,122 @@
+"""Compare write and read throughput of the two position storage modes.
+
+Usage::
+
+    python -m benchmarks.position_bench --assets 1000 --snapshots 200
+
+Each mode writes ``--snapshots`` snapshots of ``--assets`` positions with the same statements
+``RunUnitOfWork`` uses (one transaction per snapshot), then reads them back in pages of
+``--page`` the way ``/api/agent/pnl`` does, including response validation. Every mode gets a
+fresh SQLite file in a temporary directory, whose size is reported as well.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import numpy as np
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload, undefer
+
+from app.database import get_engine, make_session_factory
+from app.migrations import migrate
+from app.models.db import AgentRun, PortfolioSnapshot, PositionSnapshot
+from app.schemas import PortfolioSnapshotSchema
+from app.services.portfolio import Portfolio
+
+MODES = ("rows", "packed")
+
+
+def make_portfolio(assets: int, seed: int) -> Portfolio:
+    rng = np.random.default_rng(seed)
+    return Portfolio(
+        symbols=[f"TOKEN{index}" for index in range(assets)],
+        prices=rng.uniform(0.01, 100.0, assets),
+        balances=rng.uniform(0.0, 1000.0, assets),
+        tradable=np.ones(assets, dtype=bool),
+    )
+
+
+def run_mode(database_url: str, mode: str, *, assets: int, snapshots: int, page: int) -> dict[str, Any]:
+    engine = get_engine(database_url)
+    migrate(engine)
+    factory = make_session_factory(engine)
+    portfolios = [make_portfolio(assets, seed) for seed in range(min(snapshots, 8))]
+    started_at = datetime(2024, 1, 1)
+    try:
+        with factory() as db:
+            run = AgentRun(agent_id="bench", trigger="bench", status="completed")
+            db.add(run)
+            db.commit()
+
+            started = time.perf_counter()
+            for index in range(snapshots):
+                portfolio = portfolios[index % len(portfolios)]
+                snapshot = {
+                    "run_id": run.id,
+                    "agent_id": run.agent_id,
+                    "total_value": portfolio.total_value,
+                    "created_at": started_at + timedelta(minutes=index),
+                }
+                if mode == "packed":
+                    snapshot["packed_positions"] = portfolio.packed_positions()
+                snapshot_id = db.scalar(insert(PortfolioSnapshot).returning(PortfolioSnapshot.id), snapshot)
+                if mode == "rows":
+                    db.execute(
+                        insert(PositionSnapshot),
+                        [{**position, "snapshot_id": snapshot_id} for position in portfolio.positions()],
+                    )
+                db.commit()
+            write_seconds = time.perf_counter() - started
+
+        adapter = TypeAdapter(list[PortfolioSnapshotSchema])
+        started = time.perf_counter()
+        decoded = 0
+        with factory() as db:
+            query = db.query(PortfolioSnapshot).options(
+                selectinload(PortfolioSnapshot.positions), undefer(PortfolioSnapshot.packed_positions)
+            )
+            for offset in range(0, snapshots, page):
+                rows = query.order_by(PortfolioSnapshot.id).offset(offset).limit(page).all()
+                for item in adapter.validate_python(rows, from_attributes=True):
+                    decoded += len(item.positions)
+                db.expunge_all()
+        read_seconds = time.perf_counter() - started
+        if decoded != assets * snapshots:
+            raise RuntimeError(f"{mode}: read back {decoded} positions, expected {assets * snapshots}")
+    finally:
+        engine.dispose()
+
+    return {
+        "write_seconds": round(write_seconds, 4),
+        "write_positions_per_second": round(assets * snapshots / write_seconds),
+        "read_seconds": round(read_seconds, 4),
+        "read_positions_per_second": round(assets * snapshots / read_seconds),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark per-row against packed position storage.")
+    parser.add_argument("--assets", type=int, default=1000, help="Positions per snapshot")
+    parser.add_argument("--snapshots", type=int, default=200)
+    parser.add_argument("--page", type=int, default=50, help="Snapshots per read query, as with ?limit=")
+    args = parser.parse_args(argv)
+
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in MODES:
+            path = os.path.join(directory, f"{mode}.db")
+            report[mode] = run_mode(f"sqlite:///{path}", mode, assets=args.assets, snapshots=args.snapshots, page=args.page)
+            report[mode]["database_bytes"] = os.path.getsize(path)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Compare wall-clock time of the price phase: serial, concurrent and batched fetching.
+
+Usage::
+
+    python -m benchmarks.price_bench --assets 10 100 1000 --latency-ms 20
+
+Symphony is replaced by an in-process fake behind ``httpx.MockTransport`` that answers every
+request after ``--latency-ms`` (a batch request takes the same round-trip plus
+``--per-token-us`` per token). For every universe size three modes are timed:
+
+- ``serial``: one ``get_token_price`` await per symbol, as the orchestrator used to price;
+- ``concurrent``: ``AgentOrchestrator._get_prices`` with individual lookups, at most
+  ``PRICE_FETCH_CONCURRENCY`` in flight;
+- ``batched``: the same with a batch price endpoint configured (``PRICE_BATCH_SIZE`` per call).
+
+Each mode starts with an empty price cache, and every mode must price every symbol.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Any, Optional
+
+import httpx
+
+from app.clients.research import ResearchClient
+from app.clients.symphony import SymphonyClient
+from app.config import settings
+from app.services.orchestrator import AgentOrchestrator
+
+BATCH_PATH = "/agent/token-prices"
+MODES = ("serial", "concurrent", "batched")
+
+
+class FakeSymphony:
+    """Answers single and batch price requests after a fixed delay and counts them."""
+
+    def __init__(self, latency: float, per_token: float) -> None:
+        self.latency = latency
+        self.per_token = per_token
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if request.url.path == BATCH_PATH:
+            tokens = request.url.params["inputs"].split(",")
+            await asyncio.sleep(self.latency + self.per_token * len(tokens))
+            return httpx.Response(200, json={"prices": [{"input": token, "price": 1.5} for token in tokens]})
+        await asyncio.sleep(self.latency)
+        return httpx.Response(200, json={"price": 1.5})
+
+
+async def time_mode(mode: str, assets: int, fake: FakeSymphony) -> float:
+    client = SymphonyClient(
+        "bench",
+        "http://symphony.bench",
+        batch_price_path=BATCH_PATH if mode == "batched" else None,
+        max_retries=0,
+        transport=httpx.MockTransport(fake),
+    )
+    orchestrator = AgentOrchestrator(client, ResearchClient(""))
+    symbols = [f"TOKEN{index}" for index in range(assets)]
+    try:
+        started = time.perf_counter()
+        if mode == "serial":
+            priced = [await client.get_token_price(symbol, chain_id=settings.default_chain_id) for symbol in symbols]
+            fallbacks = sum(orchestrator._parse_price(result) is None for result in priced)
+        else:
+            priced = await orchestrator._get_prices([{"symbol": symbol} for symbol in symbols])
+            fallbacks = sum(asset["price_source"] == "fallback" for asset in priced)
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.aclose()
+    if fallbacks:
+        raise RuntimeError(f"{mode}: {fallbacks} of {assets} symbols fell back to the default price")
+    return elapsed
+
+
+async def run(sizes: list[int], *, latency: float, per_token: float, repeat: int) -> dict[str, Any]:
+    report: dict[str, Any] = {}
+    for assets in sizes:
+        row: dict[str, Any] = {}
+        for mode in MODES:
+            fake = FakeSymphony(latency, per_token)
+            samples = [await time_mode(mode, assets, fake) for _ in range(repeat)]
+            row[mode] = {"seconds": round(statistics.median(samples), 4), "requests": fake.requests // repeat}
+        row["speedup_concurrent"] = round(row["serial"]["seconds"] / row["concurrent"]["seconds"], 1)
+        row["speedup_batched"] = round(row["serial"]["seconds"] / row["batched"]["seconds"], 1)
+        report[str(assets)] = row
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark serial, concurrent and batched price fetching.")
+    parser.add_argument("--assets", type=int, nargs="+", default=[10, 100, 1000], help="Universe sizes")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Round-trip time of the fake Symphony")
+    parser.add_argument("--per-token-us", type=float, default=50.0, help="Extra batch latency per token")
+    parser.add_argument("--repeat", type=int, default=1, help="Samples per mode; the median is reported")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(
+        run(args.assets, latency=args.latency_ms / 1000, per_token=args.per_token_us / 1e6, repeat=args.repeat)
+    )
+    print(
+        json.dumps(
+            {
+                "latency_ms": args.latency_ms,
+                "price_fetch_concurrency": settings.price_fetch_concurrency,
+                "price_batch_size": settings.price_batch_size,
+                "assets": report,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Measure how long ``app.main`` takes to import and to start.
+
+Usage::
+
+    python -m benchmarks.startup_bench --runs 5
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.startup_bench --runs 5 --startup
+
+Every sample runs in a fresh interpreter, so imports are cold. ``--startup`` also runs the
+FastAPI startup and shutdown handlers against ``DATABASE_URL`` with the scheduler and trade
+reconciler disabled; the first sample against a new database includes the schema migration,
+later ones take the schema-version fast path.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+_SAMPLE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import app.main
+result = {"import_seconds": time.perf_counter() - started}
+if sys.argv[1] == "startup":
+    async def cycle():
+        started = time.perf_counter()
+        await app.main.app.router.startup()
+        result["startup_seconds"] = time.perf_counter() - started
+        await app.main.app.router.shutdown()
+    asyncio.run(cycle())
+print(json.dumps(result))
+"""
+
+
+def sample(*, startup: bool) -> dict[str, float]:
+    env = {**os.environ, "SCHEDULER_ENABLED": "false", "RECONCILER_ENABLED": "false"}
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", _SAMPLE, "startup" if startup else "import"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - started
+    return result
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark app.main import and startup time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--startup", action="store_true", help="Also run the startup/shutdown handlers")
+    args = parser.parse_args(argv)
+
+    samples = [sample(startup=args.startup) for _ in range(args.runs)]
+    report = {}
+    for key in samples[0]:
+        values = [entry[key] for entry in samples]
+        report[key] = {
+            "median": round(statistics.median(values), 4),
+            "min": round(min(values), 4),
+            "max": round(max(values), 4),
+            "samples": [round(value, 4) for value in values],
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
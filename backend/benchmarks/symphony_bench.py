@@ -0,0 +1,256 @@
+"""Measure the Symphony client's request path: overhead, connection reuse, retries and rate limiting.
+
+Usage::
+
+    python -m benchmarks.symphony_bench --requests 2000 --concurrency 16
+    python -m benchmarks.symphony_bench --scenarios retries rate_limit --failure-rate 0.3
+
+Scenarios (each reports wall time, per-call p50/p99 and what the fake server saw):
+
+- ``overhead``: sequential ``get_token_price`` calls through ``SymphonyClient`` and through a bare
+  ``httpx.AsyncClient``, both on a zero-latency ``httpx.MockTransport``.
+- ``pool``: concurrent calls against a local keep-alive HTTP server (in a subprocess) that
+  counts TCP connections, with no idle connections kept (a new connection per call), with
+  ``SYMPHONY_MAX_KEEPALIVE`` and with keep-alive sized to ``--concurrency``. ``MockTransport``
+  bypasses httpx's pool, so this one needs a real socket.
+- ``retries``: a ``MockTransport`` fake that answers ``--failure-rate`` of requests with 503,
+  with ``max_retries`` 0 and ``SYMPHONY_MAX_RETRIES``.
+- ``rate_limit``: a ``MockTransport`` fake that enforces ``--quota`` requests per second and
+  answers 429 (with ``Retry-After``) above it, with the client limiter off and set to the quota.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+from app.clients.rate_limit import TokenBucket
+from app.clients.symphony import SymphonyClient
+from app.config import settings
+
+SCENARIOS = ("overhead", "pool", "retries", "rate_limit")
+PRICE = json.dumps({"price": 1.5}).encode()
+
+
+def summarize(latencies: list[float], wall: float, errors: int, **extra: Any) -> dict[str, Any]:
+    ordered = sorted(latencies)
+
+    def pick(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3) if ordered else 0.0
+
+    return {
+        "wall_seconds": round(wall, 3),
+        "ok": len(latencies),
+        "errors": errors,
+        "p50_ms": pick(0.50),
+        "p99_ms": pick(0.99),
+        **extra,
+    }
+
+
+async def drive(call: Callable[[], Awaitable[Any]], requests: int, concurrency: int) -> tuple[list[float], float, int]:
+    """Run ``call`` ``requests`` times with at most ``concurrency`` in flight."""
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                await call()
+                latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started, errors
+
+
+def client(transport: httpx.AsyncBaseTransport, **overrides: Any) -> SymphonyClient:
+    options: dict[str, Any] = {
+        "max_connections": settings.symphony_max_connections,
+        "max_keepalive": settings.symphony_max_keepalive,
+        "max_retries": settings.symphony_max_retries,
+        "backoff_base": 0.01,
+        "backoff_max": 0.2,
+        **overrides,
+    }
+    return SymphonyClient("bench", "http://symphony.bench", transport=transport, **options)
+
+
+async def overhead(args: argparse.Namespace) -> dict[str, Any]:
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=PRICE))
+    symphony = client(transport)
+    bare = httpx.AsyncClient(base_url="http://symphony.bench", transport=transport)
+    try:
+        wrapped = summarize(*await drive(lambda: symphony.get_token_price("WMON"), args.requests, 1))
+
+        async def bare_call() -> Any:
+            response = await bare.get("/agent/token-price", params={"input": "WMON", "chainId": 143})
+            response.raise_for_status()
+            return response.json()
+
+        raw = summarize(*await drive(bare_call, args.requests, 1))
+    finally:
+        await symphony.aclose()
+        await bare.aclose()
+    return {"symphony_client": wrapped, "bare_httpx": raw}
+
+
+async def serve(latency: float) -> None:
+    """Keep-alive HTTP server for the pool scenario; prints its port, then the connection count per line read."""
+    connections = 0
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        nonlocal connections
+        connections += 1
+        try:
+            while await reader.readuntil(b"\r\n\r\n"):
+                await asyncio.sleep(latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n%s" % (len(PRICE), PRICE)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    print(server.sockets[0].getsockname()[1], flush=True)
+    loop = asyncio.get_running_loop()
+    # every line on stdin asks for the number of connections accepted since the last one
+    while await loop.run_in_executor(None, sys.stdin.readline):
+        print(connections, flush=True)
+        connections = 0
+
+
+async def pool(args: argparse.Namespace) -> dict[str, Any]:
+    # the server runs in its own process so it does not compete with the client for the event loop
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.symphony_bench", "--serve", "--latency-ms", str(args.latency_ms)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    report = {}
+    try:
+        base_url = f"http://127.0.0.1:{server.stdout.readline().strip()}"
+        variants = (
+            ("no_keepalive", 0),
+            ("default_keepalive", settings.symphony_max_keepalive),
+            ("sized_keepalive", args.concurrency),
+        )
+        for name, keepalive in variants:
+            symphony = SymphonyClient(
+                "bench", base_url, max_connections=args.concurrency, max_keepalive=keepalive, max_retries=0
+            )
+            try:
+                result = await drive(lambda: symphony.get_token_price("WMON"), args.requests, args.concurrency)
+            finally:
+                await symphony.aclose()
+            server.stdin.write("\n")
+            server.stdin.flush()
+            connections = int(server.stdout.readline())
+            report[name] = summarize(*result, max_keepalive=keepalive, connections_opened=connections)
+    finally:
+        server.terminate()
+        server.wait()
+    return report
+
+
+async def retries(args: argparse.Namespace) -> dict[str, Any]:
+    rng = random.Random(7)
+    report = {}
+    for name, max_retries in (("no_retries", 0), ("retries", max(settings.symphony_max_retries, 1))):
+        upstream = 0
+
+        async def flaky(request: httpx.Request) -> httpx.Response:
+            nonlocal upstream
+            upstream += 1
+            await asyncio.sleep(args.latency_ms / 1000)
+            if rng.random() < args.failure_rate:
+                return httpx.Response(503)
+            return httpx.Response(200, content=PRICE)
+
+        symphony = client(httpx.MockTransport(flaky), max_retries=max_retries)
+        try:
+            result = await drive(lambda: symphony.get_token_price("WMON"), args.requests, args.concurrency)
+        finally:
+            await symphony.aclose()
+        report[name] = summarize(*result, max_retries=max_retries, upstream_requests=upstream, retries=symphony.retries)
+    return report
+
+
+async def rate_limit(args: argparse.Namespace) -> dict[str, Any]:
+    report = {}
+    for name, limit in (("limiter_off", 0.0), ("limiter_at_quota", args.quota)):
+        quota = TokenBucket(args.quota, settings.symphony_rate_limit_burst)
+        throttled = 0
+
+        async def limited(request: httpx.Request) -> httpx.Response:
+            nonlocal throttled
+            quota._refill()
+            if quota._tokens < 1:
+                throttled += 1
+                return httpx.Response(429, headers={"Retry-After": "0.05"})
+            quota._tokens -= 1
+            await asyncio.sleep(args.latency_ms / 1000)
+            return httpx.Response(200, content=PRICE)
+
+        symphony = client(
+            httpx.MockTransport(limited),
+            rate_limit_per_second=limit,
+            rate_limit_burst=settings.symphony_rate_limit_burst,
+        )
+        try:
+            result = await drive(lambda: symphony.get_token_price("WMON"), args.requests, args.concurrency)
+        finally:
+            await symphony.aclose()
+        report[name] = summarize(*result, throttled_by_server=throttled, retries=symphony.retries)
+    return report
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    benches = {"overhead": overhead, "pool": pool, "retries": retries, "rate_limit": rate_limit}
+    return {name: await benches[name](args) for name in args.scenarios}
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Symphony client's pool, retries and rate limiting.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=2000, help="Calls per scenario variant")
+    parser.add_argument("--concurrency", type=int, default=16, help="Calls in flight (overhead runs sequentially)")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Server time per request")
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="Share of 503s in the retries scenario")
+    parser.add_argument("--quota", type=float, default=500.0, help="Server quota in the rate_limit scenario (req/s)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        asyncio.run(serve(args.latency_ms / 1000))
+        return
+
+    # every injected 503/429 would otherwise log a retry warning
+    logging.getLogger(SymphonyClient.__module__).setLevel(logging.ERROR)
+    report = asyncio.run(run(args))
+    print(json.dumps({"requests": args.requests, "concurrency": args.concurrency, **report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
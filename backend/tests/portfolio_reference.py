@@ -0,0 +1,162 @@
+"""Reference planners and comparisons shared by the portfolio tests and ``benchmarks.portfolio_bench``."""
+
+from __future__ import annotations
+
+import random
+from typing import Any, Iterable
+
+from app.services.portfolio import EPSILON, Portfolio, RebalancePolicy, plan_rebalance
+
+
+def legacy_plan(priced_assets: list[dict[str, Any]], max_weight: float) -> list[dict[str, Any]]:
+    """The planner before the NumPy engine (``AgentOrchestrator._propose_simple_plan``)."""
+    trades = []
+    if len(priced_assets) < 2:
+        return trades
+    target_weight = min(max_weight, 0.25)
+    token_in = priced_assets[0]["symbol"]
+    for asset in priced_assets[1:3]:
+        trades.append({"token_in": token_in, "token_out": asset["symbol"], "weight": target_weight})
+    return trades
+
+
+def loop_plan(
+    assets: list[dict[str, Any]],
+    *,
+    max_weight: float,
+    allow: Iterable[str] = (),
+    block: Iterable[str] = (),
+    policy: RebalancePolicy = RebalancePolicy(),
+    trade_fallback_prices: bool = False,
+) -> list[dict[str, Any]]:
+    """``plan_rebalance`` as per-asset Python loops; the reference for parity and timing."""
+    count = len(assets)
+    if count < 2:
+        return []
+    keys = [(asset["symbol"] or "").upper() for asset in assets]
+    base_key = (policy.base_symbol or "").upper()
+    base = keys.index(base_key) if base_key and base_key in keys else 0
+    tradable = [trade_fallback_prices or asset.get("price_source") != "fallback" for asset in assets]
+    values = [asset["price"] * asset.get("balance", 0.0) for asset in assets]
+    total = sum(values)
+    if not tradable[base] or total <= 0:
+        return []
+    current = [value / total for value in values]
+
+    allow_keys = {item.upper() for item in allow}
+    block_keys = {item.upper() for item in block}
+    target = [0.0 if tradable[index] else current[index] for index in range(count)]
+    budget = 1.0 - sum(target)
+    risk = [
+        index
+        for index in range(count)
+        if index != base and tradable[index] and (not allow_keys or keys[index] in allow_keys)
+        and keys[index] not in block_keys
+    ]
+    for index in risk:
+        target[index] = min(max_weight, budget / (len(risk) + 1))
+    target[base] = budget - sum(target[index] for index in risk)
+
+    delta = [target[index] - current[index] for index in range(count)]
+    turnover = 0.5 * sum(abs(change) for change in delta)
+    if policy.max_turnover > 0 and turnover > policy.max_turnover:
+        delta = [change * policy.max_turnover / turnover for change in delta]
+    if policy.min_trade_weight > 0:
+        delta = [0.0 if abs(change) < policy.min_trade_weight else change for change in delta]
+    delta[base] = 0.0
+    delta[base] = -sum(delta)
+
+    sellers = sorted((index for index in range(count) if delta[index] < -EPSILON), key=lambda index: delta[index])
+    buyers = sorted((index for index in range(count) if delta[index] > EPSILON), key=lambda index: -delta[index])
+    legs = []
+    seller = buyer = 0
+    to_sell = -delta[sellers[0]] if sellers else 0.0
+    to_buy = delta[buyers[0]] if buyers else 0.0
+    while seller < len(sellers) and buyer < len(buyers):
+        amount = min(to_sell, to_buy)
+        if amount > EPSILON:
+            token_in, token_out = sellers[seller], buyers[buyer]
+            legs.append(
+                {
+                    "token_in": assets[token_in]["symbol"],
+                    "token_out": assets[token_out]["symbol"],
+                    "weight": min(amount / max(current[token_in], EPSILON), 1.0),
+                }
+            )
+        to_sell -= amount
+        to_buy -= amount
+        if to_sell <= EPSILON:
+            seller += 1
+            to_sell = -delta[sellers[seller]] if seller < len(sellers) else 0.0
+        if to_buy <= EPSILON:
+            buyer += 1
+            to_buy = delta[buyers[buyer]] if buyer < len(buyers) else 0.0
+    return legs
+
+
+def engine_plan(assets: list[dict[str, Any]], *, trade_fallback_prices: bool = False, **kwargs: Any) -> list[dict]:
+    return plan_rebalance(Portfolio.from_assets(assets, trade_fallback_prices=trade_fallback_prices), **kwargs)
+
+
+def same_legs(left: list[dict[str, Any]], right: list[dict[str, Any]], tolerance: float = 1e-9) -> bool:
+    def key(leg: dict[str, Any]) -> tuple[str, str]:
+        return leg["token_in"], leg["token_out"]
+
+    left, right = sorted(left, key=key), sorted(right, key=key)
+    return len(left) == len(right) and all(
+        key(a) == key(b) and abs(a["weight"] - b["weight"]) <= tolerance for a, b in zip(left, right)
+    )
+
+
+def same_flows(
+    assets: list[dict[str, Any]], left: list[dict[str, Any]], right: list[dict[str, Any]], tolerance: float = 1e-9
+) -> bool:
+    """Same number of legs moving the same portfolio weight out of and into every asset.
+
+    Which seller is paired with which buyer can differ when two changes are equal up to float
+    rounding (the loop and NumPy sum in a different order); the flows cannot.
+    """
+    current = dict(zip((asset["symbol"] for asset in assets), Portfolio.from_assets(assets).weights.tolist()))
+
+    def flows(legs: list[dict[str, Any]]) -> dict[str, float]:
+        net: dict[str, float] = {}
+        for leg in legs:
+            amount = leg["weight"] * current[leg["token_in"]]
+            net[leg["token_in"]] = net.get(leg["token_in"], 0.0) - amount
+            net[leg["token_out"]] = net.get(leg["token_out"], 0.0) + amount
+        return net
+
+    left_flows, right_flows = flows(left), flows(right)
+    return len(left) == len(right) and all(
+        abs(left_flows.get(symbol, 0.0) - right_flows.get(symbol, 0.0)) <= tolerance
+        for symbol in left_flows.keys() | right_flows.keys()
+    )
+
+
+def random_assets(rng: random.Random, count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "symbol": "USDC" if index == 0 else f"TOKEN{index}",
+            "price": rng.uniform(0.01, 1000.0),
+            "balance": rng.choice((0.0, rng.uniform(0.0, 100.0), rng.uniform(0.0, 100.0))),
+            "price_source": "fallback" if index and rng.random() < 0.1 else "symphony",
+        }
+        for index in range(count)
+    ]
+
+
+def random_case(rng: random.Random) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+    assets = random_assets(rng, rng.randint(2, 40))
+    symbols = [asset["symbol"] for asset in assets]
+    options = {
+        "max_weight": rng.choice((0.05, 0.1, 0.25, 0.5, 1.0)),
+        "allow": rng.sample(symbols, rng.randint(0, len(symbols))) if rng.random() < 0.3 else [],
+        "block": rng.sample(symbols, rng.randint(0, min(3, len(symbols)))) if rng.random() < 0.3 else [],
+        "policy": RebalancePolicy(
+            base_symbol=rng.choice(("USDC", None, symbols[-1])),
+            max_turnover=rng.choice((0.0, 0.1, 0.25)),
+            min_trade_weight=rng.choice((0.0, 0.005, 0.02)),
+        ),
+        "trade_fallback_prices": rng.random() < 0.5,
+    }
+    return assets, options
@@ -0,0 +1,23 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.asset_universe import AssetUniverse, fallback_assets
+
+
+class UnreachableSymphony:
+    async def fetch_supported_assets(self, protocol, *, etag=None, last_modified=None):
+        raise ConnectionError("symphony is down")
+
+
+@pytest.mark.parametrize("cached", [[{"symbol": "WETH"}], "assets", 42, None])
+def test_cache_that_is_not_an_object_falls_back_like_a_corrupt_one(tmp_path, cached):
+    cache_path = tmp_path / "assets.json"
+    cache_path.write_text(json.dumps(cached), encoding="utf-8")
+    universe = AssetUniverse(UnreachableSymphony(), cache_path=str(cache_path))
+
+    assets = asyncio.run(universe.get_assets())
+
+    assert universe.using_fallback
+    assert assets == fallback_assets()
@@ -0,0 +1,49 @@
+import csv
+import math
+import random
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.backtest import BacktestOptions, run_backtest
+
+COMPARED = ("runs", "failed_runs", "trades", "start_value", "final_value", "fees_paid", "max_drawdown")
+
+
+@pytest.fixture()
+def feed_path(tmp_path):
+    # 96 15-minute ticks of six random walks; TOKEN6 only starts trading halfway through
+    rng = random.Random(5)
+    prices = {f"TOKEN{index}": rng.uniform(0.5, 500.0) for index in range(1, 7)}
+    path = tmp_path / "feed.csv"
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(("timestamp", "symbol", "price"))
+        for tick in range(96):
+            timestamp = (datetime(2025, 1, 1) + timedelta(minutes=15 * tick)).isoformat()
+            writer.writerow((timestamp, "USDC", 1.0))
+            for symbol, price in prices.items():
+                prices[symbol] = price * math.exp(rng.gauss(0.0, 0.02))
+                if symbol != "TOKEN6" or tick >= 48:
+                    writer.writerow((timestamp, symbol, prices[symbol]))
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"max_weight": 0.3},
+        {"max_weight": 0.1, "fee_bps": 25.0, "blocklist": ["TOKEN2"], "position_storage": "rows"},
+        {"max_weight": 0.5, "max_turnover": 0.0, "min_trade_weight": 0.0, "stride": 3},
+    ],
+)
+def test_replay_matches_full_runs(feed_path, overrides):
+    options = BacktestOptions(feed_path, **overrides)
+
+    replayed = run_backtest(options)
+    full = run_backtest(replace(options, full_runs=True))
+
+    assert replayed.trades > 0
+    for name in COMPARED:
+        assert getattr(replayed, name) == pytest.approx(getattr(full, name), rel=1e-9, abs=1e-9), name
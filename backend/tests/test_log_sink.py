@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from app import database
+from app.database import get_engine, make_session_factory
+from app.migrations import migrate
+from app.models.db import AgentLog
+from app.services.log_sink import LogSink
+
+
+@pytest.fixture()
+def factory(tmp_path, monkeypatch):
+    engine = get_engine(f"sqlite:///{tmp_path / 'logs.db'}")
+    migrate(engine)
+    factory = make_session_factory(engine)
+    monkeypatch.setattr(database, "_session_factory", factory)
+    yield factory
+    engine.dispose()
+
+
+def test_full_sink_makes_the_run_path_wait_instead_of_dropping(factory):
+    async def produce():
+        # the time threshold never fires: only a full sink wakes the flusher
+        sink = LogSink(batch_size=10, flush_interval=3600.0, max_pending=10, backpressure_timeout=5.0)
+        accepted = [await sink.emit_wait(f"line {index}") for index in range(100)]
+        await sink.stop()
+        return sink, accepted
+
+    sink, accepted = asyncio.run(produce())
+
+    assert all(accepted)
+    assert (sink.dropped, sink.written) == (0, 100)
+    assert sink.backpressure_waits > 0
+    with factory() as db:
+        assert db.scalar(select(func.count()).select_from(AgentLog)) == 100
+
+
+def test_emit_drops_and_counts_when_full(factory):
+    async def produce():
+        sink = LogSink(batch_size=10, flush_interval=3600.0, max_pending=10)
+        accepted = [sink.emit(f"line {index}") for index in range(25)]
+        await sink.stop()
+        return sink, accepted
+
+    sink, accepted = asyncio.run(produce())
+
+    assert accepted.count(False) == 15
+    assert (sink.dropped, sink.written) == (15, 10)
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert, select, text
+
+from app.config import settings
+from app.database import get_engine
+from app.migrations import migrate
+from app.models.db import PnlRollup
+
+# pnl_rollups before multi-agent support: no agent_id, unique on (resolution, bucket_start)
+LEGACY_ROLLUPS = """
+CREATE TABLE pnl_rollups (
+    id INTEGER PRIMARY KEY,
+    resolution VARCHAR(8) NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    open_value FLOAT NOT NULL,
+    high_value FLOAT NOT NULL,
+    low_value FLOAT NOT NULL,
+    close_value FLOAT NOT NULL,
+    realized_pnl FLOAT NOT NULL,
+    unrealized_pnl FLOAT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    first_at DATETIME NOT NULL,
+    last_at DATETIME NOT NULL,
+    CONSTRAINT uq_pnl_rollups_resolution_bucket UNIQUE (resolution, bucket_start)
+)
+"""
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = get_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_rollups_survive_the_multi_agent_migration(engine):
+    bucket = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(text(LEGACY_ROLLUPS))
+        # no snapshots left to rebuild these from, as after a retention sweep
+        for resolution in ("1h", "1d"):
+            connection.execute(
+                text(
+                    "INSERT INTO pnl_rollups (resolution, bucket_start, open_value, high_value, low_value, "
+                    "close_value, realized_pnl, unrealized_pnl, sample_count, first_at, last_at) "
+                    "VALUES (:resolution, :bucket, 100, 120, 90, 110, 1, 2, 12, :bucket, :bucket)"
+                ),
+                {"resolution": resolution, "bucket": bucket},
+            )
+
+    assert migrate(engine)
+
+    with engine.begin() as connection:
+        rows = connection.execute(select(PnlRollup.__table__).order_by(PnlRollup.resolution)).mappings().all()
+        assert [(row["agent_id"], row["resolution"], row["close_value"], row["sample_count"]) for row in rows] == [
+            (settings.symphony_spot_agent_id, "1d", 110.0, 12),
+            (settings.symphony_spot_agent_id, "1h", 110.0, 12),
+        ]
+        # the new key is per agent: another agent may have the same bucket
+        connection.execute(insert(PnlRollup.__table__).values({**rows[0], "id": None, "agent_id": "other"}))
+
+    assert not migrate(engine)
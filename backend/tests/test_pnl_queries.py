@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import database
+from app.database import get_db, get_engine, make_session_factory
+from app.main import app
+from app.migrations import migrate
+from app.models.db import AgentRun, PortfolioSnapshot, PositionSnapshot
+from app.services import rollups
+from app.services.portfolio import Portfolio
+from app.services.retention import RetentionWorker
+
+SNAPSHOTS = 60
+ASSETS = 3
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = get_engine(f"sqlite:///{tmp_path / 'pnl.db'}")
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def client(engine):
+    factory = make_session_factory(engine)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    # no context manager: the startup handlers are not needed for a DB-only route
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+
+
+def seed(engine, *, with_positions: bool) -> None:
+    portfolio = Portfolio(
+        symbols=[f"TOKEN{index}" for index in range(ASSETS)],
+        prices=np.full(ASSETS, 2.0),
+        balances=np.full(ASSETS, 10.0),
+        tradable=np.ones(ASSETS, dtype=bool),
+    )
+    with make_session_factory(engine)() as db:
+        run = AgentRun(agent_id="default", trigger="test", status="success")
+        db.add(run)
+        db.flush()
+        for index in range(SNAPSHOTS):
+            snapshot = PortfolioSnapshot(
+                run_id=run.id,
+                agent_id=run.agent_id,
+                total_value=portfolio.total_value,
+                created_at=datetime(2024, 1, 1) + timedelta(minutes=index),
+            )
+            # both storage modes in one page, so neither may lazy-load per row
+            if with_positions and index % 2:
+                snapshot.packed_positions = portfolio.packed_positions()
+            elif with_positions:
+                snapshot.positions = [PositionSnapshot(**position) for position in portfolio.positions()]
+            db.add(snapshot)
+        db.commit()
+
+
+def count_statements(engine, client, **params) -> tuple[int, list]:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/api/agent/pnl", params=params)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    return len(statements), response.json()
+
+
+@pytest.mark.parametrize("with_positions", [True, False])
+@pytest.mark.parametrize("include_positions", [True, False])
+def test_pnl_statement_count_does_not_grow_with_limit(engine, client, with_positions, include_positions):
+    seed(engine, with_positions=with_positions)
+    params = {"include_positions": str(include_positions).lower()}
+
+    small, small_page = count_statements(engine, client, limit=1, **params)
+    large, large_page = count_statements(engine, client, limit=50, **params)
+
+    assert len(small_page) == 1
+    assert len(large_page) == 50
+    assert small == large
+    # the page, plus one batched positions query when positions are included
+    assert large == (2 if include_positions else 1)
+    expected = ASSETS if with_positions and include_positions else 0
+    assert all(len(snapshot["positions"]) == expected for snapshot in large_page)
+
+
+def test_auto_series_falls_back_to_rollups_for_pruned_windows(engine, client, monkeypatch):
+    now = datetime.utcnow().replace(microsecond=0)
+    factory = make_session_factory(engine)
+    monkeypatch.setattr(database, "_session_factory", factory)
+    with factory() as db:
+        run = AgentRun(agent_id="default", trigger="test", status="success")
+        db.add(run)
+        db.flush()
+        # two days of 10-minute snapshots 40 days back, and the last day
+        for first in (now - timedelta(days=40), now - timedelta(days=1)):
+            for index in range(144 if first > now - timedelta(days=2) else 288):
+                db.add(
+                    PortfolioSnapshot(
+                        run_id=run.id,
+                        agent_id="default",
+                        total_value=100.0 + index,
+                        created_at=first + timedelta(minutes=10 * index),
+                    )
+                )
+        db.flush()
+        rollups.rebuild(db)
+        db.commit()
+    deleted = asyncio.run(RetentionWorker({"portfolio_snapshots": 30}).sweep())
+    assert deleted["portfolio_snapshots"] == 288
+
+    def series(start, end):
+        response = client.get(
+            "/api/agent/pnl/series",
+            params={"from": start.isoformat(), "to": end.isoformat(), "points": 500, "agent_id": "default"},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    pruned = series(now - timedelta(days=41), now - timedelta(days=37))
+    assert pruned["resolution"] == "1h"
+    assert sum(point["samples"] for point in pruned["points"]) == 288
+
+    straddling = series(now - timedelta(days=41), now)
+    assert straddling["resolution"] == "1d"
+    assert sum(point["samples"] for point in straddling["points"]) == 288 + 144
+
+    retained = series(now - timedelta(days=1, minutes=5), now)
+    assert retained["resolution"] == "raw"
+    assert len(retained["points"]) == 144
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from app.services.portfolio import RebalancePolicy
+
+from .portfolio_reference import engine_plan, legacy_plan, loop_plan, random_case, same_flows, same_legs
+
+
+# everything in the first asset: the only holdings the legacy planner's fixed plan fits
+FUNDED_BASE = [
+    {"symbol": "USDC", "price": 1.0, "balance": 1000.0, "price_source": "symphony"},
+    {"symbol": "WMON", "price": 3.0, "balance": 0.0, "price_source": "symphony"},
+    {"symbol": "WETH", "price": 2500.0, "balance": 0.0, "price_source": "symphony"},
+]
+
+
+@pytest.mark.parametrize("max_weight", [0.05, 0.1, 0.2, 0.25])
+def test_matches_legacy_planner_when_everything_sits_in_the_base_asset(max_weight):
+    plan = engine_plan(FUNDED_BASE, max_weight=max_weight, policy=RebalancePolicy(base_symbol="USDC"))
+
+    assert same_legs(plan, legacy_plan(FUNDED_BASE, max_weight))
+
+
+def test_default_three_token_run_is_already_on_target():
+    # a simulated run prices every asset at the fallback 1.0 with the placeholder balance of 1:
+    # a third in each asset is exactly the equal-weight target, so there is nothing to trade,
+    # where the legacy planner moved 25% out of the first asset on every run
+    assets = [
+        {"symbol": symbol, "price": 1.0, "balance": 1.0, "price_source": "fallback"} for symbol in ("USDC", "MON", "ETH")
+    ]
+    policy = RebalancePolicy(base_symbol="USDC", max_turnover=0.25, min_trade_weight=0.005)
+
+    assert engine_plan(assets, max_weight=1.0, policy=policy, trade_fallback_prices=True) == []
+    assert len(legacy_plan(assets, 1.0)) == 2
+
+
+def test_empty_portfolio_plans_nothing():
+    assets = [{**asset, "balance": 0.0} for asset in FUNDED_BASE]
+
+    assert engine_plan(assets, max_weight=0.25, policy=RebalancePolicy(base_symbol="USDC")) == []
+
+
+def test_engine_matches_per_asset_loop():
+    rng = random.Random(3)
+    for _ in range(300):
+        assets, options = random_case(rng)
+        assert same_flows(assets, engine_plan(assets, **options), loop_plan(assets, **options))
+
+
+def fill_at_plan_time(assets, plan, order):
+    """Values after filling ``plan`` leg by leg in ``order``, each against the planned balances."""
+    planned = {asset["symbol"]: asset["balance"] for asset in assets}
+    prices = {asset["symbol"]: asset["price"] for asset in assets}
+    balances = dict(planned)
+    for index in order:
+        leg = plan[index]
+        amount_in = planned[leg["token_in"]] * leg["weight"]
+        balances[leg["token_in"]] -= amount_in
+        balances[leg["token_out"]] += amount_in * prices[leg["token_in"]] / prices[leg["token_out"]]
+    return {symbol: balance * prices[symbol] for symbol, balance in balances.items()}
+
+
+def test_seller_split_across_legs_fills_to_target_in_any_order():
+    assets = [
+        {"symbol": "USDC", "price": 1.0, "balance": 10.0, "price_source": "symphony"},
+        {"symbol": "WMON", "price": 3.0, "balance": 20.0, "price_source": "symphony"},
+        {"symbol": "WETH", "price": 2500.0, "balance": 0.012, "price_source": "symphony"},
+        {"symbol": "WBTC", "price": 60000.0, "balance": 0.0, "price_source": "symphony"},
+        {"symbol": "USDT", "price": 1.0, "balance": 0.0, "price_source": "symphony"},
+    ]
+    plan = engine_plan(assets, max_weight=0.2, policy=RebalancePolicy(base_symbol="USDC"))
+
+    # WMON (60% of the value) funds two buys, each a third of the WMON held when planning
+    assert [leg["token_in"] for leg in plan].count("WMON") == 2
+    assert sum(leg["weight"] for leg in plan if leg["token_in"] == "WMON") == pytest.approx(2 / 3)
+    forward = fill_at_plan_time(assets, plan, range(len(plan)))
+    backward = fill_at_plan_time(assets, plan, reversed(range(len(plan))))
+    assert forward == pytest.approx(backward)
+    assert forward == pytest.approx({asset["symbol"]: 20.0 for asset in assets})
+
+
+def test_equal_changes_keep_universe_order():
+    assets = [{"symbol": "USDC", "price": 1.0, "balance": 100.0, "price_source": "symphony"}] + [
+        {"symbol": f"TOKEN{index}", "price": 1.0, "balance": 0.0, "price_source": "symphony"} for index in range(1, 30)
+    ]
+    plan = engine_plan(assets, max_weight=0.02, policy=RebalancePolicy(base_symbol="USDC"))
+
+    assert [leg["token_out"] for leg in plan] == [f"TOKEN{index}" for index in range(1, 30)]
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app import database
+from app.database import get_engine, make_session_factory
+from app.migrations import migrate
+from app.models.db import AgentRun, Trade
+from app.services.event_bus import EventBus
+from app.services.reconciler import TradeReconciler
+
+
+class FixedStatusSource:
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    async def get_statuses(self, trades):
+        return {trade["id"]: self.statuses[trade["id"]] for trade in trades if trade["id"] in self.statuses}
+
+
+@pytest.fixture()
+def factory(tmp_path, monkeypatch):
+    engine = get_engine(f"sqlite:///{tmp_path / 'trades.db'}")
+    migrate(engine)
+    factory = make_session_factory(engine)
+    monkeypatch.setattr(database, "_session_factory", factory)
+    yield factory
+    engine.dispose()
+
+
+def test_sweep_publishes_reconciled_trades(factory):
+    with factory() as db:
+        run = AgentRun(agent_id="default", status="completed")
+        db.add(run)
+        db.flush()
+        db.add_all(
+            Trade(
+                id=trade_id,
+                run_id=run.id,
+                token_in="USDC",
+                token_out="WETH",
+                weight=0.25,
+                status="submitted",
+                idempotency_key=f"run-{run.id}:leg-{trade_id}",
+                tx_reference=f"0x{trade_id}",
+                created_at=datetime(2025, 1, 1),
+            )
+            for trade_id in (1, 2, 3)
+        )
+        db.commit()
+
+    async def sweep():
+        events = EventBus()
+        subscription = events.subscribe(types=["trade"])
+        reconciler = TradeReconciler(FixedStatusSource({1: "filled", 2: "failed"}), events=events)
+        assert await reconciler.sweep() == 3
+        published = []
+        while not subscription.queue.empty():
+            published.append(subscription.queue.get_nowait().data)
+        return published
+
+    published = asyncio.run(sweep())
+
+    # trade 3 is still open, so only its re-check time changed
+    assert [(trade["id"], trade["status"]) for trade in published] == [(1, "filled"), (2, "failed")]
+    assert published[0]["run_id"] == 1 and published[0]["token_out"] == "WETH"
+    with factory() as db:
+        assert [trade.status for trade in db.query(Trade).order_by(Trade.id)] == ["filled", "failed", "submitted"]
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.clients.replay import ReplayFeed, ReplaySymphonyClient
+from app.services.portfolio import Portfolio, RebalancePolicy, plan_rebalance
+
+NOW = datetime(2025, 1, 1)
+PRICES = {"USDC": 1.0, "WMON": 3.0, "WETH": 2500.0, "WBTC": 60000.0}
+
+
+def replay_client(balances):
+    feed = ReplayFeed.from_rows((NOW, symbol, price) for symbol, price in PRICES.items())
+    return ReplaySymphonyClient(feed, lambda: NOW, balances=balances)
+
+
+async def plan_and_fill(client, *, concurrently):
+    symbols = list(PRICES)
+    balances = await client.get_balances(symbols)
+    portfolio = Portfolio.from_assets(
+        [{"symbol": symbol, "price": PRICES[symbol], "balance": balances[symbol]} for symbol in symbols]
+    )
+    plan = plan_rebalance(portfolio, max_weight=0.25, policy=RebalancePolicy(base_symbol="USDC"))
+    swaps = [client.batch_swap(leg["token_in"], leg["token_out"], leg["weight"]) for leg in plan]
+    if concurrently:
+        await asyncio.gather(*swaps)
+    else:
+        for swap in swaps:
+            await swap
+    return plan
+
+
+@pytest.mark.parametrize("concurrently", [False, True])
+def test_fills_land_on_the_planned_weights(concurrently):
+    client = replay_client({"USDC": 100.0})
+
+    plan = asyncio.run(plan_and_fill(client, concurrently=concurrently))
+
+    # USDC funds all three buys, each a quarter of the 100 held when planning
+    assert [(leg["token_in"], leg["weight"]) for leg in plan] == [("USDC", 0.25)] * 3
+    values = {symbol: client.balances[symbol] * price for symbol, price in PRICES.items()}
+    assert values == pytest.approx({symbol: 25.0 for symbol in PRICES})
+
+
+def test_split_seller_fills_in_any_order():
+    balances = {"USDC": 10.0, "WMON": 20.0, "WETH": 0.012}
+    forward, backward = replay_client(balances), replay_client(balances)
+
+    async def run():
+        symbols = list(PRICES)
+        plan = await plan_and_fill(forward, concurrently=False)
+        await backward.get_balances(symbols)
+        for leg in reversed(plan):
+            await backward.batch_swap(leg["token_in"], leg["token_out"], leg["weight"])
+        return plan
+
+    plan = asyncio.run(run())
+
+    assert [leg["token_in"] for leg in plan].count("WMON") == 2
+    assert forward.balances == pytest.approx(backward.balances)
+    assert forward.balances["WMON"] == pytest.approx(25.0 / 3.0)
@@ -0,0 +1,48 @@
+import asyncio
+
+from app.clients.research import FakeSearchProvider, ResearchCache, ResearchClient
+
+CONCURRENT = 20
+
+
+def test_concurrent_identical_queries_share_one_provider_call():
+    provider = FakeSearchProvider(delay=0.05)
+    client = ResearchClient(provider=provider)
+
+    async def search():
+        # whitespace differences normalise to the same query
+        queries = ["WMON news" if index % 2 else "  WMON   news " for index in range(CONCURRENT)]
+        return await asyncio.gather(*(client.web_search(query) for query in queries))
+
+    results = asyncio.run(search())
+
+    assert provider.calls == 1
+    assert client.coalesced == CONCURRENT - 1
+    assert all(batch == results[0] for batch in results)
+    assert client.stats()["inflight"] == 0
+
+
+def test_cached_query_is_not_fetched_again():
+    provider = FakeSearchProvider()
+    client = ResearchClient(provider=provider, cache=ResearchCache(":memory:"))
+
+    async def search_twice():
+        first = await client.web_search("WETH news")
+        return first, await client.web_search("weth NEWS")
+
+    first, second = asyncio.run(search_twice())
+    client.cache.close()
+
+    assert provider.calls == 1
+    assert client.cache_hits == 1
+    assert second == first
+
+
+def test_search_many_fans_out_distinct_queries_once_each():
+    provider = FakeSearchProvider(delay=0.01)
+    client = ResearchClient(provider=provider, concurrency=2)
+
+    results = asyncio.run(client.search_many(["WMON news", "WETH news", "WMON  news"], num_results=3))
+
+    assert provider.calls == 2
+    assert [result["query"] for result in results] == ["WMON news"] * 3 + ["WETH news"] * 3